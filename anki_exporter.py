@@ -1,6 +1,11 @@
+import anki_package
+import collections
+import concurrent.futures
 import csv
 import database_interaction as db_inter
+import database_migration
 import datetime
+import itertools
 import logger_setup
 import os
 import re
@@ -11,99 +16,387 @@ date_now = datetime.datetime.now()
 
 CATEGORY = 'muziek'
 DATABASE_URL = 'quizarchief_v003.sqlite'
+
+# csv:	a '|'-separated file for Anki's csv import, the cards refer to the images in ./{category}/ by their path
+# apkg:	an Anki package (see anki_package.py), with the images in it, imported in one step
+EXPORT_FORMAT = 'csv'
+
 EXPORT_FOLDER = f'./anki-export/{CATEGORY}/'
 EXPORT_FILE = f'./{EXPORT_FOLDER}/({date_now:%Y-%m-%d}) {CATEGORY}.csv'
 
-connection = db_inter.make_connection(DATABASE_URL)
-logger.info(f'Connection made @{connection}')
-cursor = db_inter.create_cursor(connection)
-logger.info(f'Cursor created as {cursor}')
+# export every category (each to its own file, see get_export_file) in one pass over the database, instead of only CATEGORY
+EXPORT_ALL = False
+
+# with EXPORT_ALL, the cards are rendered by a pool of EXPORT_PROCESSES processes. 0: render in the exporter process itself, None: use all cores
+EXPORT_PROCESSES = 0
+
+# export only the questions that are new or changed since the last export (see db_inter.CHANGED_SINCE_EXPORT), instead of all of them
+# exported questions are recorded either way, so every question is exported once, until it changes
+EXPORT_INCREMENTAL = True
+
+# rows are read from the database EXPORT_BATCH_SIZE at a time, & written to the csv file through a buffer of WRITE_BUFFER_SIZE bytes
+EXPORT_BATCH_SIZE = 1000
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+NEWLINE_PATTERN = re.compile('\n')
+HTML_BR = '<br>'
+
+# every card has a stable guid (its question_number), so importing a changed card into Anki updates the note instead of adding a duplicate
+CARD_GUID_PREFIX = 'quizarchief-'
+
+# file headers of Anki's csv import (Anki 2.1.55+): the columns are guid|question|answer
+ANKI_HEADER = '#separator:Pipe\n#html:true\n#guid column:1\n'
+
+"""
+questions_with_image_and_youtube_fragment
+0: q.question_id
+1: q.question_number
+2: q.question_text
+3: q.answer_text
+4: q.category_id
+5: q.quiz_id
+6: i.img_id
+7: i.img_filename
+8: yf.youtube_id
+9: yf.youtube_watch
+10: c.category_name (only in iterate_questions_with_image_and_youtube_fragment, for EXPORT_ALL)
+"""
+
+
+def get_export_file(category, export_format=EXPORT_FORMAT):
+	"""Return the file category is exported to. A csv file is appended to for the whole day, a package cannot be appended to, every export gets its own."""
+
+	if export_format == 'apkg':
+		return f'./anki-export/{category}/({date_now:%Y-%m-%d %H.%M.%S}) {category}.apkg'
+
+	return f'./anki-export/{category}/({date_now:%Y-%m-%d}) {category}.csv'
+
+
+def get_image_directory(category, export_format=EXPORT_FORMAT):
+	"""Return the directory the cards of category refer to their images in, none for a package (its images are all in the package itself)."""
+
+	if export_format == 'apkg':
+		return ''
+
+	return f'./{category}/'
+
+
+def get_card_guid(question_number):
+	return f'{CARD_GUID_PREFIX}{question_number}'
+
+
+def open_export_file(export_file):
+	"""Open export_file for appending, through a buffer of WRITE_BUFFER_SIZE bytes, return (file, csv writer). A new file starts with ANKI_HEADER."""
+
+	os.makedirs(os.path.dirname(export_file), exist_ok=True)
+
+	new_file = not os.path.exists(export_file) or os.path.getsize(export_file) == 0
+
+	csv_file = open(export_file, 'a', newline='', encoding='utf-8', buffering=WRITE_BUFFER_SIZE)
+	writer = csv.writer(csv_file, delimiter='|', quotechar="'")
+
+	if new_file:
+		csv_file.write(ANKI_HEADER)
+
+	return csv_file, writer
+
+
+class CsvDeck:
+	"""Writes cards to a csv file (see open_export_file)."""
+
+	def __init__(self, category, export_file):
+		self.csv_file, self.writer = open_export_file(export_file)
+
+	def add_card(self, row, card):
+		self.writer.writerow(card)
+
+	def close(self, complete=True):
+		self.csv_file.close()
+
+
+class PackageDeck:
+	"""Writes cards to an Anki package (see anki_package.py), with their images from ./{category}/."""
+
+	def __init__(self, category, export_file):
+		self.image_directory = f'./{category}/'
+		self.package = anki_package.PackageWriter(export_file, category)
+
+	def add_card(self, row, card):
+		guid, question_card, answer = card
+		img_filename = row[7]
+
+		media_paths = [os.path.join(self.image_directory, img_filename)] if img_filename else []
+		self.package.add_note(guid, [question_card, answer], media_paths)
+
+	def close(self, complete=True):
+		# an incomplete package is not written at all, the next export writes its cards again
+		self.package.close(write=complete)
+
+
+def open_deck(category, export_file, export_format=EXPORT_FORMAT):
+	"""Return a CsvDeck or PackageDeck (see EXPORT_FORMAT) that writes the cards of category to export_file."""
+
+	if export_format == 'apkg':
+		return PackageDeck(category, export_file)
+
+	if export_format == 'csv':
+		return CsvDeck(category, export_file)
+
+	raise ValueError(f'Unknown export format {export_format}, choose one of: csv, apkg')
+
+
+def render_card(row, image_directory):
+	"""Return (guid, question_card, answer) for a row of questions_with_image_and_youtube_fragment, question_card & answer as html."""
+
+	question = row[2]
+
+	# question_text used to be stored as an encoded value (bytes)
+	# in newer version it is stored as str
+	if type(question) == bytes:
+		question = question.decode('utf-8')
+
+	question_html = f'<p>{question}</p>'
+
+	imagefile = row[7]
+	if imagefile:
+		image_basename = imagefile
+		imagefile = os.path.join(image_directory, image_basename)
+		image_html = f'<img src=\"{imagefile}\" />'
+	else:
+		image_html = ''
+
+	youtube_watch_html = ''
+
+	# embedded youtube iframe is not supported on windows
+	# see: https://www.reddit.com/r/Anki/comments/507bns/question_can_i_embed_youtube_videos_into_the_cards/
+
+	# youtube_id = row[8]
+	# if youtube_id:
+	# 	youtube_id_html = f'<iframe width="560" height="315" src="https://www.youtube.com/embed/{youtube_id}" frameborder="0" allowfullscreen></iframe>'
+	# else:
+	# 	youtube_id_html = ''
+
+	youtube_watch = row[9]
+	if youtube_watch:
+		youtube_watch_html = f'<p style="font-size: small; color: #3e3e40;"><a href=\"{youtube_watch}\">This question contains a youtube fragment, which you can watch by clicking on this link.</a></p>'
+
+	# youtube_html = f'<div>{youtube_id_html}{youtube_watch_html}</div>'
+	youtube_html = f'{youtube_watch_html}'
+
+	question_card = f'{question_html}{image_html}{youtube_html}'
 
+	answer = row[3]
 
-category_id = db_inter.get_category_id(CATEGORY, cursor)[0]
-logger.info(f'Your category "{CATEGORY} has a category_id of {category_id}')
+	# answer_text used to be stored as an encoded value (bytes)
+	# in newer version it is stored as str
+	if type(answer)	== bytes:
+		answer = answer.decode('utf-8')
 
-questions_with_image_and_youtube_fragment = db_inter.get_questions_with_image_and_youtube_fragment_for_category(category_id, cursor)
-logger.info(f'The query db_inter.get_questions_with_image_for_category({category_id}, cursor) returned {len(questions_with_image_and_youtube_fragment)} rows.')
-logger.info(f'Here are the first 5 first rows of your query: \n {questions_with_image_and_youtube_fragment[:5]}')
+	answer = NEWLINE_PATTERN.sub(HTML_BR, answer)
 
-image_directory = f'./{CATEGORY}/'
+	return get_card_guid(row[1]), question_card, answer
 
-os.makedirs(EXPORT_FOLDER, exist_ok=True)
 
-with open(EXPORT_FILE, 'a', newline='', encoding='utf-8') as csv_file:
-	fieldnames = ['question', 'answer']
-	writer = csv.DictWriter(csv_file, delimiter='|', fieldnames=fieldnames, quotechar="'")
+def render_cards(rows, image_directory):
+	"""Return the cards of rows, see render_card. Runs in a worker process when exporting with EXPORT_PROCESSES."""
 
+	return [render_card(row, image_directory) for row in rows]
+
+
+def iterate_category_batches(rows, batch_size=EXPORT_BATCH_SIZE):
+	"""Yield (category, batch) for rows that are ordered by category (category_name as last column), a batch has at most batch_size rows of one category."""
+
+	for category, category_rows in itertools.groupby(rows, key=lambda row: row[10]):
+		while True:
+			batch = list(itertools.islice(category_rows, batch_size))
+
+			if not batch:
+				break
+
+			yield category, batch
+
+
+def render_batches(batches, max_workers=EXPORT_PROCESSES, max_pending_batches=None, export_format=EXPORT_FORMAT):
 	"""
-	questions_with_image_and_youtube_fragment
-	0: q.question_id
-	1: q.question_number
-	2: q.question_text
-	3: q.answer_text
-	4: q.category_id
-	5: q.quiz_id
-	6: i.img_id
-	7: i.img_filename
-	8: yf.youtube_id
-	9: yf.youtube_watch
+	Yield (category, rows, cards) for every (category, rows) in batches, in the same order.
+
+	Arguments:
+	batches -- iterable of (category, rows), e.g. iterate_category_batches
+	max_workers -- number of rendering processes, 0 renders in the current process, None uses all cores
+	max_pending_batches -- maximum number of batches submitted to the pool but not yet yielded, 2 * max_workers by default
+	export_format -- the cards refer to their images as get_image_directory does for export_format
 	"""
 
-	for row in questions_with_image_and_youtube_fragment:
+	if max_workers == 0:
+		for category, rows in batches:
+			yield category, rows, render_cards(rows, get_image_directory(category, export_format))
+
+		return
+
+	if max_workers is None:
+		max_workers = os.cpu_count() or 1
+
+	if max_pending_batches is None:
+		max_pending_batches = 2 * max_workers
+
+	executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+
+	pending = collections.deque()
+
+	try:
+		for category, rows in batches:
+			pending.append((category, rows, executor.submit(render_cards, rows, get_image_directory(category, export_format))))
+
+			if len(pending) >= max_pending_batches:
+				category, rows, future = pending.popleft()
+				yield category, rows, future.result()
+
+		while pending:
+			category, rows, future = pending.popleft()
+			yield category, rows, future.result()
+
+	finally:
+		executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ExportTracker:
+	"""
+	Keeps track of an export, to record it (see db_inter.set_exported) once its files are complete.
+
+	The export covers the questions up to the highest question_id when it started (up_to_question_id),
+	questions that are added while it runs are left for the next export.
+
+	Usage:
+		export_tracker = ExportTracker(category_ids, cursor)
+		for row in export_tracker.track(rows):
+			...
+		export_tracker.commit(cursor)
+	"""
+
+	def __init__(self, category_ids, cursor):
+		self.category_ids = category_ids
+		self.up_to_question_id = db_inter.get_max_question_id(cursor)
+
+		# questions that changed since they were exported (question_id -> change_count), read before the export starts
+		# a question that changes during the export gets a higher change_count & stays pending, so it is exported again next time
+		self.pending_change_counts = db_inter.get_export_pending(cursor)
+		self.exported_change_counts = {}
+
+	def track(self, rows):
+		"""Yield rows (of questions_with_image_and_youtube_fragment), keeping track of the pending questions among them."""
+
+		for row in rows:
+			if row[0] in self.pending_change_counts:
+				self.exported_change_counts[row[0]] = self.pending_change_counts[row[0]]
+
+			yield row
+
+	def commit(self, cursor):
+		"""Record the export, in one transaction."""
+
+		db_inter.set_exported(self.category_ids, self.up_to_question_id, self.exported_change_counts, cursor)
+		cursor.connection.commit()
+
+
+def export_category(category, cursor, export_file, incremental=EXPORT_INCREMENTAL, export_format=EXPORT_FORMAT):
+	"""
+	Export a card (guid|question|answer) for every question of category to export_file (a csv file or package, see EXPORT_FORMAT), return the number of cards.
+
+	The questions are streamed from the database, only one batch of rows is in memory at any time.
+	With incremental, only the questions that are new or changed since the last export.
+	"""
+
+	category_id = db_inter.get_category_id(category, cursor)[0]
+	logger.info(f'Your category "{category} has a category_id of {category_id}')
+
+	image_directory = get_image_directory(category, export_format)
+
+	export_tracker = ExportTracker([category_id], cursor)
+	rows = db_inter.iterate_questions_with_image_and_youtube_fragment_for_category(category_id, cursor, EXPORT_BATCH_SIZE, changed_only=incremental, up_to_question_id=export_tracker.up_to_question_id)
+	exported_cards = 0
+
+	# the file is only created when there is at least one card to export
+	deck = None
+	complete = False
+
+	try:
+		for row in export_tracker.track(rows):
+			if not deck:
+				deck = open_deck(category, export_file, export_format)
+
+			deck.add_card(row, render_card(row, image_directory))
+			exported_cards += 1
+
+		complete = True
+
+	finally:
+		if deck:
+			deck.close(complete)
+
+	export_tracker.commit(cursor)
+
+	logger.info(f'Exported {exported_cards} cards for category {category} to {export_file}')
+	return exported_cards
+
+
+def export_all(cursor, max_workers=EXPORT_PROCESSES, incremental=EXPORT_INCREMENTAL, export_format=EXPORT_FORMAT):
+	"""
+	Export every category to its own file (see get_export_file), in one pass over the database, return category -> number of cards.
+
+	The rows come ordered by category, so only the file of the current category is open.
+	With incremental, only the questions that are new or changed since the last export.
+	"""
+
+	export_tracker = ExportTracker(db_inter.get_category_ids(cursor), cursor)
+	rows = export_tracker.track(db_inter.iterate_questions_with_image_and_youtube_fragment(cursor, EXPORT_BATCH_SIZE, changed_only=incremental, up_to_question_id=export_tracker.up_to_question_id))
+	exported_cards = {}
+
+	deck = None
+	complete = False
+
+	try:
+		for category, category_rows, cards in render_batches(iterate_category_batches(rows), max_workers, export_format=export_format):
 
-		question_number = row[1]
-		question = row[2]
+			if category not in exported_cards:
+				if deck:
+					deck.close()
 
-		# question_text used to be stored as an encoded value (bytes)
-		# in newer version it is stored as str
-		if type(question) == bytes:
-			question = question.decode('utf-8')
+				deck = open_deck(category, get_export_file(category, export_format), export_format)
+				exported_cards[category] = 0
 
-		question_html = f'<p>{question}</p>'
+			for row, card in zip(category_rows, cards):
+				deck.add_card(row, card)
 
-		imagefile = row[7]
-		if imagefile:
-			image_basename = imagefile
-			imagefile = os.path.join(image_directory, image_basename)
-			image_html = f'<img src=\"{imagefile}\" />'
-		else:
-			image_html = ''
+			exported_cards[category] += len(cards)
 
+		complete = True
 
-		youtube_html = ''
-		youtube_watch_html = ''
+	finally:
+		if deck:
+			deck.close(complete)
 
-		# embedded youtube iframe is not supported on windows
-		# see: https://www.reddit.com/r/Anki/comments/507bns/question_can_i_embed_youtube_videos_into_the_cards/
+	export_tracker.commit(cursor)
 
-		# youtube_id = row[8]
-		# if youtube_id:
-		# 	youtube_id_html = f'<iframe width="560" height="315" src="https://www.youtube.com/embed/{youtube_id}" frameborder="0" allowfullscreen></iframe>'
-		# else:
-		# 	youtube_id_html = ''
+	for category, cards in exported_cards.items():
+		logger.info(f'Exported {cards} cards for category {category} to {get_export_file(category, export_format)}')
 
-		youtube_watch = row[9]
-		if youtube_watch:
-			youtube_watch_html = f'<p style="font-size: small; color: #3e3e40;"><a href=\"{youtube_watch}\">This question contains a youtube fragment, which you can watch by clicking on this link.</a></p>'
+	return exported_cards
 
-		# youtube_html = f'<div>{youtube_id_html}{youtube_watch_html}</div>'
-		youtube_html = f'{youtube_watch_html}'
 
-		question_card = f'{question_html}{image_html}{youtube_html}'
+if __name__ == '__main__':
 
-		answer = row[3]
+	connection = db_inter.make_connection(DATABASE_URL, 'read-mostly')
+	logger.info(f'Connection made @{connection}')
 
-		# answer_text used to be stored as an encoded value (bytes)
-		# in newer version it is stored as str
-		if type(answer)	== bytes:
-			answer = answer.decode('utf-8')
+	# the export state is recorded in the database (migration_008_export_state)
+	database_migration.migrate(connection)
 
-		newline_pattern = re.compile('\n')
-		html_br = '<br>'
-		
-		answer = re.sub(newline_pattern, html_br, answer)
+	cursor = db_inter.create_cursor(connection)
+	logger.info(f'Cursor created as {cursor}')
 
-		writer.writerow({'question': question_card, 'answer': answer})
+	if EXPORT_ALL:
+		export_all(cursor)
+	else:
+		export_category(CATEGORY, cursor, EXPORT_FILE if EXPORT_FORMAT == 'csv' else get_export_file(CATEGORY))
 
-connection.commit()
-connection.close()
\ No newline at end of file
+	connection.close()
@@ -0,0 +1,372 @@
+"""
+Write Anki packages (.apkg) directly, so a deck (with its images) is imported in one step.
+
+An .apkg is a zip file with:
+
+	collection.anki2	an sqlite database with the notes & cards (schema version 11, which every Anki 2.1 imports)
+	media				json map of the media files in the zip: {"0": "131365.jpg", ...}
+	0, 1, ...			the media files themselves
+
+Notes are written to the collection as they are added, media files are only copied into the zip when the package is closed,
+in chunks (images are never loaded into memory as a whole), stored without compression (they are compressed images already).
+"""
+
+import hashlib
+import json
+import logger_setup
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+logger = logger_setup.create_logger(__name__)
+
+COLLECTION_SCHEMA = '''
+	CREATE TABLE col (
+		id integer PRIMARY KEY,
+		crt integer NOT NULL,
+		mod integer NOT NULL,
+		scm integer NOT NULL,
+		ver integer NOT NULL,
+		dty integer NOT NULL,
+		usn integer NOT NULL,
+		ls integer NOT NULL,
+		conf text NOT NULL,
+		models text NOT NULL,
+		decks text NOT NULL,
+		dconf text NOT NULL,
+		tags text NOT NULL
+	);
+
+	CREATE TABLE notes (
+		id integer PRIMARY KEY,
+		guid text NOT NULL,
+		mid integer NOT NULL,
+		mod integer NOT NULL,
+		usn integer NOT NULL,
+		tags text NOT NULL,
+		flds text NOT NULL,
+		sfld integer NOT NULL,
+		csum integer NOT NULL,
+		flags integer NOT NULL,
+		data text NOT NULL
+	);
+
+	CREATE TABLE cards (
+		id integer PRIMARY KEY,
+		nid integer NOT NULL,
+		did integer NOT NULL,
+		ord integer NOT NULL,
+		mod integer NOT NULL,
+		usn integer NOT NULL,
+		type integer NOT NULL,
+		queue integer NOT NULL,
+		due integer NOT NULL,
+		ivl integer NOT NULL,
+		factor integer NOT NULL,
+		reps integer NOT NULL,
+		lapses integer NOT NULL,
+		left integer NOT NULL,
+		odue integer NOT NULL,
+		odid integer NOT NULL,
+		flags integer NOT NULL,
+		data text NOT NULL
+	);
+
+	CREATE TABLE revlog (
+		id integer PRIMARY KEY,
+		cid integer NOT NULL,
+		usn integer NOT NULL,
+		time integer NOT NULL,
+		ease integer NOT NULL,
+		ivl integer NOT NULL,
+		lastIvl integer NOT NULL,
+		factor integer NOT NULL,
+		type integer NOT NULL
+	);
+
+	CREATE TABLE graves (
+		usn integer NOT NULL,
+		oid integer NOT NULL,
+		type integer NOT NULL
+	);
+
+	CREATE INDEX ix_notes_usn ON notes (usn);
+	CREATE INDEX ix_cards_usn ON cards (usn);
+	CREATE INDEX ix_revlog_usn ON revlog (usn);
+	CREATE INDEX ix_cards_nid ON cards (nid);
+	CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+	CREATE INDEX ix_revlog_cid ON revlog (cid);
+	CREATE INDEX ix_notes_csum ON notes (csum);
+'''
+
+# notes & cards are inserted NOTE_BATCH_SIZE at a time, with executemany
+NOTE_BATCH_SIZE = 1000
+
+# Anki separates the fields of a note with the unit separator
+FIELD_SEPARATOR = '\x1f'
+
+TAG_PATTERN = re.compile('<[^>]*>')
+
+MODEL_NAME = 'quizarchief'
+MODEL_FIELDS = ['Question', 'Answer']
+MODEL_CSS = '.card { font-family: arial; font-size: 20px; text-align: center; color: black; background-color: white; }'
+
+DEFAULT_DECK_CONFIG = {
+	'id': 1,
+	'name': 'Default',
+	'mod': 0,
+	'usn': 0,
+	'maxTaken': 60,
+	'autoplay': True,
+	'timer': 0,
+	'replayq': True,
+	'dyn': False,
+	'new': {'bury': True, 'delays': [1, 10], 'initialFactor': 2500, 'ints': [1, 4, 7], 'order': 1, 'perDay': 20, 'separate': True},
+	'lapse': {'delays': [10], 'leechAction': 0, 'leechFails': 8, 'minInt': 1, 'mult': 0},
+	'rev': {'bury': True, 'ease4': 1.3, 'fuzz': 0.05, 'ivlFct': 1, 'maxIvl': 36500, 'minSpace': 1, 'perDay': 100}
+}
+
+
+def get_stable_id(name):
+	"""Return an id for name that is the same in every package, so Anki recognises the deck & note type of an earlier import."""
+
+	return int(hashlib.sha1(name.encode('utf-8')).hexdigest()[:12], 16)
+
+
+def get_checksum(sort_field):
+	"""Return the checksum Anki uses to find duplicates: the first 8 hex digits of the sha1 of the first field, without html."""
+
+	return int(hashlib.sha1(sort_field.encode('utf-8')).hexdigest()[:8], 16)
+
+
+def create_model(model_id, deck_id, modified):
+
+	return {
+		'id': model_id,
+		'name': MODEL_NAME,
+		'type': 0,
+		'mod': modified,
+		'usn': -1,
+		'sortf': 0,
+		'did': deck_id,
+		'tmpls': [{
+			'name': 'Card 1',
+			'ord': 0,
+			'qfmt': '{{Question}}',
+			'afmt': '{{FrontSide}}<hr id=answer>{{Answer}}',
+			'bqfmt': '',
+			'bafmt': '',
+			'did': None
+		}],
+		'flds': [{'name': name, 'ord': ord, 'sticky': False, 'rtl': False, 'font': 'Arial', 'size': 20, 'media': []} for ord, name in enumerate(MODEL_FIELDS)],
+		'css': MODEL_CSS,
+		'latexPre': '\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}\n\\usepackage{amssymb,amsmath}\n\\pagestyle{empty}\n\\begin{document}\n',
+		'latexPost': '\\end{document}',
+		'tags': [],
+		'vers': [],
+		'req': [[0, 'all', [0]]]
+	}
+
+
+def create_deck(deck_id, deck_name, modified):
+
+	return {
+		'id': deck_id,
+		'name': deck_name,
+		'mod': modified,
+		'usn': -1,
+		'lrnToday': [0, 0],
+		'revToday': [0, 0],
+		'newToday': [0, 0],
+		'timeToday': [0, 0],
+		'collapsed': False,
+		'desc': '',
+		'dyn': 0,
+		'conf': 1,
+		'extendNew': 10,
+		'extendRev': 50
+	}
+
+
+class PackageWriter:
+	"""
+	Writes an Anki package with one deck (deck_name) of basic question/answer notes to package_file.
+
+	The package only shows up at package_file when it is complete (it is written to a temporary file first).
+
+	Usage:
+		with PackageWriter('film.apkg', 'film') as package:
+			package.add_note(guid, [question_html, answer_html], ['./film/131365.jpg'])
+	"""
+
+	def __init__(self, package_file, deck_name):
+		self.package_file = package_file
+
+		self.deck_id = get_stable_id(f'deck {deck_name}')
+		self.model_id = get_stable_id(f'model {MODEL_NAME}')
+
+		# ids of notes & cards are millisecond timestamps in Anki, they only have to be unique within the package
+		self.next_id = int(time.time() * 1000)
+		self.modified = int(time.time())
+
+		# media filename -> path of the file on disk, the html of the notes refers to the filename
+		self.media = {}
+		self.notes = 0
+
+		self.note_rows = []
+		self.card_rows = []
+
+		self.temporary_directory = tempfile.mkdtemp(prefix='anki-package-')
+		self.collection_path = os.path.join(self.temporary_directory, 'collection.anki2')
+
+		# the collection is a temporary file, that is only zipped when it is complete: no journal & no fsync
+		self.connection = sqlite3.connect(self.collection_path)
+		self.connection.execute('PRAGMA journal_mode = OFF')
+		self.connection.execute('PRAGMA synchronous = OFF')
+		self.connection.executescript(COLLECTION_SCHEMA)
+		self.write_collection_row(deck_name)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.close(write=exc_type is None)
+		return False
+
+	def write_collection_row(self, deck_name):
+		"""Write the collection itself: its configuration, note type & decks."""
+
+		milliseconds = self.modified * 1000
+
+		conf = {
+			'activeDecks': [1],
+			'curDeck': 1,
+			'newSpread': 0,
+			'collapseTime': 1200,
+			'timeLim': 0,
+			'estTimes': True,
+			'dueCounts': True,
+			'curModel': str(self.model_id),
+			'nextPos': 1,
+			'sortType': 'noteFld',
+			'sortBackwards': False,
+			'addToCur': True
+		}
+
+		models = {str(self.model_id): create_model(self.model_id, self.deck_id, self.modified)}
+		decks = {'1': create_deck(1, 'Default', self.modified), str(self.deck_id): create_deck(self.deck_id, deck_name, self.modified)}
+		dconf = {'1': DEFAULT_DECK_CONFIG}
+
+		self.connection.execute('''
+			INSERT INTO col (id, crt, mod, scm, ver, dty, usn, ls, conf, models, decks, dconf, tags)
+			VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, '{}')
+		''', (self.modified, milliseconds, milliseconds, json.dumps(conf), json.dumps(models), json.dumps(decks), json.dumps(dconf)))
+
+	def add_note(self, guid, fields, media_paths=(), tags=()):
+		"""
+		Add a note (& its card) to the package.
+
+		Arguments:
+		guid -- stable id of the note, importing a note with the guid of an existing one updates it
+		fields -- html of the fields of the note, see MODEL_FIELDS
+		media_paths -- paths of the files the fields refer to (by their basename), they are added to the package once
+		tags -- tag names, without spaces
+		"""
+
+		for media_path in media_paths:
+			self.media.setdefault(os.path.basename(media_path), media_path)
+
+		note_id = self.next_id
+		card_id = self.next_id + 1
+		self.next_id += 2
+
+		sort_field = TAG_PATTERN.sub('', fields[0])
+		tags = f' {" ".join(tags)} ' if tags else ''
+
+		self.note_rows.append((note_id, guid, self.model_id, self.modified, tags, FIELD_SEPARATOR.join(fields), sort_field, get_checksum(sort_field)))
+
+		# new cards are shown in the order of due
+		self.card_rows.append((card_id, note_id, self.deck_id, self.modified, self.notes))
+
+		self.notes += 1
+
+		if len(self.note_rows) >= NOTE_BATCH_SIZE:
+			self.write_notes()
+
+	def write_notes(self):
+		"""Insert the notes & cards that were added since the last call."""
+
+		self.connection.executemany('''
+			INSERT INTO notes (id, guid, mid, mod, usn, tags, flds, sfld, csum, flags, data)
+			VALUES (?, ?, ?, ?, -1, ?, ?, ?, ?, 0, '')
+		''', self.note_rows)
+
+		# type & queue 0: new cards
+		self.connection.executemany('''
+			INSERT INTO cards (id, nid, did, ord, mod, usn, type, queue, due, ivl, factor, reps, lapses, left, odue, odid, flags, data)
+			VALUES (?, ?, ?, 0, ?, -1, 0, 0, ?, 0, 0, 0, 0, 0, 0, 0, 0, '')
+		''', self.card_rows)
+
+		self.note_rows = []
+		self.card_rows = []
+
+	def write_package(self):
+		"""Zip the collection & the media to a temporary file next to package_file, then move it into place."""
+
+		os.makedirs(os.path.dirname(os.path.abspath(self.package_file)), exist_ok=True)
+
+		file_descriptor, temporary_package = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.package_file)), suffix='.part')
+		os.close(file_descriptor)
+
+		media_map = {}
+		missing_media = 0
+
+		try:
+			with zipfile.ZipFile(temporary_package, 'w') as package:
+				package.write(self.collection_path, 'collection.anki2', compress_type=zipfile.ZIP_DEFLATED)
+
+				for media_filename, media_path in self.media.items():
+
+					if not os.path.exists(media_path):
+						logger.debug(f'{media_path} is not on disk, it is left out of {self.package_file}')
+						missing_media += 1
+						continue
+
+					zip_name = str(len(media_map))
+
+					# ZipFile.write copies the file in chunks
+					package.write(media_path, zip_name, compress_type=zipfile.ZIP_STORED)
+					media_map[zip_name] = media_filename
+
+				package.writestr('media', json.dumps(media_map), compress_type=zipfile.ZIP_DEFLATED)
+
+			os.replace(temporary_package, self.package_file)
+
+		except BaseException:
+			os.remove(temporary_package)
+			raise
+
+		if missing_media:
+			logger.warning(f'{missing_media} media files are not on disk, they are left out of {self.package_file}')
+
+		logger.info(f'Wrote {self.notes} notes & {len(media_map)} media files to {self.package_file}')
+
+	def close(self, write=True):
+		"""Write the package (unless write is False, e.g. after an exception), remove the temporary collection."""
+
+		try:
+			if write:
+				self.write_notes()
+
+			self.connection.commit()
+			self.connection.close()
+
+			if write:
+				self.write_package()
+
+		finally:
+			shutil.rmtree(self.temporary_directory, ignore_errors=True)
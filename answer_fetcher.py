@@ -0,0 +1,54 @@
+"""
+Fetch the answers of a whole questionpage at once.
+
+Every question needs a request of its own for its answer (see scraper_utilities.find_answer),
+so answers are by far the most requests of a scrape. An AnswerFetcher sends them from a pool of threads,
+over the keep-alive connections of one session, instead of one after the other.
+Every request still goes through rate_limiter.limiter, so the pool never exceeds REQUESTS_PER_SECOND,
+it only keeps the round-trip time of one answer from holding up the next.
+"""
+
+import concurrent.futures
+import logger_setup
+import scraper_utilities as scraper_util
+import settings
+
+logger = logger_setup.create_logger(__name__)
+
+
+class AnswerFetcher:
+	"""
+	Fetches answers with a pool of max_workers threads, sharing session.
+
+	The session should keep at least max_workers connections (see scraper_utilities.create_session).
+
+	Usage:
+		with AnswerFetcher(session) as answer_fetcher:
+			answer_texts = answer_fetcher.fetch_answers(question_numbers)
+	"""
+
+	def __init__(self, session, max_workers=settings.ANSWER_FETCH_WORKERS):
+		self.session = session
+		self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.close()
+		return False
+
+	def fetch_answers(self, question_numbers):
+		"""
+		Return the answer_texts of question_numbers, in the same order.
+
+		An answer that could not be fetched is '' (empty string), like with scraper_utilities.find_answer
+		"""
+
+		answer_texts = list(self.executor.map(lambda question_number: scraper_util.find_answer(question_number, self.session), question_numbers))
+
+		logger.debug(f'Fetched {len(answer_texts)} answers.')
+		return answer_texts
+
+	def close(self):
+		self.executor.shutdown(wait=True, cancel_futures=True)
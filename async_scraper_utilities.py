@@ -0,0 +1,229 @@
+import asyncio
+import collections
+import html_archive
+import http_cache
+import logger_setup
+import rate_limiter
+import scraper_utilities as scraper_util
+import settings
+
+try:
+	import aiohttp
+except ImportError:
+	aiohttp = None
+
+logger = logger_setup.create_logger(__name__)
+
+
+def create_session(max_concurrent_requests=settings.MAX_CONCURRENT_REQUESTS):
+	"""Return an aiohttp ClientSession, which keeps its own connection pool & cookies."""
+
+	if aiohttp is None:
+		raise ImportError('The asyncio engine requires aiohttp: pip install aiohttp')
+
+	connector = aiohttp.TCPConnector(limit=max_concurrent_requests)
+	session = aiohttp.ClientSession(connector=connector)
+
+	logger.debug('Async session established')
+	return session
+
+
+async def login(session, username, password, limiter):
+	"""
+	Return HTTP status code -> 200 if logged in correctly.
+
+	Arguments:
+	session -- an aiohttp ClientSession
+	username -- your username on quizarchief.be
+	password -- your password on quizarchief.be
+	limiter -- the rate_limiter.RateLimiter every request has to go through
+	"""
+
+	credentials = {
+		'name': username,
+		'pass': password
+	}
+
+	login_url = 'https://www.quizarchief.be/login.php'
+	await limiter.wait_async(login_url)
+
+	async with session.post(login_url, data=credentials) as login_response:
+		login_status = login_response.status
+
+	logger.debug(f'Your attempt to log in, resulted in HTTP status code: {login_status}')
+
+	# a logged in session sees other pages, so it gets cached responses of its own
+	http_cache.set_login(session, username if login_status == 200 else '')
+
+	return login_status
+
+
+async def fetch(url, session, limiter, raise_for_status=False):
+	"""
+	Return the raw content (bytes) of url, fetched within the politeness budget of limiter.
+
+	Pages & answers are served from the http_cache while they are fresh & appended to the html_archive, see scraper_utilities.fetch
+	With raise_for_status, an error status (e.g. 429, 500 or 503) raises aiohttp.ClientResponseError, like scraper_utilities.get_questionpage does.
+	"""
+
+	cache_entry = None
+	headers = {}
+	use_cache = http_cache.is_enabled(url)
+	cache_login = http_cache.get_login(session)
+
+	if use_cache:
+		cache_entry = http_cache.lookup(url, cache_login)
+
+		if cache_entry and http_cache.is_fresh(cache_entry):
+			logger.debug(f'{url} was served from the cache.')
+			scraper_util.archive_cached_response(cache_entry)
+			return cache_entry.content
+
+		if cache_entry:
+			headers = http_cache.conditional_headers(cache_entry)
+
+	await limiter.wait_async(url)
+
+	async with session.get(url, headers=headers) as response:
+		content = await response.read()
+
+	logger.debug(f'{url} was fetched with status code: {response.status}')
+
+	if raise_for_status and response.status != 200 and not (response.status == 304 and cache_entry):
+		response.raise_for_status()
+
+	if use_cache:
+		if response.status == 304 and cache_entry:
+			http_cache.refresh(url, cache_login)
+			scraper_util.archive_cached_response(cache_entry)
+			return cache_entry.content
+
+		if response.status == 200 and scraper_util.is_cacheable(url, content):
+			http_cache.store(url, response.headers, content, cache_login)
+
+	if response.status == 200 and html_archive.is_enabled(url):
+		html_archive.archive(url, content)
+
+	return content
+
+
+async def find_answer(question_number, session, limiter):
+	"""
+	Return answer_text.
+	Return '' (empty string) if no answer_text could be fetched or extracted.
+
+	See scraper_utilities.find_answer
+	"""
+
+	answer_text = ''
+
+	try:
+		answer_url = scraper_util.construct_answer_url(question_number)
+		answer_content = await fetch(answer_url, session, limiter)
+
+		answer_text = scraper_util.parse_answer(answer_content, question_number)
+
+	except Exception as e:
+		logger.error(f'An exception occured while fetching answer for question with id: {question_number}, with exception message: \n {e}')
+
+	return answer_text
+
+
+async def process_questionpage(content, categorie, session, limiter, find_stored_question_numbers, only_new):
+	"""
+	Return (question_records, stop) for the raw content of a questionpage.
+
+	Parsing happens right away, the answers of all new questions on the page are fetched concurrently.
+	Images are left to the QuestionWriter, which downloads them in the background (see image_downloader.py).
+	stop is True when settings.ONLY_NEW is set and a question was found that is already in the database.
+
+	Arguments:
+	find_stored_question_numbers -- callable, question_numbers -> the ones that are already stored
+	"""
+
+	# pages of which all questions are already stored are not parsed at all
+	question_numbers = scraper_util.find_question_numbers_in_content(content)
+	stored_question_numbers = find_stored_question_numbers(question_numbers)
+
+	if question_numbers and len(stored_question_numbers) == len(question_numbers):
+		logger.info(f'All questions on this page are already in database.')
+		return [], only_new
+
+	parsed_question_records = scraper_util.parse_questionpage(content)
+
+	question_numbers = [question_record['question_number'] for question_record in parsed_question_records]
+	stored_question_numbers = set(find_stored_question_numbers(question_numbers))
+
+	question_records = []
+	stop = False
+
+	for question_record in parsed_question_records:
+
+		question_number = question_record['question_number']
+
+		if question_number in stored_question_numbers:
+			logger.info(f'Question {question_number} is already in database.')
+
+			if only_new:
+				logger.info(f'You set settings.ONLY_NEW to True, so downloading will stop.')
+				stop = True
+				break
+
+			continue
+
+		question_records.append(question_record)
+
+	answers = [find_answer(question_record['question_number'], session, limiter) for question_record in question_records]
+	answer_texts = await asyncio.gather(*answers)
+
+	for question_record, answer_text in zip(question_records, answer_texts):
+		question_record['answer_text'] = answer_text
+
+	return question_records, stop
+
+
+async def scrape_category(categorie, start_page, end_page, store_questions, find_stored_question_numbers,
+		only_new=settings.ONLY_NEW, credentials=settings.CREDENTIALS, limiter=rate_limiter.limiter, questions_per_page=settings.QUESTIONS_PER_PAGE):
+	"""
+	Scrape pages [start_page, end_page[ of categorie & hand the new question_records of every page to store_questions, in page order.
+	Return True if every page was processed, False if only_new stopped the scrape early.
+
+	While a page is being processed, the next settings.PAGE_PREFETCH pages are already being fetched.
+
+	Arguments:
+	store_questions -- callable, receives the pagenr & the list of question_record dictionaries of that page
+	find_stored_question_numbers -- callable, question_numbers -> the ones that are already stored
+	limiter -- the rate_limiter.RateLimiter every request has to go through, shared by all categories by default
+	questions_per_page -- page size, the pagenrs are counted in
+	"""
+
+	async with create_session() as session:
+
+		await login(session, username=credentials.get('username', None), password=credentials.get('password', None), limiter=limiter)
+
+		page_tasks = collections.deque()
+		next_pagenr = start_page
+
+		try:
+			for pagenr in range(start_page, end_page):
+
+				while next_pagenr < end_page and len(page_tasks) <= settings.PAGE_PREFETCH:
+					url = scraper_util.construct_url(categorie, next_pagenr, questions_per_page)
+					page_tasks.append(asyncio.create_task(fetch(url, session, limiter, raise_for_status=True)))
+					next_pagenr += 1
+
+				logger.info(f'Fetching results for page {pagenr}. \n')
+				content = await page_tasks.popleft()
+
+				question_records, stop = await process_questionpage(content, categorie, session, limiter, find_stored_question_numbers, only_new)
+
+				store_questions(pagenr, question_records)
+
+				if stop:
+					return False
+
+			return True
+
+		finally:
+			for page_task in page_tasks:
+				page_task.cancel()
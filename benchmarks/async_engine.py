@@ -0,0 +1,191 @@
+"""
+Wall-clock time of a scrape with each fetch engine, against a local stand-in server (see standin_server.py).
+
+	sequential	every page, answer & image is requested one after the other (the scraper before the asyncio engine)
+	threaded	main_scraper.scrape_category: page prefetch, answers from a pool of threads, images in the background
+	asyncio		main_scraper.scrape_category_asynchronously (settings.ASYNC_ENGINE)
+
+Every engine scrapes the same pages into a fresh database, in a fresh directory (so no image is on disk yet),
+through the same rate limiter. The stand-in delays every response by --latency seconds.
+
+Usage:
+	python benchmarks/async_engine.py
+	python benchmarks/async_engine.py --requests-per-second 10		bound by the politeness budget instead of the latency
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger_setup
+
+# the scraper modules log to a file in the cwd, which is the repo root when a benchmark is run
+logger_setup.LOG_FILENAME = os.path.join(tempfile.mkdtemp(prefix='benchmark-log-'), logger_setup.LOG_FILENAME)
+
+import settings
+import standin_server
+
+CATEGORY = 'film'
+
+SITE_URL = 'https://www.quizarchief.be/'
+
+ENGINES = ['sequential', 'threaded', 'asyncio']
+
+
+def configure(requests_per_second):
+	"""Set the settings the scraper modules read when they are imported: no cache, no archive, the given budget."""
+
+	settings.HTTP_CACHE_URL = None
+	settings.HTML_ARCHIVE_URL = None
+	settings.REQUESTS_PER_SECOND = requests_per_second
+	settings.BURST_SIZE = 1
+	settings.RATE_JITTER = 0
+	settings.ONLY_NEW = True
+
+
+def point_scraper_at(server):
+	"""Make the scraper request server instead of www.quizarchief.be."""
+
+	import async_scraper_utilities as async_scraper_util
+	import scraper_utilities as scraper_util
+
+	def construct_url(categorie, page_nr, questions_per_page=20):
+		return server.url(f'/categorie/{categorie}/{page_nr}/{questions_per_page}/1/0')
+
+	def construct_answer_url(question_number):
+		return server.url(f'/beantwoordevragen.php?vraagid={question_number}&page=categorie')
+
+	def login(session, username, password):
+		return scraper_util.fetch(server.url('/login.php'), session, method='post', data={'name': username, 'pass': password}).status_code
+
+	find_image_url = scraper_util.find_image_url
+
+	def find_standin_image_url(questionrow, question_number):
+		image_url = find_image_url(questionrow, question_number)
+		return image_url and image_url.replace(SITE_URL, server.base_url, 1)
+
+	async def login_async(session, username, password, limiter):
+		login_url = server.url('/login.php')
+		await limiter.wait_async(login_url)
+
+		async with session.post(login_url, data={'name': username, 'pass': password}) as login_response:
+			return login_response.status
+
+	scraper_util.construct_url = construct_url
+	scraper_util.construct_answer_url = construct_answer_url
+	scraper_util.login = login
+	scraper_util.find_image_url = find_standin_image_url
+	async_scraper_util.login = login_async
+
+
+def scrape_sequentially(category, start_page, end_page, questions_per_page, run_id, connection, cursor):
+	"""Scrape like the scraper did before the asyncio engine: one request at a time."""
+
+	import database_writer
+	import scraper_utilities as scraper_util
+
+	session = scraper_util.create_session()
+	scraper_util.login(session, username='', password='')
+
+	with database_writer.QuestionWriter(connection) as writer:
+
+		for pagenr in range(start_page, end_page):
+			content = scraper_util.get_questionpage(scraper_util.construct_url(category, pagenr, questions_per_page), session).content
+
+			for question_record in scraper_util.parse_questionpage(content):
+				question_record['answer_text'] = scraper_util.find_answer(question_record['question_number'], session)
+
+				if question_record['image_url']:
+					question_record['img_filename'] = scraper_util.download_image(question_record['image_url'], category, session)
+
+				writer.add(question_record, category)
+
+			writer.flush_page(run_id, category, pagenr)
+
+
+def run_engine(engine, pages, questions_per_page, parser_pool):
+	"""Scrape pages [1, pages] with engine in a fresh directory, return (seconds, questions stored, images stored)."""
+
+	import database_initialization
+	import database_interaction as db_inter
+	import main_scraper
+
+	scrape = {
+		'sequential': scrape_sequentially,
+		'threaded': lambda *arguments: main_scraper.scrape_category(*arguments, parser_pool),
+		'asyncio': main_scraper.scrape_category_asynchronously
+	}[engine]
+
+	os.chdir(tempfile.mkdtemp(prefix=f'benchmark-{engine}-'))
+
+	database_url = 'quizarchief.sqlite'
+	database_initialization.create_database(database_url)
+
+	# the lookup caches hold the ids of the previous database
+	db_inter.clear_lookup_caches()
+
+	connection = db_inter.make_connection(database_url)
+	cursor = db_inter.create_cursor(connection)
+
+	run_id = db_inter.start_run(CATEGORY, cursor)
+	connection.commit()
+
+	start = time.perf_counter()
+	scrape(CATEGORY, 1, pages + 1, questions_per_page, run_id, connection, cursor)
+	seconds = time.perf_counter() - start
+
+	questions = cursor.execute('SELECT COUNT(*) FROM question').fetchone()[0]
+	images = cursor.execute('SELECT COUNT(*) FROM image').fetchone()[0]
+
+	connection.close()
+
+	return seconds, questions, images
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--pages', type=int, default=3)
+	parser.add_argument('--questions-per-page', type=int, default=20)
+	parser.add_argument('--latency', type=float, default=0.05, help='seconds the stand-in delays every response')
+	parser.add_argument('--requests-per-second', type=float, default=1000, help='politeness budget, settings.REQUESTS_PER_SECOND')
+	parser.add_argument('--engines', nargs='+', choices=ENGINES, default=ENGINES)
+	arguments = parser.parse_args()
+
+	configure(arguments.requests_per_second)
+
+	# the scraper logs every question, only warnings & errors are shown
+	logging.disable(logging.INFO)
+
+	import parsing_pipeline
+
+	# created once, like main_scraper.main does for a run
+	parser_pool = parsing_pipeline.create_parser_pool()
+
+	try:
+		with standin_server.StandinServer(questions_per_category=arguments.pages * arguments.questions_per_page, latency=arguments.latency) as server:
+
+			point_scraper_at(server)
+
+			print(f'{arguments.pages} pages of {arguments.questions_per_page} questions, {arguments.latency * 1000:.0f} ms latency, at most {arguments.requests_per_second:g} requests per second')
+			print(f'{"engine":<12}{"seconds":>10}{"requests":>10}{"questions":>11}{"images":>8}')
+
+			for engine in arguments.engines:
+				requests_before = server.requests
+				seconds, questions, images = run_engine(engine, arguments.pages, arguments.questions_per_page, parser_pool)
+
+				print(f'{engine:<12}{seconds:>10.2f}{server.requests - requests_before:>10}{questions:>11}{images:>8}')
+
+	finally:
+		if parser_pool:
+			parser_pool.shutdown(wait=True, cancel_futures=True)
+
+
+# the guard keeps the parser processes (see parsing_pipeline.py) from running the benchmark again
+if __name__ == '__main__':
+	main()
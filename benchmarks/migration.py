@@ -0,0 +1,170 @@
+"""
+Lookup times before & after the schema migrations (see database_migration.py), on a synthetic database.
+
+The database is created like the scraper did before the migrations existed (tables only, schema version 0),
+filled with --questions questions (with quizzes, tags, images & youtube fragments, and a few duplicates),
+then migrated to the latest version in place.
+
+Usage:
+	python benchmarks/migration.py
+	python benchmarks/migration.py --questions 50000
+"""
+
+import argparse
+import functools
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger_setup
+
+# the scraper modules log to a file in the cwd, which is the repo root when a benchmark is run
+logger_setup.LOG_FILENAME = os.path.join(tempfile.mkdtemp(prefix='benchmark-log-'), logger_setup.LOG_FILENAME)
+
+import database_initialization
+import database_interaction as db_inter
+import database_migration
+
+CATEGORIES = 30
+QUESTIONS_PER_QUIZ = 40
+TAGS = 5000
+
+# one in DUPLICATE_EVERY rows of quiz, tag & question is stored twice, like a scraper without constraints could
+DUPLICATE_EVERY = 1000
+
+
+def create_unmigrated_database(database_url):
+	"""Create a database like database_initialization.py did before database_migration.py: tables only, version 0."""
+
+	migrate = database_migration.migrate
+	database_migration.migrate = lambda connection: 0
+
+	try:
+		database_initialization.create_database(database_url)
+	finally:
+		database_migration.migrate = migrate
+
+
+def fill_database(connection, questions):
+	"""Insert questions synthetic questions, return their question_numbers."""
+
+	cursor = connection.cursor()
+	quizzes = questions // QUESTIONS_PER_QUIZ + 1
+
+	cursor.executemany('INSERT INTO category (category_name) VALUES (?)', [(f'categorie-{i}',) for i in range(CATEGORIES)])
+
+	cursor.executemany('INSERT INTO quiz (quiz_name, quiz_year, quiz_url, quiz_organiser) VALUES (?, ?, ?, ?)', (
+		(f'Quiz {i}', '2016', f'https://www.quizarchief.be/speelquiz/quiz-{i}', f'Quizteam {i % 100}')
+		for i in list(range(quizzes)) + list(range(0, quizzes, DUPLICATE_EVERY))
+	))
+
+	cursor.executemany('INSERT INTO tag (tag_name) VALUES (?)', (
+		(f'tag-{i}',) for i in list(range(TAGS)) + list(range(0, TAGS, DUPLICATE_EVERY))
+	))
+
+	question_numbers = list(range(1, questions + 1))
+
+	cursor.executemany('INSERT INTO question (question_number, question_text, answer_text, category_id, quiz_id) VALUES (?, ?, ?, ?, ?)', (
+		(question_number, f'Wie zoeken we bij vraag {question_number}?', f'Antwoord {question_number}', question_number % CATEGORIES + 1, question_number // QUESTIONS_PER_QUIZ + 1)
+		for question_number in question_numbers + question_numbers[::DUPLICATE_EVERY]
+	))
+
+	cursor.execute('INSERT INTO question_tag (question_id, tag_id) SELECT question_id, question_id % ? + 1 FROM question', (TAGS,))
+	cursor.execute('INSERT OR IGNORE INTO question_tag (question_id, tag_id) SELECT question_id, question_id * 7 % ? + 1 FROM question', (TAGS,))
+
+	cursor.execute("INSERT INTO image (img_filename, question_id) SELECT question_number || '.jpg', question_id FROM question WHERE question_id % 3 = 0")
+	cursor.execute("INSERT INTO youtube_fragment (youtube_id, youtube_watch, question_id) SELECT 'yt' || question_number, 'https://www.youtube.com/watch?v=yt' || question_number, question_id FROM question WHERE question_id % 10 = 1")
+
+	connection.commit()
+
+	return question_numbers
+
+
+def time_lookups(cursor, question_numbers, lookups):
+	"""Return {lookup: milliseconds per call}, for lookups random keys each."""
+
+	sample = random.Random(0)
+	question_sample = sample.sample(question_numbers, lookups)
+	quizzes = len(question_numbers) // QUESTIONS_PER_QUIZ
+
+	calls = {
+		'get_question_id': [(db_inter.get_question_id, question_number) for question_number in question_sample],
+		'get_quiz_id_with_quiz_url': [(db_inter.get_quiz_id_with_quiz_url, f'https://www.quizarchief.be/speelquiz/quiz-{sample.randrange(quizzes)}') for i in range(lookups)],
+		'get_tag_id': [(db_inter.get_tag_id, f'tag-{sample.randrange(TAGS)}') for i in range(lookups)],
+		'get_category_id': [(db_inter.get_category_id, f'categorie-{sample.randrange(CATEGORIES)}') for i in range(lookups)],
+		'export one category': [(db_inter.get_questions_with_image_and_youtube_fragment_for_category, sample.randrange(CATEGORIES) + 1) for i in range(3)],
+	}
+
+	milliseconds = {}
+
+	for name, lookup_calls in calls.items():
+		start = time.perf_counter()
+
+		for lookup, key in lookup_calls:
+			lookup(key, cursor)
+
+		milliseconds[name] = (time.perf_counter() - start) * 1000 / len(lookup_calls)
+
+	return milliseconds
+
+
+def timed(migration, seconds):
+	"""Return migration, which adds the time it takes to seconds[migration.__name__]."""
+
+	@functools.wraps(migration)
+	def timed_migration(cursor):
+		start = time.perf_counter()
+		migration(cursor)
+		seconds[migration.__name__] = time.perf_counter() - start
+
+	return timed_migration
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--questions', type=int, default=500000)
+	parser.add_argument('--lookups', type=int, default=50, help='number of lookups of every kind that is timed')
+	arguments = parser.parse_args()
+
+	# the migrations log every step, only warnings & errors are shown
+	logging.disable(logging.INFO)
+
+	database_url = os.path.join(tempfile.mkdtemp(prefix='benchmark-migration-'), 'quizarchief_v003.sqlite')
+	create_unmigrated_database(database_url)
+
+	connection = db_inter.make_connection(database_url)
+
+	start = time.perf_counter()
+	question_numbers = fill_database(connection, arguments.questions)
+	print(f'{arguments.questions} questions written in {time.perf_counter() - start:.1f} s')
+
+	before = time_lookups(connection.cursor(), question_numbers, arguments.lookups)
+
+	seconds = {}
+	database_migration.MIGRATIONS = [timed(migration, seconds) for migration in database_migration.MIGRATIONS]
+
+	start = time.perf_counter()
+	database_migration.migrate(connection)
+	print(f'migrated to version {len(database_migration.MIGRATIONS)} in {time.perf_counter() - start:.1f} s')
+
+	for name, migration_seconds in seconds.items():
+		print(f'	{name:<50}{migration_seconds:>8.2f} s')
+
+	after = time_lookups(connection.cursor(), question_numbers, arguments.lookups)
+
+	print(f'{"ms per call":<30}{"before":>10}{"after":>10}')
+
+	for name in before:
+		print(f'{name:<30}{before[name]:>10.3f}{after[name]:>10.3f}')
+
+	connection.close()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,170 @@
+"""
+Check that every parser backend (see settings.PARSER) extracts the same question_records as html5lib.
+
+html5lib parses pages exactly like a browser does, so its question_records are the reference.
+Every page is parsed with scraper_utilities.parse_questionpage, which runs find_all_questionrows, find_question,
+find_quiz_info, find_image_url, find_youtube_fragment & find_tags on every questionrow, with every backend in BACKENDS.
+
+Answers are cut out of the raw xhr-response with a regular expression (scraper_utilities.parse_answer),
+the reference for every answer fixture is the text of its first <b>-element in the html5lib tree.
+
+The pages are the fixtures in benchmarks/fixtures/: hand-made pages with edge cases, and in benchmarks/fixtures/site/
+questionpages & answers as the site sent them (saved with save_fixtures.py), with --archive also every questionpage in the raw html archive
+(see html_archive.py). Only pages of the site itself show how the parsers differ on its markup.
+The exit status is 1 if any page gives different question_records, or any answer a different answer_text.
+
+Usage:
+	python benchmarks/parser_parity.py
+	python benchmarks/parser_parity.py --archive
+"""
+
+import argparse
+import glob
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger_setup
+
+# the scraper modules log to a file in the cwd, which is the repo root when a benchmark is run
+logger_setup.LOG_FILENAME = os.path.join(tempfile.mkdtemp(prefix='benchmark-log-'), logger_setup.LOG_FILENAME)
+
+import html_archive
+import scraper_utilities as scraper_util
+import settings
+
+FIXTURE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# fixtures saved from the site, see save_fixtures.py
+SITE_FIXTURE_DIRECTORY = os.path.join(FIXTURE_DIRECTORY, 'site')
+
+# (name, parser, only_questionrows)
+BACKENDS = [
+	('lxml', 'lxml', False),
+	('lxml, questionrows', 'lxml', True),
+]
+
+
+def parse(content, parser, only_questionrows):
+	"""Return the question_records of content, parsed with parser."""
+
+	settings.PARSER = parser
+	return scraper_util.parse_questionpage(content, only_questionrows)
+
+
+def iterate_fixtures(pattern):
+	"""Yield (name, content) for every fixture that matches pattern, the hand-made ones first, then the ones saved from the site."""
+
+	for directory in (FIXTURE_DIRECTORY, SITE_FIXTURE_DIRECTORY):
+		for path in sorted(glob.glob(os.path.join(directory, pattern))):
+			with open(path, 'rb') as fixture_file:
+				yield os.path.relpath(path, FIXTURE_DIRECTORY), fixture_file.read()
+
+
+def iterate_fixture_pages():
+	"""Yield (name, content) for every fixture questionpage."""
+
+	return iterate_fixtures('questionpage_*.html')
+
+
+def iterate_fixture_answers():
+	"""Yield (name, content) for every fixture answer."""
+
+	return iterate_fixtures('answer_*.html')
+
+
+def parse_answer_reference(content):
+	"""Return the answer_text of an answer xhr-response, as the text of its first <b>-element in the html5lib tree."""
+
+	bold = scraper_util.create_soup(content, parser='html5lib', from_encoding='UTF-8').find('b')
+	return bold.get_text().strip() if bold else ''
+
+
+def iterate_archived_pages():
+	"""Yield (name, content) for every questionpage in the raw html archive."""
+
+	for (category, pagenr), content in html_archive.iterate_pages():
+		yield f'archive {category} page {pagenr}', content
+
+
+def compare(expected_question_records, question_records):
+	"""Return a description of every difference between two lists of question_records."""
+
+	differences = []
+
+	if len(question_records) != len(expected_question_records):
+		differences.append(f'{len(question_records)} questionrows instead of {len(expected_question_records)}')
+
+	for expected_question_record, question_record in zip(expected_question_records, question_records):
+		for key, expected_value in expected_question_record.items():
+			if question_record.get(key) != expected_value:
+				differences.append(f'question {expected_question_record["question_number"]}, {key}: {question_record.get(key)!r} instead of {expected_value!r}')
+
+	return differences
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--archive', action='store_true', help='also check every questionpage in the raw html archive')
+	arguments = parser.parse_args()
+
+	# the find_* functions log every question, and the fixtures have questionrows without quiz info on purpose, which are logged as errors
+	logging.disable(logging.ERROR)
+
+	pages = list(iterate_fixture_pages())
+	answers = list(iterate_fixture_answers())
+
+	if not glob.glob(os.path.join(SITE_FIXTURE_DIRECTORY, 'questionpage_*.html')):
+		print(f'No pages of the site in {SITE_FIXTURE_DIRECTORY}, save some with: python benchmarks/save_fixtures.py')
+
+	if arguments.archive:
+		pages.extend(iterate_archived_pages())
+
+	failed_pages = 0
+	question_records_checked = 0
+
+	for name, content in pages:
+
+		expected_question_records = parse(content, 'html5lib', False)
+		question_records_checked += len(expected_question_records)
+
+		page_differences = []
+
+		for backend_name, backend_parser, only_questionrows in BACKENDS:
+			differences = compare(expected_question_records, parse(content, backend_parser, only_questionrows))
+			page_differences.extend(f'{backend_name}: {difference}' for difference in differences)
+
+		if page_differences:
+			failed_pages += 1
+			print(f'{name}: DIFFERENT')
+
+			for difference in page_differences:
+				print(f'	{difference}')
+		else:
+			print(f'{name}: identical ({len(expected_question_records)} questions)')
+
+	failed_answers = 0
+
+	for name, content in answers:
+		expected_answer_text = parse_answer_reference(content)
+		answer_text = scraper_util.parse_answer(content, name)
+
+		if answer_text != expected_answer_text:
+			failed_answers += 1
+			print(f'{name}: DIFFERENT')
+			print(f'	{answer_text!r} instead of {expected_answer_text!r}')
+		else:
+			print(f'{name}: identical')
+
+	print(f'{len(pages) - failed_pages} of {len(pages)} pages identical, {question_records_checked} questions checked')
+	print(f'{len(answers) - failed_answers} of {len(answers)} answers identical')
+
+	return 1 if failed_pages or failed_answers else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Parse time & memory per questionpage, for every parser backend (see settings.PARSER & settings.PARSE_ONLY_QUESTIONROWS).
+
+Every page is parsed --repeat times with scraper_utilities.parse_questionpage (the soup & every find_* function),
+in this process, so the time is the CPU time of one parser process (see parsing_pipeline.py).
+The memory is the peak of the memory python allocates while parsing the largest page once (tracemalloc).
+
+The pages are the fixture questionpages in benchmarks/fixtures/ (with the pages saved from the site in benchmarks/fixtures/site/, see save_fixtures.py)
+or, with --archive, the questionpages in the raw html archive.
+
+Usage:
+	python benchmarks/parsing.py
+	python benchmarks/parsing.py --archive --repeat 1
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger_setup
+
+# the scraper modules log to a file in the cwd, which is the repo root when a benchmark is run
+logger_setup.LOG_FILENAME = os.path.join(tempfile.mkdtemp(prefix='benchmark-log-'), logger_setup.LOG_FILENAME)
+
+import parser_parity
+import scraper_utilities as scraper_util
+import settings
+
+# (name, parser, only_questionrows)
+BACKENDS = [
+	('html5lib', 'html5lib', False),
+	('lxml', 'lxml', False),
+	('lxml, questionrows', 'lxml', True),
+]
+
+
+def time_backend(pages, parser, only_questionrows, repeat):
+	"""Return the milliseconds parse_questionpage takes per page with parser."""
+
+	settings.PARSER = parser
+
+	start = time.perf_counter()
+
+	for i in range(repeat):
+		for name, content in pages:
+			scraper_util.parse_questionpage(content, only_questionrows)
+
+	return (time.perf_counter() - start) * 1000 / (repeat * len(pages))
+
+
+def measure_peak_memory(content, parser, only_questionrows):
+	"""Return the peak number of KiB allocated while content is parsed with parser."""
+
+	settings.PARSER = parser
+
+	tracemalloc.start()
+	scraper_util.parse_questionpage(content, only_questionrows)
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	return peak / 1024
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--archive', action='store_true', help='parse the questionpages in the raw html archive instead of the fixtures')
+	parser.add_argument('--repeat', type=int, default=20, help='number of times every page is parsed')
+	arguments = parser.parse_args()
+
+	# the find_* functions log every question, and the fixtures have questionrows without quiz info on purpose, which are logged as errors
+	logging.disable(logging.ERROR)
+
+	if arguments.archive:
+		pages = list(parser_parity.iterate_archived_pages())
+	else:
+		pages = list(parser_parity.iterate_fixture_pages())
+
+	print(f'{len(pages)} pages, {sum(len(content) for name, content in pages) // len(pages) // 1024} KiB per page on average, parsed {arguments.repeat} times')
+	print(f'{"parser":<22}{"ms per page":>12}{"peak KiB":>10}')
+
+	largest_content = max((content for name, content in pages), key=len)
+
+	for name, backend_parser, only_questionrows in BACKENDS:
+		milliseconds = time_backend(pages, backend_parser, only_questionrows, arguments.repeat)
+		peak_kib = measure_peak_memory(largest_content, backend_parser, only_questionrows)
+
+		print(f'{name:<22}{milliseconds:>12.1f}{peak_kib:>10.0f}')
+
+
+if __name__ == '__main__':
+	main()
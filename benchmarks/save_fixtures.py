@@ -0,0 +1,139 @@
+"""
+Save real questionpages & answers of the site as fixtures for parser_parity.py & parsing.py, in benchmarks/fixtures/site/.
+
+Hand-made fixtures can not show how the parsers differ on the markup of the site itself (broken nesting, entities, stray tags, ...),
+so the parity check needs pages as the server sent them. Every questionpage is saved with the answers of its questions:
+
+	questionpage_{category}_{pagenr}.html
+	answer_{question_number}.html
+
+By default the pages are taken from the raw html archive (see html_archive.py), without a single request.
+With --live, they are fetched from the site, logged in with settings.CREDENTIALS & within the politeness budget (settings.REQUESTS_PER_SECOND).
+Pick pages of several categories & from far apart (old pages have older markup).
+
+Usage:
+	python benchmarks/save_fixtures.py --pages 10
+	python benchmarks/save_fixtures.py --live film 1 250 muziek 1 80
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger_setup
+
+# the scraper modules log to a file in the cwd, which is the repo root when a benchmark is run
+logger_setup.LOG_FILENAME = os.path.join(tempfile.mkdtemp(prefix='benchmark-log-'), logger_setup.LOG_FILENAME)
+
+import html_archive
+import scraper_utilities as scraper_util
+import settings
+
+SITE_FIXTURE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'site')
+
+
+def save(name, content):
+	"""Write content (bytes) to the fixture name, as is."""
+
+	os.makedirs(SITE_FIXTURE_DIRECTORY, exist_ok=True)
+
+	with open(os.path.join(SITE_FIXTURE_DIRECTORY, name), 'wb') as fixture_file:
+		fixture_file.write(content)
+
+
+def save_page(category, pagenr, content, get_answer):
+	"""Save a questionpage & the answers of its questions (get_answer: question_number -> raw content, or None), return the number of answers saved."""
+
+	save(f'questionpage_{category}_{pagenr}.html', content)
+	answers_saved = 0
+
+	for question_number in scraper_util.find_question_numbers_in_content(content):
+		answer_content = get_answer(question_number)
+
+		if answer_content is not None:
+			save(f'answer_{question_number}.html', answer_content)
+			answers_saved += 1
+
+	return answers_saved
+
+
+def save_archived_pages(max_pages):
+	"""Save the max_pages most recently archived questionpages (one version of every page), with their archived answers."""
+
+	saved_pages = set()
+
+	with html_archive.AnswerReader() as answer_reader:
+		for (category, pagenr), content in html_archive.iterate_pages():
+
+			if len(saved_pages) >= max_pages:
+				break
+
+			if (category, pagenr) in saved_pages:
+				continue
+
+			answers_saved = save_page(category, pagenr, content, answer_reader.get)
+			saved_pages.add((category, pagenr))
+
+			print(f'{category} page {pagenr}: saved, with {answers_saved} answers')
+
+
+def save_live_pages(category_pages):
+	"""Fetch & save every (category, pagenr) in category_pages, with the answers of its questions."""
+
+	session = scraper_util.create_session()
+	scraper_util.login(session, username=settings.CREDENTIALS.get('username', None), password=settings.CREDENTIALS.get('password', None))
+
+	def get_answer(question_number):
+		answer = scraper_util.fetch(scraper_util.construct_answer_url(question_number), session)
+		return answer.content if answer.status_code == 200 else None
+
+	for category, pagenr in category_pages:
+		content = scraper_util.get_questionpage(scraper_util.construct_url(category, pagenr, settings.QUESTIONS_PER_PAGE), session).content
+		answers_saved = save_page(category, pagenr, content, get_answer)
+
+		print(f'{category} page {pagenr}: saved, with {answers_saved} answers')
+
+
+def parse_category_pages(arguments):
+	"""Return [(category, pagenr), ...] for arguments like ['film', '1', '250', 'muziek', '1']."""
+
+	category_pages = []
+	category = None
+
+	for argument in arguments:
+		if argument.isdigit():
+			if category is None:
+				raise ValueError(f'Page {argument} comes before any category.')
+
+			category_pages.append((category, int(argument)))
+		else:
+			category = argument
+
+	return category_pages
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--pages', type=int, default=10, help='number of archived questionpages to save')
+	parser.add_argument('--live', nargs='+', metavar='CATEGORY_OR_PAGENR', help='fetch these pages from the site instead, e.g. film 1 250 muziek 1')
+	arguments = parser.parse_args()
+
+	# the scraper logs every request & question
+	logging.disable(logging.INFO)
+
+	# the fixtures are what the server sent, not a version from the cache or another archive entry
+	settings.HTTP_CACHE_URL = None
+
+	if arguments.live:
+		save_live_pages(parse_category_pages(arguments.live))
+	else:
+		save_archived_pages(arguments.pages)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,241 @@
+"""
+A local stand-in for www.quizarchief.be, for the benchmarks in this directory.
+
+It serves the urls the scraper requests, with the markup the find_* functions of scraper_utilities.py expect:
+
+	/categorie/{category}/{pagenr}/{questions_per_page}/1/0		questionpages, newest question first
+	/beantwoordevragen.php?vraagid={question_number}				answers
+	/prodgfx/vragen/q/{hash}_{question_number}.jpg					images
+	/login.php														always 200
+
+Every response is sent after latency seconds, like the round trip to the real server.
+
+Usage:
+	with StandinServer(questions_per_category=200, latency=0.05) as server:
+		server.url('/categorie/film/1/20/1/0')
+"""
+
+import hashlib
+import html
+import http.server
+import re
+import threading
+import time
+import urllib.parse
+
+QUESTIONPAGE_PATTERN = re.compile(r'^/categorie/(?P<category>[^/]+)/(?P<pagenr>\d+)/(?P<questions_per_page>\d+)/')
+IMAGE_PATTERN = re.compile(r'^/prodgfx/vragen/q/\w+_(?P<question_number>\d+)\.jpg$')
+
+PAGE_HEADER = '''<!DOCTYPE html>
+<html lang="nl">
+<head>
+<meta charset="utf-8">
+<title>Quizarchief - {category}</title>
+<link rel="stylesheet" href="css/bootstrap.min.css">
+<script src="js/jquery.min.js"></script>
+<script>
+	function toonantwoord(vraagid) {{ $.get('beantwoordevragen.php?vraagid=' + vraagid + '&page=categorie', function(data) {{ $('#antwoord_' + vraagid).html(data); }}); }}
+</script>
+</head>
+<body>
+<nav class="navbar"><ul>{navigation}</ul></nav>
+<div class="container"><div class="row">
+<div class="col-lg-8">
+'''
+
+PAGE_FOOTER = '''
+</div>
+<div class="col-lg-4"><div class="sidebar">{sidebar}</div></div>
+</div></div>
+<footer><p>&copy; Quizarchief</p><script>var pagina = {pagenr};</script></footer>
+</body>
+</html>
+'''
+
+
+def make_image_src(question_number):
+	image_hash = hashlib.md5(str(question_number).encode()).hexdigest()
+	return f'prodgfx/vragen/q/{image_hash}_{question_number}.jpg'
+
+
+def make_questionrow(question_number):
+	"""
+	Return the html of the questionrow of question_number.
+
+	The question_number decides what the questionrow has, so every page has a bit of everything:
+	tags or not, an image, a youtube fragment (<object> or <iframe>), a quiz with or without organiser, entities & <br/>s.
+	"""
+
+	variant = question_number % 6
+
+	tags = ''
+
+	if variant != 1:
+		tags = ''.join(f'<a id="tag_{question_number * 10 + i}" href="tags/tag-{(question_number + i) % 50}">tag {(question_number + i) % 50}</a> ' for i in range(1 + question_number % 3))
+
+	question_text = f'Wie zoeken we bij vraag {question_number}? Een &quot;klassieker&quot; &amp; niet zo moeilijk, of toch w&eacute;l?'
+
+	if tags:
+		question_div = f'<div class="vragenrij"><div style="float:left;">{tags}</div><div style="clear:both;"></div>{question_text}</div>'
+	else:
+		question_div = f'<div class="vragenrij">{question_text}</div>'
+
+	visual = ''
+
+	if variant in (0, 3):
+		visual = f'<center><img src="{make_image_src(question_number)}" style="max-width:100%;"><br/></center>'
+
+	elif variant == 4:
+		visual = (
+			f'<center><object type="application/x-shockwave-flash" width="100%" height="40" data="https://www.youtube.com/v/yt{question_number}?version=2&amp;autoplay=0"></object></center>'
+			f'<a id="brokenyoutubelink_{question_number}">Rapporteer dode link</a>'
+		)
+
+	elif variant == 5:
+		visual = (
+			f'<div class="video-container"><iframe allowfullscreen="" width="100%" src="https://www.youtube.com/embed/yt{question_number}?version=2&amp;rel=0"></iframe></div>'
+			f'<a id="brokenyoutubelink_{question_number}">Rapporteer dode link</a>'
+		)
+
+	quiz_number = question_number // 40
+	quiz_links = (
+		f'<a href="quiz/testquiz-{quiz_number}-2016"><strong>TestQuiz {quiz_number}</strong> (2016)</a>, '
+		f'<a href="quiz/testquiz-{quiz_number}-2016/1"><strong>ronde {question_number % 8 + 1}, vraag {question_number % 10 + 1}</strong></a>'
+	)
+
+	if variant != 2:
+		quiz_links += f', door <a href="quizteam/team-{quiz_number % 7}"><strong>Quizteam {quiz_number % 7}</strong></a>'
+
+	return (
+		f'<div id="vragenrij_{question_number}" class="row">'
+		f'{question_div}'
+		f'{visual}'
+		f'<div id="antwoord_{question_number}"><a href="javascript:toonantwoord({question_number});">Toon antwoord</a></div>'
+		f'<div id="toonbron_{question_number}"><div><span>Uit: {quiz_links}</span></div></div>'
+		f'<div class="likes"><span>{question_number % 13} likes</span><br/></div>'
+		f'</div>\n'
+	)
+
+
+def make_questionpage(category, pagenr, questions_per_page, questions_per_category):
+	"""Return the html of page pagenr of category, the question_numbers of category are 1 up to questions_per_category."""
+
+	first_question_number = questions_per_category - (pagenr - 1) * questions_per_page
+	question_numbers = range(first_question_number, max(first_question_number - questions_per_page, 0), -1)
+
+	navigation = ''.join(f'<li><a href="categorie/categorie-{i}">Categorie {i}</a></li>' for i in range(30))
+	sidebar = ''.join(f'<div class="quiz"><a href="quiz/quiz-{i}"><strong>Quiz {i}</strong></a><p>{"Lorem ipsum dolor sit amet. " * 4}</p></div>' for i in range(20))
+
+	return ''.join((
+		PAGE_HEADER.format(category=html.escape(category), navigation=navigation),
+		''.join(make_questionrow(question_number) for question_number in question_numbers),
+		PAGE_FOOTER.format(sidebar=sidebar, pagenr=pagenr)
+	))
+
+
+def make_answer(question_number):
+	return f'<div class="antwoord"><b>Antwoord {question_number} &amp; co</b><br/><span>{question_number % 13} likes</span></div>'
+
+
+class StandinHandler(http.server.BaseHTTPRequestHandler):
+
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		self.server.count_request()
+		time.sleep(self.server.latency)
+
+		url = urllib.parse.urlsplit(self.path)
+		questionpage_match = QUESTIONPAGE_PATTERN.match(url.path)
+		image_match = IMAGE_PATTERN.match(url.path)
+
+		if questionpage_match:
+			body = make_questionpage(
+				questionpage_match.group('category'),
+				int(questionpage_match.group('pagenr')),
+				int(questionpage_match.group('questions_per_page')),
+				self.server.questions_per_category
+			).encode('utf-8')
+			self.respond(body, 'text/html; charset=utf-8')
+
+		elif url.path == '/beantwoordevragen.php':
+			question_number = int(urllib.parse.parse_qs(url.query)['vraagid'][0])
+			self.respond(make_answer(question_number).encode('utf-8'), 'text/html; charset=utf-8')
+
+		elif image_match:
+			self.respond(self.server.image, 'image/jpeg')
+
+		else:
+			self.respond(b'', 'text/html', status=404)
+
+	def do_POST(self):
+		self.server.count_request()
+		self.rfile.read(int(self.headers.get('Content-Length', 0)))
+		time.sleep(self.server.latency)
+		self.respond(b'<html><body>ok</body></html>', 'text/html')
+
+	def respond(self, body, content_type, status=200):
+		self.send_response(status)
+		self.send_header('Content-Type', content_type)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+
+class CountingHTTPServer(http.server.ThreadingHTTPServer):
+	"""Counts the requests it answers, over all its threads."""
+
+	daemon_threads = True
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+
+		self.requests = 0
+		self.requests_lock = threading.Lock()
+
+	def count_request(self):
+		with self.requests_lock:
+			self.requests += 1
+
+
+class StandinServer:
+	"""
+	Serves the stand-in site from a thread, on a free port of 127.0.0.1.
+
+	Arguments:
+	questions_per_category -- every category has the question_numbers 1 up to this one
+	latency -- seconds every response is delayed
+	image_size -- size in bytes of every image
+	"""
+
+	def __init__(self, questions_per_category=200, latency=0.05, image_size=20 * 1024):
+		self.server = CountingHTTPServer(('127.0.0.1', 0), StandinHandler)
+
+		self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+		self.server.latency = latency
+		self.server.questions_per_category = questions_per_category
+		self.server.image = bytes(range(256)) * (image_size // 256)
+
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+	def __enter__(self):
+		self.thread.start()
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.server.shutdown()
+		self.server.server_close()
+		return False
+
+	@property
+	def requests(self):
+		"""Number of requests answered so far."""
+
+		return self.server.requests
+
+	def url(self, path):
+		return urllib.parse.urljoin(self.base_url, path.lstrip('/'))
@@ -0,0 +1,238 @@
+"""
+Scrape several categories at the same time (see settings.CONCURRENT_CATEGORIES).
+
+A pool of worker threads shares one logged-in session (with a keep-alive connection per worker)
+and takes pages from a PageScheduler, which deals them out round-robin over the active categories,
+so a category with thousands of pages does not hold up the small ones.
+Every request still goes through rate_limiter.limiter, so all workers together stay within REQUESTS_PER_SECOND.
+
+The workers hand their pages to the calling thread, which is the only one writing to the database,
+with one QuestionWriter, one transaction per page.
+"""
+
+import answer_fetcher
+import collections
+import concurrent.futures
+import database_interaction as db_inter
+import database_writer
+import logger_setup
+import queue
+import scraper_utilities as scraper_util
+import settings
+import threading
+
+logger = logger_setup.create_logger(__name__)
+
+END_OF_WORKER = None
+
+
+class PageScheduler:
+	"""
+	Deals out (category, pagenr) for a number of categories, round-robin.
+
+	At most max_active_categories categories are scraped at the same time,
+	when one runs out of pages (or is stopped), the next category takes its place.
+
+	Usage:
+		scheduler = PageScheduler({'film': range(1, 10), 'muziek': range(1, 4)}, max_active_categories=2)
+		scheduler.next_page()	# ('film', 1), ('muziek', 1), ('film', 2), ...
+	"""
+
+	def __init__(self, page_ranges, max_active_categories):
+		self.lock = threading.Lock()
+
+		# category -> pagenrs that were not dealt out yet
+		self.pages = collections.OrderedDict((category, collections.deque(pagenrs)) for category, pagenrs in page_ranges.items())
+
+		self.waiting = collections.deque(self.pages)
+		self.turns = collections.deque()
+
+		for i in range(max_active_categories):
+			if self.waiting:
+				self.turns.append(self.waiting.popleft())
+
+		# categories that were stopped before their last page (see stop_category)
+		self.stopped_categories = set()
+
+	def next_page(self):
+		"""Return the next (category, pagenr), None when all pages were dealt out."""
+
+		with self.lock:
+			while self.turns:
+				category = self.turns.popleft()
+				pagenrs = self.pages[category]
+
+				if not pagenrs:
+					# this category is done, the next one that is waiting takes its turn
+					if self.waiting:
+						self.turns.append(self.waiting.popleft())
+
+					continue
+
+				self.turns.append(category)
+				return category, pagenrs.popleft()
+
+			return None
+
+	def stop_category(self, category):
+		"""Deal out no more pages of category, e.g. when it reached the questions that are already stored (settings.ONLY_NEW)."""
+
+		with self.lock:
+			self.pages[category].clear()
+			self.stopped_categories.add(category)
+
+	def stop(self):
+		"""Deal out no more pages at all."""
+
+		with self.lock:
+			for pagenrs in self.pages.values():
+				pagenrs.clear()
+
+
+def scrape_page(category, pagenr, questions_per_page, session, answers, cursor, only_new):
+	"""
+	Return (question_records, stop) for a page of category.
+
+	question_records are the new questions of the page, with their answer (images are downloaded by the writer),
+	stop is True when the category should not be scraped any further (settings.ONLY_NEW).
+
+	answers -- the answer_fetcher.AnswerFetcher all workers share
+	"""
+
+	content = scraper_util.get_questionpage(scraper_util.construct_url(category, pagenr, questions_per_page), session).content
+
+	# a page with only stored questions is not parsed at all
+	question_numbers = scraper_util.find_question_numbers_in_content(content)
+
+	if question_numbers and len(db_inter.get_stored_question_numbers(question_numbers, cursor)) == len(question_numbers):
+		logger.info(f'All questions on page {pagenr} of category {category} are already in database.')
+		return [], only_new
+
+	question_records = scraper_util.parse_questionpage(content)
+
+	stored_question_numbers = set(db_inter.get_stored_question_numbers([question_record['question_number'] for question_record in question_records], cursor))
+
+	new_question_records = []
+	stop = False
+
+	for question_record in question_records:
+
+		question_number = question_record['question_number']
+
+		if question_number in stored_question_numbers:
+			logger.info(f'Question {question_number} is already in database.')
+
+			# For details about ONLY_NEW, see settings.py
+			if only_new:
+				stop = True
+				break
+
+			continue
+
+		new_question_records.append(question_record)
+
+	answer_texts = answers.fetch_answers([question_record['question_number'] for question_record in new_question_records])
+
+	for question_record, answer_text in zip(new_question_records, answer_texts):
+		question_record['answer_text'] = answer_text
+
+	return new_question_records, stop
+
+
+def scrape_pages(scheduler, questions_per_page, session, answers, results, database_url, only_new):
+	"""Worker: scrape the pages scheduler deals out, until there are none left, put (category, pagenr, question_records) on results."""
+
+	# sqlite connections cannot be shared between threads, every worker reads through its own
+	connection = db_inter.make_connection(database_url, 'read-mostly')
+	cursor = db_inter.create_cursor(connection)
+
+	try:
+		while True:
+			page = scheduler.next_page()
+
+			if page is None:
+				break
+
+			category, pagenr = page
+			question_records, stop = scrape_page(category, pagenr, questions_per_page, session, answers, cursor, only_new)
+
+			if stop:
+				logger.info(f'You set settings.ONLY_NEW to True, so downloading category {category} will stop.')
+				scheduler.stop_category(category)
+
+			results.put((category, pagenr, question_records))
+
+	except Exception:
+		# the other workers finish the page they are working on & stop
+		scheduler.stop()
+		raise
+
+	finally:
+		connection.close()
+		results.put(END_OF_WORKER)
+
+
+def scrape_categories(page_ranges, run_id, connection, database_url=settings.DATABASE_URL, max_active_categories=settings.CONCURRENT_CATEGORIES, only_new=settings.ONLY_NEW, credentials=settings.CREDENTIALS, questions_per_page=settings.QUESTIONS_PER_PAGE):
+	"""
+	Scrape the pages of several categories at the same time, write them to connection.
+	Return the categories that settings.ONLY_NEW stopped before the end of their range.
+
+	Arguments:
+	page_ranges -- category -> range of pagenrs to scrape, e.g. {'film': range(1, 808)}
+	run_id -- the run the progress of every category is recorded for (see settings.RESUME)
+	connection -- connection to database_url, all questions are written through it
+	max_active_categories -- number of categories (& worker threads) that are scraped at the same time
+	questions_per_page -- page size, the pagenrs of page_ranges are counted in
+	"""
+
+	# a keep-alive connection for every worker & every answer thread
+	session = scraper_util.create_session(pool_size=max_active_categories + settings.ANSWER_FETCH_WORKERS)
+	scraper_util.login(session, username=credentials.get('username', None), password=credentials.get('password', None))
+
+	scheduler = PageScheduler(page_ranges, max_active_categories)
+	results = queue.Queue()
+
+	# pages are completed out of order, the progress of a category only moves past pages that were all written
+	last_completed_pages = {category: pagenrs.start - 1 for category, pagenrs in page_ranges.items()}
+	completed_pages = {category: set() for category in page_ranges}
+
+	with answer_fetcher.AnswerFetcher(session) as answers, concurrent.futures.ThreadPoolExecutor(max_workers=max_active_categories) as executor:
+
+		workers = [executor.submit(scrape_pages, scheduler, questions_per_page, session, answers, results, database_url, only_new) for i in range(max_active_categories)]
+
+		try:
+			with database_writer.QuestionWriter(connection, download_images=True) as writer:
+
+				running_workers = len(workers)
+
+				while running_workers:
+					result = results.get()
+
+					if result is END_OF_WORKER:
+						running_workers -= 1
+						continue
+
+					category, pagenr, question_records = result
+
+					for question_record in question_records:
+						writer.add(question_record, category)
+
+					completed_pages[category].add(pagenr)
+
+					while last_completed_pages[category] + 1 in completed_pages[category]:
+						last_completed_pages[category] += 1
+						completed_pages[category].remove(last_completed_pages[category])
+
+					# end of the page, write it in one transaction
+					writer.flush_page(run_id, category, last_completed_pages[category])
+
+		except BaseException:
+			# the workers finish the page they are working on, those pages are scraped again by a resumed run
+			scheduler.stop()
+			raise
+
+	# raises the exception of a worker that failed
+	for worker in workers:
+		worker.result()
+
+	return scheduler.stopped_categories
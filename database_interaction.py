@@ -1,8 +1,62 @@
+import collections
+import re
 import sqlite3
 
-def make_connection(database_url):
+"""
+CONNECTION_PROFILES
+
+PRAGMAs applied by make_connection for each performance profile.
+All profiles use journal_mode WAL, so the exporter can read while the scraper is writing.
+
+safe:         every commit is fsynced (synchronous FULL), SQLite's default cache
+bulk-load:    no fsync at all (synchronous OFF), large cache & temp tables in memory
+              a crash of the OS (not of the scraper) can lose the last transactions, never use it for the only copy of a database you cannot rescrape
+read-mostly:  fsync only at checkpoints (synchronous NORMAL), large cache & memory mapped reads
+"""
+CONNECTION_PROFILES = {
+	'safe': {
+		'journal_mode': 'WAL',
+		'synchronous': 'FULL',
+		'cache_size': -2000,
+		'mmap_size': 0,
+		'temp_store': 'DEFAULT',
+		'foreign_keys': 'ON'
+	},
+	'bulk-load': {
+		'journal_mode': 'WAL',
+		'synchronous': 'OFF',
+		'cache_size': -262144,
+		'mmap_size': 268435456,
+		'temp_store': 'MEMORY',
+		'foreign_keys': 'ON'
+	},
+	'read-mostly': {
+		'journal_mode': 'WAL',
+		'synchronous': 'NORMAL',
+		'cache_size': -131072,
+		'mmap_size': 1073741824,
+		'temp_store': 'MEMORY',
+		'foreign_keys': 'ON'
+	}
+}
+
+def make_connection(database_url, profile='safe'):
+	"""
+	Return a connection to database_url, tuned for the given performance profile.
+
+	Arguments:
+	database_url -- path to the sqlite database
+	profile -- one of CONNECTION_PROFILES: 'safe', 'bulk-load' or 'read-mostly'
+	"""
+
+	if profile not in CONNECTION_PROFILES:
+		raise ValueError(f'Unknown connection profile {profile}, choose one of: {", ".join(CONNECTION_PROFILES)}')
 
 	connection = sqlite3.connect(database_url)
+
+	for pragma, value in CONNECTION_PROFILES[profile].items():
+		connection.execute(f'PRAGMA {pragma} = {value}')
+
 	return connection
 
 def create_cursor(connection):
@@ -20,6 +74,22 @@ def insert_question(question_number, question_text, answer_text, category_id, qu
 	lastrowid = cursor.lastrowid
 	return lastrowid
 
+def insert_questions(question_rows, cursor):
+	"""
+	Insert many questions at once.
+
+	Arguments:
+	question_rows -- list of (question_number, question_text, answer_text, category_id, quiz_id)
+	"""
+
+	cursor.executemany('''
+		INSERT INTO question (question_number, question_text, answer_text, category_id, quiz_id)
+		VALUES (?, ?, ?, ?, ?)
+	''', question_rows)
+
+	rowcount = cursor.rowcount
+	return rowcount
+
 def insert_quiz(quiz_name, quiz_year, quiz_url, quiz_organiser, cursor):
 
 	cursor.execute('''
@@ -61,6 +131,22 @@ def insert_question_tag(question_id, tag_id, cursor):
 	lastrowid = cursor.lastrowid
 	return lastrowid
 
+def insert_question_tags(question_tag_rows, cursor):
+	"""
+	Insert many question_tags at once.
+
+	Arguments:
+	question_tag_rows -- list of (question_id, tag_id)
+	"""
+
+	cursor.executemany('''
+		INSERT INTO question_tag (question_id, tag_id)
+		VALUES (?, ?)
+	''', question_tag_rows)
+
+	rowcount = cursor.rowcount
+	return rowcount
+
 def insert_image(img_filename, question_id, cursor):
 
 	cursor.execute('''
@@ -71,6 +157,55 @@ def insert_image(img_filename, question_id, cursor):
 	lastrowid = cursor.lastrowid
 	return lastrowid
 
+def insert_images(image_rows, cursor):
+	"""
+	Insert many images at once.
+
+	Arguments:
+	image_rows -- list of (img_filename, image_url, img_hash, img_size, question_id), img_hash & img_size are None while the image is being downloaded
+	(or when its download failed, see get_images_to_download)
+	"""
+
+	cursor.executemany('''
+		INSERT INTO image (img_filename, image_url, img_hash, img_size, question_id)
+		VALUES (?, ?, ?, ?, ?)
+	''', image_rows)
+
+	rowcount = cursor.rowcount
+	return rowcount
+
+def update_image_files(image_file_rows, cursor):
+	"""
+	Record the sha256 hash & size of downloaded images, for questions that are already stored.
+
+	Arguments:
+	image_file_rows -- list of (img_hash, img_size, question_number)
+	"""
+
+	cursor.executemany('''
+		UPDATE image
+		SET img_hash = ?, img_size = ?
+		WHERE question_id = (SELECT question_id FROM question WHERE question_number = ?)
+	''', image_file_rows)
+
+def get_images_to_download(cursor):
+	"""
+	Return (question_number, image_url, category_name) of every image that was not downloaded, e.g. because its download failed or was cancelled.
+
+	Those have no img_hash. Images that were stored before their url was kept (see database_migration.migration_007_image_hash_and_size) are left out.
+	"""
+
+	cursor.execute('''
+		SELECT q.question_number, i.image_url, c.category_name
+		FROM image i
+		JOIN question q ON i.question_id = q.question_id
+		JOIN category c ON q.category_id = c.category_id
+		WHERE i.img_hash IS NULL AND i.image_url IS NOT NULL
+	''')
+
+	image_rows = cursor.fetchall()
+	return image_rows
+
 def insert_category(category_name, cursor):
 
 	cursor.execute('''
@@ -103,6 +238,53 @@ def get_question_id(question_number, cursor):
 	question_id = cursor.fetchone()
 	return question_id
 
+def get_question_ids_for_question_numbers(question_numbers, cursor):
+	"""
+	Return a dictionary {question_number (int): question_id} for the provided question_numbers, in one query.
+	question_numbers that are not in the database are left out.
+	"""
+
+	question_numbers = [int(question_number) for question_number in question_numbers]
+
+	if not question_numbers:
+		return {}
+
+	placeholders = ', '.join('?' for question_number in question_numbers)
+
+	cursor.execute(f'''
+		SELECT question_number, question_id
+		FROM question
+		WHERE question_number IN ({placeholders})
+	''', question_numbers)
+
+	question_ids = dict(cursor.fetchall())
+	return question_ids
+
+def get_stored_question_numbers(question_numbers, cursor):
+	"""
+	Return the question_numbers (out of the provided ones) that are already stored in the database, in one query.
+
+	e.g. all question_numbers parsed from a questionpage
+	"""
+
+	question_numbers = list(question_numbers)
+
+	if not question_numbers:
+		return []
+
+	placeholders = ', '.join('?' for question_number in question_numbers)
+
+	cursor.execute(f'''
+		SELECT question_number
+		FROM question
+		WHERE question_number IN ({placeholders})
+	''', [int(question_number) for question_number in question_numbers])
+
+	stored = {row[0] for row in cursor.fetchall()}
+
+	stored_question_numbers = [question_number for question_number in question_numbers if int(question_number) in stored]
+	return stored_question_numbers
+
 def get_questions_with_image_for_category(category_id, cursor):
 
 	cursor.execute('''
@@ -177,6 +359,21 @@ def insert_youtube_fragment(youtube_id, youtube_watch, question_id, cursor):
 	lastrowid = cursor.lastrowid
 	return lastrowid
 
+def insert_youtube_fragments(youtube_fragment_rows, cursor):
+	"""
+	Insert many youtube_fragments at once.
+
+	Arguments:
+	youtube_fragment_rows -- list of (youtube_id, youtube_watch, question_id)
+	"""
+
+	cursor.executemany('''
+		INSERT INTO youtube_fragment (youtube_id, youtube_watch, question_id)
+		VALUES (?, ?, ?)
+	''', youtube_fragment_rows)
+
+	rowcount = cursor.rowcount
+	return rowcount
 
 def get_questions_with_image_and_youtube_fragment_for_category(category_id, cursor):
 
@@ -192,6 +389,114 @@ def get_questions_with_image_and_youtube_fragment_for_category(category_id, curs
 	return questions_with_image_and_youtube_fragment
 
 
+"""
+CHANGED_SINCE_EXPORT
+
+question_ids of the questions that were not exported yet (above the export_state of their category),
+or that changed since they were (export_pending), see migration_008_export_state.
+
+The new questions are a range of question_ids (above the lowest export_state), so finding the changes costs O(changes), not O(questions).
+CHANGED_SINCE_EXPORT_FOR_CATEGORY is the same for one category (parameters: category_id, category_id).
+"""
+CHANGED_SINCE_EXPORT = '''
+	SELECT nq.question_id
+	FROM question nq
+	WHERE nq.question_id > (SELECT MIN(IFNULL(es.last_question_id, 0)) FROM category c LEFT JOIN export_state es ON c.category_id = es.category_id)
+	AND nq.question_id > IFNULL((SELECT es.last_question_id FROM export_state es WHERE es.category_id = nq.category_id), 0)
+	UNION
+	SELECT ep.question_id
+	FROM export_pending ep
+'''
+
+CHANGED_SINCE_EXPORT_FOR_CATEGORY = '''
+	SELECT nq.question_id
+	FROM question nq
+	WHERE nq.category_id = ?
+	AND nq.question_id > IFNULL((SELECT es.last_question_id FROM export_state es WHERE es.category_id = ?), 0)
+	UNION
+	SELECT ep.question_id
+	FROM export_pending ep
+'''
+
+
+def iterate_questions_with_image_and_youtube_fragment_for_category(category_id, cursor, batch_size=1000, changed_only=False, up_to_question_id=None):
+	"""
+	Yield the same rows as get_questions_with_image_and_youtube_fragment_for_category, batch_size rows at a time,
+	so a category of any size is read in constant memory.
+
+	Arguments:
+	changed_only -- only the questions that are new or changed since the last export (see CHANGED_SINCE_EXPORT)
+	up_to_question_id -- only the questions up to this question_id, e.g. the highest one when the export started
+	"""
+
+	if changed_only:
+		# +q.category_id keeps sqlite from scanning all questions of the category, the (few) changed question_ids are looked up instead
+		conditions = ['+q.category_id = ?', f'q.question_id IN ({CHANGED_SINCE_EXPORT_FOR_CATEGORY})']
+		parameters = [category_id, category_id, category_id]
+	else:
+		conditions = ['q.category_id = ?']
+		parameters = [category_id]
+
+	if up_to_question_id is not None:
+		conditions.append('q.question_id <= ?')
+		parameters.append(up_to_question_id)
+
+	cursor.execute(f'''
+		SELECT q.question_id, q.question_number, q.question_text, q.answer_text, q.category_id, q.quiz_id, i.img_id, i.img_filename, yf.youtube_id, yf.youtube_watch
+		FROM question q 
+		LEFT JOIN image i ON q.question_id = i.question_id
+		LEFT JOIN youtube_fragment yf ON q.question_id = yf.question_id
+		WHERE {' AND '.join(conditions)}
+		ORDER BY q.question_id
+	''', parameters)
+
+	while True:
+		rows = cursor.fetchmany(batch_size)
+
+		if not rows:
+			break
+
+		yield from rows
+
+
+def iterate_questions_with_image_and_youtube_fragment(cursor, batch_size=1000, changed_only=False, up_to_question_id=None):
+	"""
+	Yield the rows of get_questions_with_image_and_youtube_fragment_for_category for all categories at once, with category_name as an extra last column,
+	ordered by category_id (& question_id), so the questions of a category are next to each other.
+
+	One pass over question, batch_size rows at a time (the order follows question_category_id_index, no sorting needed).
+	changed_only & up_to_question_id as in iterate_questions_with_image_and_youtube_fragment_for_category.
+	"""
+
+	conditions = ['1']
+	parameters = []
+
+	if changed_only:
+		conditions.append(f'q.question_id IN ({CHANGED_SINCE_EXPORT})')
+
+	if up_to_question_id is not None:
+		conditions.append('q.question_id <= ?')
+		parameters.append(up_to_question_id)
+
+	cursor.execute(f'''
+		SELECT q.question_id, q.question_number, q.question_text, q.answer_text, q.category_id, q.quiz_id, i.img_id, i.img_filename, yf.youtube_id, yf.youtube_watch, c.category_name
+		FROM question q
+		JOIN category c ON q.category_id = c.category_id
+		LEFT JOIN image i ON q.question_id = i.question_id
+		LEFT JOIN youtube_fragment yf ON q.question_id = yf.question_id
+		WHERE {' AND '.join(conditions)}
+		ORDER BY q.category_id, q.question_id
+	''', parameters)
+
+	while True:
+		rows = cursor.fetchmany(batch_size)
+
+		if not rows:
+			break
+
+		yield from rows
+
+
 def get_tags_for_question_id(question_id, cursor):
 
 	cursor.execute('''
@@ -228,4 +533,496 @@ def get_tags_for_question_number(question_number, cursor):
 	''', (question_number,))
 
 	tags = cursor.fetchall()
-	return tags
\ No newline at end of file
+	return tags
+
+
+"""
+SEARCH_COLUMN_WEIGHTS
+
+Weights of question_text, answer_text & tag_names in the bm25 ranking of search_questions,
+a match in the question counts twice as much as one in the answer or the tags.
+"""
+SEARCH_COLUMN_WEIGHTS = (2.0, 1.0, 1.0)
+
+SEARCH_WORD_PATTERN = re.compile(r'\w+')
+
+
+def index_questions(question_ids, cursor):
+	"""Add the questions with question_ids (& their tags) to the full-text index (see migration_009_question_search), in one statement, without committing."""
+
+	question_ids = list(question_ids)
+
+	if not question_ids:
+		return
+
+	placeholders = ', '.join('?' for question_id in question_ids)
+
+	# question_text & answer_text used to be stored as an encoded value (bytes), CAST makes sure they are indexed as text
+	cursor.execute(f'''
+		INSERT INTO question_search (rowid, question_text, answer_text, tag_names)
+		SELECT q.question_id, CAST(q.question_text AS TEXT), CAST(q.answer_text AS TEXT), (
+			SELECT IFNULL(group_concat(t.tag_name, ' '), '')
+			FROM question_tag qt
+			JOIN tag t ON qt.tag_id = t.tag_id
+			WHERE qt.question_id = q.question_id
+		)
+		FROM question q
+		WHERE q.question_id IN ({placeholders})
+	''', question_ids)
+
+
+def make_search_query(text, match_any=False):
+	"""
+	Return an FTS5 query for the words in text, e.g. 'Wie schreef "De Leeuw"?' -> '"Wie" "schreef" "De" "Leeuw"'
+
+	Every word is quoted, so punctuation in text is never read as query syntax.
+	The query matches questions with all words, or with match_any, with any of them (the ones with most matching words rank highest).
+	"""
+
+	words = SEARCH_WORD_PATTERN.findall(text)
+	return (' OR ' if match_any else ' ').join(f'"{word}"' for word in words)
+
+
+def search_questions(query, cursor, limit=20, category_name=None, snippet_words=12):
+	"""
+	Return the questions that match query, best match first, in one query on the full-text index (see migration_009_question_search).
+
+	Arguments:
+	query -- FTS5 query, e.g. 'beatles', 'beatl*', '"yellow submarine"', 'tag_names: muziek AND beatles', see make_search_query for plain text
+	limit -- maximum number of questions
+	category_name -- only the questions of this category
+	snippet_words -- maximum number of words in the snippets
+
+	Every question is a tuple:
+	(question_id, question_number, category_name, question_snippet, answer_snippet, tag_names, score)
+	the matching words in the snippets are marked with <b></b>, a lower score is a better match (bm25, see SEARCH_COLUMN_WEIGHTS).
+	"""
+
+	conditions = ['question_search MATCH ?']
+	parameters = [query]
+
+	if category_name is not None:
+		conditions.append('c.category_name = ?')
+		parameters.append(category_name)
+
+	cursor.execute(f'''
+		SELECT q.question_id, q.question_number, c.category_name,
+			snippet(question_search, 0, '<b>', '</b>', '...', ?),
+			snippet(question_search, 1, '<b>', '</b>', '...', ?),
+			question_search.tag_names,
+			bm25(question_search, ?, ?, ?) AS score
+		FROM question_search
+		JOIN question q ON q.question_id = question_search.rowid
+		JOIN category c ON q.category_id = c.category_id
+		WHERE {' AND '.join(conditions)}
+		ORDER BY score
+		LIMIT ?
+	''', (snippet_words, snippet_words, *SEARCH_COLUMN_WEIGHTS, *parameters, limit))
+
+	questions = cursor.fetchall()
+	return questions
+
+
+def find_related_questions(question_number, cursor, limit=10):
+	"""
+	Return the questions that look most like the question with question_number (e.g. duplicates in other quizzes), best match first, as search_questions does.
+
+	They share words with its question_text, the question itself is left out.
+	"""
+
+	cursor.execute('''
+		SELECT qs.rowid, qs.question_text
+		FROM question_search qs
+		JOIN question q ON q.question_id = qs.rowid
+		WHERE q.question_number = ?
+	''', (question_number,))
+
+	row = cursor.fetchone()
+
+	if not row or not SEARCH_WORD_PATTERN.search(row[1] or ''):
+		return []
+
+	question_id, question_text = row
+
+	related_questions = search_questions(make_search_query(question_text, match_any=True), cursor, limit + 1)
+	return [question for question in related_questions if question[0] != question_id][:limit]
+
+
+class LookupCache:
+	"""
+	LRU dictionary that maps a name or url (e.g. tag_name, category_name, quiz_url) to its id in the database.
+
+	Arguments:
+	maxsize -- maximum number of ids kept, the least recently used id is dropped first
+
+	Ids are only ever added after they were read from or written to the database.
+	Ids of rows that were inserted in a transaction that is rolled back afterwards are stale, so clear the cache after a rollback.
+	"""
+
+	def __init__(self, maxsize=100000):
+		self.maxsize = maxsize
+		self.ids = collections.OrderedDict()
+
+	def get(self, key):
+		"""Return the id for key, None if key is not cached."""
+
+		cached_id = self.ids.get(key)
+
+		if cached_id is not None:
+			self.ids.move_to_end(key)
+
+		return cached_id
+
+	def put(self, key, cached_id):
+		"""Cache cached_id for key."""
+
+		self.ids[key] = cached_id
+		self.ids.move_to_end(key)
+
+		if len(self.ids) > self.maxsize:
+			self.ids.popitem(last=False)
+
+	def warm(self, rows):
+		"""Cache all (key, id) rows, e.g. the result of SELECT tag_name, tag_id FROM tag."""
+
+		for key, cached_id in rows:
+			self.put(key, cached_id)
+
+	def clear(self):
+		self.ids.clear()
+
+	def get_or_insert(self, key, get_id, insert, cursor):
+		"""
+		Return the id for key.
+
+		Arguments:
+		get_id -- function (key, cursor) -> row with the id or None, used when key is not cached
+		insert -- function () -> lastrowid, used when key is not in the database either
+		"""
+
+		cached_id = self.get(key)
+
+		if cached_id is not None:
+			return cached_id
+
+		row = get_id(key, cursor)
+
+		if row:
+			cached_id = row[0]
+		else:
+			cached_id = insert()
+
+		self.put(key, cached_id)
+		return cached_id
+
+
+category_id_cache = LookupCache()
+tag_id_cache = LookupCache()
+quiz_id_cache = LookupCache()
+
+
+def warm_lookup_caches(cursor):
+	"""(Re)fill the category, tag & quiz LookupCaches with all ids in the database."""
+
+	category_id_cache.clear()
+	cursor.execute('''
+		SELECT category_name, category_id
+		FROM category
+	''')
+	category_id_cache.warm(cursor.fetchall())
+
+	tag_id_cache.clear()
+	cursor.execute('''
+		SELECT tag_name, tag_id
+		FROM tag
+	''')
+	tag_id_cache.warm(cursor.fetchall())
+
+	quiz_id_cache.clear()
+	cursor.execute('''
+		SELECT quiz_url, quiz_id
+		FROM quiz
+	''')
+	quiz_id_cache.warm(cursor.fetchall())
+
+
+def clear_lookup_caches():
+	"""Forget all cached ids, e.g. after a rollback."""
+
+	category_id_cache.clear()
+	tag_id_cache.clear()
+	quiz_id_cache.clear()
+
+
+def get_or_insert_category_id(category_name, cursor):
+	"""Return the category_id for category_name, the category is inserted if it is not in the database yet."""
+
+	category_id = category_id_cache.get_or_insert(category_name, get_category_id, lambda: insert_category(category_name, cursor), cursor)
+	return category_id
+
+
+def get_or_insert_tag_id(tag_name, cursor):
+	"""Return the tag_id for tag_name, the tag is inserted if it is not in the database yet."""
+
+	tag_id = tag_id_cache.get_or_insert(tag_name, get_tag_id, lambda: insert_tag(tag_name, cursor), cursor)
+	return tag_id
+
+
+def get_or_insert_quiz_id(quiz_name, quiz_year, quiz_url, quiz_organiser, cursor):
+	"""Return the quiz_id for quiz_url, the quiz is inserted if it is not in the database yet."""
+
+	quiz_id = quiz_id_cache.get_or_insert(quiz_url, get_quiz_id_with_quiz_url, lambda: insert_quiz(quiz_name, quiz_year, quiz_url, quiz_organiser, cursor), cursor)
+	return quiz_id
+
+
+def start_run(category_setting, cursor):
+	"""Register a new run of the scraper (status 'running'), return its run_id."""
+
+	cursor.execute('''
+		INSERT INTO run (category_setting, status, started_at, updated_at)
+		VALUES (?, 'running', datetime('now'), datetime('now'))
+	''', (category_setting,))
+
+	lastrowid = cursor.lastrowid
+	return lastrowid
+
+
+def get_resumable_run_id(category_setting, cursor):
+	"""
+	Return the run_id of the most recent run for category_setting that did not finish (it failed or was killed).
+	Return None if the most recent run finished.
+	"""
+
+	cursor.execute('''
+		SELECT run_id, status
+		FROM run
+		WHERE category_setting = ?
+		ORDER BY run_id DESC
+		LIMIT 1
+	''', (category_setting,))
+
+	run = cursor.fetchone()
+
+	if not run or run[1] == 'finished':
+		return None
+
+	return run[0]
+
+
+def set_run_status(run_id, status, cursor):
+	"""Set the status of a run: 'running', 'finished' or 'failed'."""
+
+	cursor.execute('''
+		UPDATE run
+		SET status = ?, updated_at = datetime('now')
+		WHERE run_id = ?
+	''', (status, run_id))
+
+
+def get_run_questions_per_page(run_id, cursor):
+	"""
+	Return (questions_per_page, questions_on_page) of run_id, (None, None) if it was not set yet.
+
+	questions_per_page is the page size its urls ask for, questions_on_page the number of questions such a page shows.
+	"""
+
+	cursor.execute('''
+		SELECT questions_per_page, questions_on_page
+		FROM run
+		WHERE run_id = ?
+	''', (run_id,))
+
+	questions_per_page, questions_on_page = cursor.fetchone()
+	return questions_per_page, questions_on_page
+
+
+def set_run_questions_per_page(run_id, questions_per_page, questions_on_page, cursor):
+
+	cursor.execute('''
+		UPDATE run
+		SET questions_per_page = ?, questions_on_page = ?, updated_at = datetime('now')
+		WHERE run_id = ?
+	''', (questions_per_page, questions_on_page, run_id))
+
+
+def get_category_progress(run_id, category_name, cursor):
+	"""Return (last_completed_page, in_flight_question_numbers, status) of category_name in a run, None if it was not started."""
+
+	cursor.execute('''
+		SELECT last_completed_page, in_flight_question_numbers, status
+		FROM run_category_progress
+		WHERE run_id = ? AND category_name = ?
+	''', (run_id, category_name))
+
+	category_progress = cursor.fetchone()
+	return category_progress
+
+
+def set_category_progress(run_id, category_name, last_completed_page, in_flight_question_numbers, status, cursor):
+	"""
+	Record the progress of category_name in a run, without committing.
+
+	Arguments:
+	last_completed_page -- the last page of which all questions are written, None if no page is completed yet
+	in_flight_question_numbers -- the question_numbers that are being downloaded right now
+	status -- 'running' or 'done'
+	"""
+
+	cursor.execute('''
+		INSERT OR REPLACE INTO run_category_progress (run_id, category_name, last_completed_page, in_flight_question_numbers, status, updated_at)
+		VALUES (?, ?, ?, ?, ?, datetime('now'))
+	''', (run_id, category_name, last_completed_page, ','.join(str(question_number) for question_number in in_flight_question_numbers), status))
+
+
+def get_page_boundaries(category_name, questions_per_page, cursor):
+	"""Return [(pagenr, min_question_number, max_question_number)] of all indexed pages of category_name, ordered by pagenr."""
+
+	cursor.execute('''
+		SELECT pagenr, min_question_number, max_question_number
+		FROM page_boundary
+		WHERE category_name = ? AND questions_per_page = ?
+		ORDER BY pagenr
+	''', (category_name, questions_per_page))
+
+	page_boundaries = cursor.fetchall()
+	return page_boundaries
+
+
+def set_page_boundary(category_name, questions_per_page, pagenr, min_question_number, max_question_number, cursor):
+	"""Record the lowest & highest question_number currently on a page of category_name, without committing."""
+
+	cursor.execute('''
+		INSERT OR REPLACE INTO page_boundary (category_name, questions_per_page, pagenr, min_question_number, max_question_number, updated_at)
+		VALUES (?, ?, ?, ?, ?, datetime('now'))
+	''', (category_name, questions_per_page, pagenr, min_question_number, max_question_number))
+
+
+def get_category_counts(cursor):
+	"""
+	Return (category_dict, age) of the cached category dictionary.
+
+	category_dict -- category_name -> number of questions, empty if nothing was cached yet
+	age -- number of seconds since the oldest count was fetched, None if nothing was cached yet
+	"""
+
+	cursor.execute('''
+		SELECT category_name, question_count, (julianday('now') - julianday(updated_at)) * 86400
+		FROM category_count
+	''')
+
+	rows = cursor.fetchall()
+
+	category_dict = {category_name: question_count for category_name, question_count, age in rows}
+	age = max((age for category_name, question_count, age in rows), default=None)
+
+	return category_dict, age
+
+
+def set_category_counts(category_dict, cursor):
+	"""Replace the cached category dictionary (category_name -> number of questions), without committing."""
+
+	cursor.execute('DELETE FROM category_count')
+
+	cursor.executemany('''
+		INSERT INTO category_count (category_name, question_count, updated_at)
+		VALUES (?, ?, datetime('now'))
+	''', category_dict.items())
+
+
+def get_high_water_mark(category_name, cursor):
+	"""Return the highest question_number up to which all questions of category_name are stored, None if it was never scraped."""
+
+	cursor.execute('''
+		SELECT max_question_number
+		FROM high_water_mark
+		WHERE category_name = ?
+	''', (category_name,))
+
+	row = cursor.fetchone()
+
+	if not row:
+		return None
+
+	return row[0]
+
+
+def raise_high_water_mark(category_name, max_question_number, cursor):
+	"""Raise the high-water mark of category_name to max_question_number (it never goes down), without committing."""
+
+	cursor.execute('''
+		INSERT INTO high_water_mark (category_name, max_question_number, updated_at)
+		VALUES (?, ?, datetime('now'))
+		ON CONFLICT (category_name) DO UPDATE
+		SET max_question_number = MAX(max_question_number, excluded.max_question_number), updated_at = excluded.updated_at
+	''', (category_name, max_question_number))
+
+
+def get_max_stored_question_number(category_name, cursor):
+	"""Return the highest question_number stored for category_name, None if there are none."""
+
+	cursor.execute('''
+		SELECT MAX(q.question_number)
+		FROM question q
+		JOIN category c ON q.category_id = c.category_id
+		WHERE c.category_name = ?
+	''', (category_name,))
+
+	max_question_number = cursor.fetchone()[0]
+	return max_question_number
+
+
+def get_category_ids(cursor):
+
+	cursor.execute('''
+		SELECT category_id
+		FROM category
+	''')
+
+	category_ids = [row[0] for row in cursor.fetchall()]
+	return category_ids
+
+
+def get_max_question_id(cursor):
+	"""Return the highest question_id, 0 if there are no questions."""
+
+	cursor.execute('''
+		SELECT IFNULL(MAX(question_id), 0)
+		FROM question
+	''')
+
+	max_question_id = cursor.fetchone()[0]
+	return max_question_id
+
+
+def get_export_pending(cursor):
+	"""Return question_id -> change_count of the questions that changed since they were exported."""
+
+	cursor.execute('''
+		SELECT question_id, change_count
+		FROM export_pending
+	''')
+
+	pending_change_counts = dict(cursor.fetchall())
+	return pending_change_counts
+
+
+def set_exported(category_ids, last_question_id, pending_change_counts, cursor):
+	"""
+	Record that all questions of category_ids up to last_question_id were exported, without committing.
+
+	The export state of a category only moves up (it never goes down),
+	pending_change_counts (question_id -> change_count of changed questions that were exported again, see get_export_pending) are no longer pending,
+	unless they changed again since (their change_count went up).
+	"""
+
+	cursor.executemany('''
+		INSERT INTO export_state (category_id, last_question_id, updated_at)
+		VALUES (?, ?, datetime('now'))
+		ON CONFLICT (category_id) DO UPDATE
+		SET last_question_id = MAX(last_question_id, excluded.last_question_id), updated_at = excluded.updated_at
+	''', [(category_id, last_question_id) for category_id in category_ids])
+
+	cursor.executemany('''
+		DELETE FROM export_pending
+		WHERE question_id = ? AND change_count = ?
+	''', list(pending_change_counts.items()))
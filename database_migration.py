@@ -0,0 +1,454 @@
+"""
+Versioned migrations for quizarchief databases.
+
+The schema version of a database is kept in PRAGMA user_version.
+A freshly initialized database (see database_initialization.py) has version 0,
+every migration in MIGRATIONS brings it one version up, in place.
+
+Usage:
+	python database_migration.py
+
+	migrates settings.DATABASE_URL to the latest version
+"""
+
+import logger_setup
+import settings
+import sqlite3
+
+logger = logger_setup.create_logger(__name__)
+
+
+def deduplicate(table, id_column, key_column, references, cursor):
+	"""
+	Remove rows of table which have the same key_column value as a row with a lower id_column.
+	Return the number of removed rows.
+
+	Every reference to a removed row is pointed to the row that is kept.
+
+	Arguments:
+	table -- table to deduplicate, e.g. 'tag'
+	id_column -- primary key of table, e.g. 'tag_id'
+	key_column -- column that has to become unique, e.g. 'tag_name'
+	references -- list of (referencing_table, referencing_column), e.g. [('question_tag', 'tag_id')]
+	"""
+
+	# duplicate_id -> kept_id, for every row that is not the first one with its key
+	cursor.execute(f'''
+		CREATE TEMP TABLE duplicate_map AS
+		SELECT t.{id_column} AS duplicate_id, k.kept_id AS kept_id
+		FROM {table} t
+		JOIN (
+			SELECT {key_column} AS key_value, MIN({id_column}) AS kept_id
+			FROM {table}
+			WHERE {key_column} IS NOT NULL
+			GROUP BY {key_column}
+			HAVING COUNT(*) > 1
+		) k ON t.{key_column} = k.key_value
+		WHERE t.{id_column} != k.kept_id
+	''')
+
+	for referencing_table, referencing_column in references:
+		# OR IGNORE: a reference might already exist for the kept row (e.g. the primary key of question_tag)
+		# those leftovers are removed right after
+		cursor.execute(f'''
+			UPDATE OR IGNORE {referencing_table}
+			SET {referencing_column} = (SELECT kept_id FROM duplicate_map WHERE duplicate_id = {referencing_column})
+			WHERE {referencing_column} IN (SELECT duplicate_id FROM duplicate_map)
+		''')
+
+		cursor.execute(f'''
+			DELETE FROM {referencing_table}
+			WHERE {referencing_column} IN (SELECT duplicate_id FROM duplicate_map)
+		''')
+
+	cursor.execute(f'''
+		DELETE FROM {table}
+		WHERE {id_column} IN (SELECT duplicate_id FROM duplicate_map)
+	''')
+
+	removed_rows = cursor.rowcount
+	cursor.execute('DROP TABLE duplicate_map')
+
+	logger.info(f'Removed {removed_rows} duplicate rows from {table} ({key_column}).')
+	return removed_rows
+
+
+def migration_001_indexes_and_unique_constraints(cursor):
+	"""
+	Add indexes & UNIQUE constraints for all lookups of the scraper and the exporter.
+
+	Rows that would violate the new constraints are deduplicated first, the oldest row is kept.
+
+	SQLite cannot add a UNIQUE constraint to an existing table without rebuilding it,
+	a UNIQUE INDEX enforces exactly the same constraint.
+	"""
+
+	deduplicate('category', 'category_id', 'category_name', [('question', 'category_id')], cursor)
+	deduplicate('quiz', 'quiz_id', 'quiz_url', [('question', 'quiz_id')], cursor)
+	deduplicate('tag', 'tag_id', 'tag_name', [('question_tag', 'tag_id')], cursor)
+
+	# the image & youtube_fragment of a duplicate question move to the kept question, unless it has one already
+	# that is taken care of by deduplicating image & youtube_fragment on question_id right after
+	deduplicate('question', 'question_id', 'question_number', [('question_tag', 'question_id'), ('image', 'question_id'), ('youtube_fragment', 'question_id')], cursor)
+	deduplicate('image', 'img_id', 'question_id', [], cursor)
+	deduplicate('youtube_fragment', 'fragment_id', 'question_id', [], cursor)
+
+	cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS category_category_name_unique ON category (category_name)')
+	cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS quiz_quiz_url_unique ON quiz (quiz_url)')
+	cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS tag_tag_name_unique ON tag (tag_name)')
+	cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS question_question_number_unique ON question (question_number)')
+	cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS image_question_id_unique ON image (question_id)')
+	cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS youtube_fragment_question_id_unique ON youtube_fragment (question_id)')
+
+	# not unique, but used by the exporter (WHERE q.category_id = ?) & tag lookups per tag
+	cursor.execute('CREATE INDEX IF NOT EXISTS question_category_id_index ON question (category_id)')
+	cursor.execute('CREATE INDEX IF NOT EXISTS question_tag_tag_id_index ON question_tag (tag_id)')
+
+
+def migration_002_run_state(cursor):
+	"""
+	Add the run state of the scraper, so an interrupted run can be resumed (see settings.RESUME).
+
+	run:						one row per run of main_scraper.py
+	run_category_progress:		per run & category: the last page that was completely written,
+								the question_numbers that were being downloaded & whether the category is done
+	"""
+
+	cursor.execute('''
+		CREATE TABLE IF NOT EXISTS run (
+			run_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+			category_setting TEXT,
+			status TEXT,
+			started_at TEXT,
+			updated_at TEXT
+		);
+	''')
+
+	cursor.execute('''
+		CREATE TABLE IF NOT EXISTS run_category_progress (
+			run_id INTEGER,
+			category_name TEXT,
+			last_completed_page INTEGER,
+			in_flight_question_numbers TEXT,
+			status TEXT,
+			updated_at TEXT,
+			FOREIGN KEY (run_id) REFERENCES run(run_id),
+			PRIMARY KEY (run_id, category_name)
+		);
+	''')
+
+
+def migration_003_page_boundaries(cursor):
+	"""
+	Add the page boundary index, used by scraper_utilities.find_page_for_question.
+
+	page_boundary:	per category, questions_per_page & page: the lowest & highest question_number seen on that page, and when
+	"""
+
+	cursor.execute('''
+		CREATE TABLE IF NOT EXISTS page_boundary (
+			category_name TEXT,
+			questions_per_page INTEGER,
+			pagenr INTEGER,
+			min_question_number INTEGER,
+			max_question_number INTEGER,
+			updated_at TEXT,
+			PRIMARY KEY (category_name, questions_per_page, pagenr)
+		);
+	''')
+
+
+def migration_004_category_count(cursor):
+	"""
+	Add the cached category dictionary (see scraper_utilities.get_category_dictionary).
+
+	category_count:	number of questions per category, as listed on the category overview, and when it was fetched
+	"""
+
+	cursor.execute('''
+		CREATE TABLE IF NOT EXISTS category_count (
+			category_name TEXT PRIMARY KEY NOT NULL,
+			question_count INTEGER,
+			updated_at TEXT
+		);
+	''')
+
+
+def migration_005_high_water_mark(cursor):
+	"""
+	Add the high-water mark of every category (see settings.INCREMENTAL).
+
+	high_water_mark:	per category, the highest question_number up to which all questions are stored
+
+	The table starts empty: the questions of a category that was scraped before might have gaps,
+	a mark is only set by a complete scrape of the category (see main_scraper.complete_category).
+	"""
+
+	cursor.execute('''
+		CREATE TABLE IF NOT EXISTS high_water_mark (
+			category_name TEXT PRIMARY KEY NOT NULL,
+			max_question_number INTEGER,
+			updated_at TEXT
+		);
+	''')
+
+
+def migration_006_run_questions_per_page(cursor):
+	"""
+	Add the page size every run scrapes with, so a resumed run counts its pages the same way (see settings.QUESTIONS_PER_PAGE).
+
+	questions_per_page:	the page size the urls ask for
+	questions_on_page:	the number of questions such a page actually shows, the pages are counted with it
+
+	Runs from before this migration scraped with 20 questions per page.
+	"""
+
+	cursor.execute('ALTER TABLE run ADD COLUMN questions_per_page INTEGER')
+	cursor.execute('ALTER TABLE run ADD COLUMN questions_on_page INTEGER')
+	cursor.execute('UPDATE run SET questions_per_page = 20, questions_on_page = 20')
+
+
+def migration_007_image_hash_and_size(cursor):
+	"""
+	Add the sha256 hash & size of every image (see image_downloader.py), and the url it is downloaded from.
+
+	Images that were downloaded before this migration have none of them.
+	An image with an image_url but without img_hash is not downloaded (yet), the next run downloads it (see database_writer.retry_image_downloads).
+	"""
+
+	cursor.execute('ALTER TABLE image ADD COLUMN img_hash TEXT')
+	cursor.execute('ALTER TABLE image ADD COLUMN img_size INTEGER')
+	cursor.execute('ALTER TABLE image ADD COLUMN image_url TEXT')
+	cursor.execute('CREATE INDEX IF NOT EXISTS image_img_hash_index ON image (img_hash)')
+
+
+def migration_008_export_state(cursor):
+	"""
+	Add the state of the incremental Anki export (see anki_exporter.py).
+
+	export_state:	per category, the question_id up to which all its questions were exported
+	export_pending:	questions that were exported, but changed since (their text, answer, image or youtube fragment),
+					with the number of changes since they became pending
+
+	export_pending is filled by triggers, only for questions up to the highest export_state,
+	the questions a scrape adds are above it, they are exported as new questions.
+	An image that is downloaded after its question was exported (see migration_007_image_hash_and_size), makes it pending as well.
+	Every change of a pending question raises its change_count: an export only removes the pending questions whose change_count
+	did not change since it started (see anki_exporter.ExportTracker), a question that changes during an export stays pending.
+	"""
+
+	cursor.execute('''
+		CREATE TABLE IF NOT EXISTS export_state (
+			category_id INTEGER PRIMARY KEY NOT NULL,
+			last_question_id INTEGER NOT NULL,
+			updated_at TEXT,
+			FOREIGN KEY (category_id) REFERENCES category(category_id)
+		);
+	''')
+
+	cursor.execute('''
+		CREATE TABLE IF NOT EXISTS export_pending (
+			question_id INTEGER PRIMARY KEY NOT NULL,
+			change_count INTEGER NOT NULL DEFAULT 1
+		);
+	''')
+
+	exported = 'IFNULL((SELECT MAX(last_question_id) FROM export_state), 0)'
+
+	mark_pending = '''
+		INSERT INTO export_pending (question_id) VALUES ({question_id})
+		ON CONFLICT (question_id) DO UPDATE SET change_count = change_count + 1
+	'''
+
+	cursor.execute(f'''
+		CREATE TRIGGER IF NOT EXISTS question_export_pending AFTER UPDATE OF question_text, answer_text ON question
+		WHEN NEW.question_id <= {exported}
+		BEGIN
+			{mark_pending.format(question_id='NEW.question_id')};
+		END;
+	''')
+
+	for table, columns in (('image', 'img_filename'), ('youtube_fragment', 'youtube_id, youtube_watch')):
+		cursor.execute(f'''
+			CREATE TRIGGER IF NOT EXISTS {table}_insert_export_pending AFTER INSERT ON {table}
+			WHEN NEW.question_id <= {exported}
+			BEGIN
+				{mark_pending.format(question_id='NEW.question_id')};
+			END;
+		''')
+
+		cursor.execute(f'''
+			CREATE TRIGGER IF NOT EXISTS {table}_update_export_pending AFTER UPDATE OF {columns} ON {table}
+			WHEN NEW.question_id <= {exported}
+			BEGIN
+				{mark_pending.format(question_id='NEW.question_id')};
+			END;
+		''')
+
+		cursor.execute(f'''
+			CREATE TRIGGER IF NOT EXISTS {table}_delete_export_pending AFTER DELETE ON {table}
+			WHEN OLD.question_id <= {exported}
+			BEGIN
+				{mark_pending.format(question_id='OLD.question_id')};
+			END;
+		''')
+
+	cursor.execute(f'''
+		CREATE TRIGGER IF NOT EXISTS image_download_export_pending AFTER UPDATE OF img_hash ON image
+		WHEN OLD.img_hash IS NULL AND NEW.img_hash IS NOT NULL AND NEW.question_id <= {exported}
+		BEGIN
+			{mark_pending.format(question_id='NEW.question_id')};
+		END;
+	''')
+
+
+def migration_009_question_search(cursor):
+	"""
+	Add a full-text index over the questions (see database_interaction.search_questions).
+
+	question_search:	an FTS5 table with the question_text, answer_text & tag_names (space-separated) of every question, its rowid is the question_id
+
+	New questions are indexed by database_writer.QuestionWriter (see database_interaction.index_questions), once their tags are stored,
+	so every question is indexed once (with a trigger on question_tag, a question with 3 tags would be indexed 4 times).
+	Triggers keep the index in sync with every later change: an update or delete of a question, tags that are added to or removed from it, a renamed tag.
+	Diacritics are ignored, 'cafe' matches 'café'.
+	"""
+
+	cursor.execute('''
+		CREATE VIRTUAL TABLE IF NOT EXISTS question_search USING fts5 (
+			question_text,
+			answer_text,
+			tag_names,
+			tokenize = 'unicode61 remove_diacritics 2'
+		);
+	''')
+
+	# question_text & answer_text used to be stored as an encoded value (bytes), CAST makes sure they are indexed as text
+	tag_names = '''(
+		SELECT IFNULL(group_concat(t.tag_name, ' '), '')
+		FROM question_tag qt
+		JOIN tag t ON qt.tag_id = t.tag_id
+		WHERE qt.question_id = {question_id}
+	)'''
+
+	cursor.execute(f'''
+		INSERT INTO question_search (rowid, question_text, answer_text, tag_names)
+		SELECT q.question_id, CAST(q.question_text AS TEXT), CAST(q.answer_text AS TEXT), {tag_names.format(question_id='q.question_id')}
+		FROM question q
+	''')
+
+	cursor.execute("INSERT INTO question_search (question_search) VALUES ('optimize')")
+
+	cursor.execute('''
+		CREATE TRIGGER IF NOT EXISTS question_update_search AFTER UPDATE OF question_text, answer_text ON question
+		BEGIN
+			UPDATE question_search
+			SET question_text = CAST(NEW.question_text AS TEXT), answer_text = CAST(NEW.answer_text AS TEXT)
+			WHERE rowid = NEW.question_id;
+		END;
+	''')
+
+	cursor.execute('''
+		CREATE TRIGGER IF NOT EXISTS question_delete_search AFTER DELETE ON question
+		BEGIN
+			DELETE FROM question_search WHERE rowid = OLD.question_id;
+		END;
+	''')
+
+	# for a question that is not indexed yet (the writer indexes it after its tags), this updates nothing
+	cursor.execute(f'''
+		CREATE TRIGGER IF NOT EXISTS question_tag_insert_search AFTER INSERT ON question_tag
+		BEGIN
+			UPDATE question_search
+			SET tag_names = {tag_names.format(question_id='NEW.question_id')}
+			WHERE rowid = NEW.question_id;
+		END;
+	''')
+
+	cursor.execute(f'''
+		CREATE TRIGGER IF NOT EXISTS question_tag_delete_search AFTER DELETE ON question_tag
+		BEGIN
+			UPDATE question_search
+			SET tag_names = {tag_names.format(question_id='OLD.question_id')}
+			WHERE rowid = OLD.question_id;
+		END;
+	''')
+
+	cursor.execute(f'''
+		CREATE TRIGGER IF NOT EXISTS tag_update_search AFTER UPDATE OF tag_name ON tag
+		BEGIN
+			UPDATE question_search
+			SET tag_names = {tag_names.format(question_id='question_search.rowid')}
+			WHERE rowid IN (SELECT question_id FROM question_tag WHERE tag_id = NEW.tag_id);
+		END;
+	''')
+
+
+"""
+MIGRATIONS
+
+Migration n (1-based) brings a database from version n-1 to version n.
+Only ever append to this list, never change or reorder a migration that was released.
+"""
+MIGRATIONS = [
+	migration_001_indexes_and_unique_constraints,
+	migration_002_run_state,
+	migration_003_page_boundaries,
+	migration_004_category_count,
+	migration_005_high_water_mark,
+	migration_006_run_questions_per_page,
+	migration_007_image_hash_and_size,
+	migration_008_export_state,
+	migration_009_question_search,
+]
+
+
+def get_schema_version(cursor):
+	"""Return the schema version of the database."""
+
+	cursor.execute('PRAGMA user_version')
+
+	schema_version = cursor.fetchone()[0]
+	return schema_version
+
+
+def migrate(connection):
+	"""
+	Bring the database up to the latest schema version, return that version.
+
+	Every migration runs in its own transaction, together with the update of the schema version,
+	so an interrupted migration leaves the database at the previous version.
+	"""
+
+	cursor = connection.cursor()
+	schema_version = get_schema_version(cursor)
+
+	for version, migration in enumerate(MIGRATIONS, start=1):
+
+		if version <= schema_version:
+			continue
+
+		logger.info(f'Migrating database to version {version}: {migration.__name__}')
+
+		try:
+			cursor.execute('BEGIN')
+			migration(cursor)
+			cursor.execute(f'PRAGMA user_version = {version}')
+			connection.commit()
+
+		except Exception as e:
+			connection.rollback()
+			logger.error(f'Migration to version {version} failed, the database stays at version {schema_version}, with exception message: \n {e}')
+			raise
+
+		schema_version = version
+
+	logger.debug(f'Database is at schema version {schema_version}')
+	return schema_version
+
+
+if __name__ == '__main__':
+
+	connection = sqlite3.connect(settings.DATABASE_URL)
+	migrate(connection)
+	connection.close()
@@ -0,0 +1,264 @@
+import database_interaction as db_inter
+import image_downloader
+import logger_setup
+import scraper_utilities as scraper_util
+import settings
+import time
+
+logger = logger_setup.create_logger(__name__)
+
+
+class QuestionWriter:
+	"""
+	Collect scraped question_records & write them to the database in batches, with executemany, in one transaction per batch.
+
+	A batch is flushed when flush is called (e.g. at the end of every questionpage),
+	when flush_rows question_records are pending, or when the oldest pending question_record is older than flush_seconds.
+	The age of a batch is checked whenever a question_record is added.
+
+	question_record is a dictionary with the following keys:
+	question_number, question_text, answer_text, quiz_info_dictionary, img_filename, youtube_id, tag_names
+
+	With download_images, the image of a question_record that has an image_url (but no img_filename yet) is downloaded
+	in the background by an ImageDownloader (see image_downloader.py), its hash & size are written as soon as it is done.
+	Leaving the with-block waits for the last downloads.
+	An image that could not be downloaded (or was cancelled) is kept without hash, the next run downloads it again (see retry_image_downloads).
+
+	Usage:
+		with QuestionWriter(connection) as writer:
+			writer.add(question_record, category_name)
+			writer.flush()
+	"""
+
+	def __init__(self, connection, flush_rows=settings.WRITER_FLUSH_ROWS, flush_seconds=settings.WRITER_FLUSH_SECONDS, download_images=False):
+		self.connection = connection
+		self.cursor = connection.cursor()
+
+		self.image_downloader = image_downloader.ImageDownloader() if download_images else None
+
+		# question_number -> ImageDownload, of downloads that finished but were not written yet
+		self.image_downloads = {}
+
+		self.flush_rows = flush_rows
+		self.flush_seconds = flush_seconds
+
+		self.pending = []
+		self.pending_question_numbers = set()
+		self.oldest_pending = None
+
+		# total number of questions written by this writer
+		self.questions_written = 0
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.flush()
+
+		if self.image_downloader:
+			# the images of the last questions might still be downloading
+			self.image_downloader.close(cancel=exc_type is not None)
+			self.flush()
+
+		return False
+
+	def add(self, question_record, category_name):
+		"""Queue question_record (of category_name) for writing, flush when the batch is full or too old."""
+
+		question_number = str(question_record.get('question_number'))
+
+		# the same question can show up twice before a flush, e.g. when new questions shift the pages during a scrape
+		if question_number in self.pending_question_numbers:
+			logger.debug(f'Question {question_number} is already waiting to be written.')
+			return
+
+		image_url = question_record.get('image_url')
+
+		if self.image_downloader and image_url and not question_record.get('img_filename'):
+			question_record['img_filename'] = scraper_util.construct_image_filename(image_url)
+			self.image_downloader.submit(question_number, image_url, category_name)
+
+		if not self.pending:
+			self.oldest_pending = time.monotonic()
+
+		self.pending.append((question_record, category_name))
+		self.pending_question_numbers.add(question_number)
+
+		if len(self.pending) >= self.flush_rows or time.monotonic() - self.oldest_pending >= self.flush_seconds:
+			self.flush()
+
+	def download_image(self, question_number, image_url, category_name):
+		"""Download the image of a question that is already stored, its hash & size are written by the next flush after it is done."""
+
+		self.image_downloader.submit(str(question_number), image_url, category_name)
+
+	def flush(self):
+		"""Write all pending question_records in one transaction, return the number of questions written."""
+
+		if self.image_downloader:
+			for image_download in self.image_downloader.completed():
+				self.image_downloads[str(image_download.question_number)] = image_download
+
+		if not self.pending and not self.image_downloads:
+			return 0
+
+		try:
+			if self.pending:
+				self.write_batch(self.pending)
+
+			# the remaining downloads belong to questions that were written before
+			self.write_image_downloads()
+			self.connection.commit()
+
+		except Exception as e:
+			self.connection.rollback()
+
+			# ids of categories, quizzes & tags inserted in the rolled back transaction are gone
+			db_inter.clear_lookup_caches()
+
+			logger.error(f'Writing a batch of {len(self.pending)} questions failed, nothing of the batch was written, with exception message: \n {e}')
+			raise
+
+		written = len(self.pending)
+		self.questions_written += written
+
+		if written:
+			logger.info(f'All information for {written} questions was written to the database. \n')
+
+		self.pending = []
+		self.pending_question_numbers = set()
+		self.oldest_pending = None
+
+		return written
+
+	def flush_page(self, run_id, category_name, last_completed_page):
+		"""
+		Write all pending question_records & record last_completed_page as the progress of category_name in run_id, in one transaction.
+
+		So after a crash, a resumed run (see settings.RESUME) continues right after the last page that was written.
+		"""
+
+		db_inter.set_category_progress(run_id, category_name, last_completed_page, [], 'running', self.cursor)
+
+		# flush commits the progress together with the questions, the commit below is for pages without new questions
+		written = self.flush()
+		self.connection.commit()
+
+		return written
+
+	def write_batch(self, batch):
+		"""Insert a batch of (question_record, category_name) without committing."""
+
+		cursor = self.cursor
+
+		# questions can be written in the meantime by another page (e.g. by the category_scheduler), those are skipped
+		stored_question_numbers = set(db_inter.get_stored_question_numbers([question_record.get('question_number') for question_record, category_name in batch], cursor))
+		batch = [(question_record, category_name) for question_record, category_name in batch if question_record.get('question_number') not in stored_question_numbers]
+
+		question_rows = []
+
+		for question_record, category_name in batch:
+
+			quiz_info_dictionary = question_record.get('quiz_info_dictionary')
+			quiz_id = db_inter.get_or_insert_quiz_id(
+				quiz_info_dictionary.get('quiz_name'),
+				quiz_info_dictionary.get('quiz_year'),
+				quiz_info_dictionary.get('quiz_url'),
+				quiz_info_dictionary.get('quiz_organiser'),
+				cursor
+			)
+
+			category_id = db_inter.get_or_insert_category_id(category_name, cursor)
+
+			question_rows.append((
+				question_record.get('question_number'),
+				question_record.get('question_text'),
+				question_record.get('answer_text'),
+				category_id,
+				quiz_id
+			))
+
+		db_inter.insert_questions(question_rows, cursor)
+
+		# executemany does not return a lastrowid per row, question_number is unique so it links the child rows instead
+		question_ids = db_inter.get_question_ids_for_question_numbers([question_row[0] for question_row in question_rows], cursor)
+
+		image_rows = []
+		youtube_fragment_rows = []
+		question_tag_rows = []
+
+		for question_record, category_name in batch:
+
+			question_id = question_ids[int(question_record.get('question_number'))]
+
+			img_filename = question_record.get('img_filename')
+			image_download = self.image_downloads.pop(str(question_record.get('question_number')), None)
+
+			if img_filename:
+				# still downloading, or the download failed (it has no img_filename), then the image has no hash until a next run downloads it
+				img_hash = image_download.img_hash if image_download else None
+				img_size = image_download.img_size if image_download else None
+
+				image_rows.append((img_filename, question_record.get('image_url'), img_hash, img_size, question_id))
+
+			youtube_id = question_record.get('youtube_id')
+
+			if youtube_id:
+				youtube_watch = scraper_util.get_youtube_watch_url(youtube_id)
+				youtube_fragment_rows.append((youtube_id, youtube_watch, question_id))
+
+			# a tag that is mentioned twice for one question is only linked once
+			tag_ids = []
+
+			for tag_name in question_record.get('tag_names'):
+				tag_id = db_inter.get_or_insert_tag_id(tag_name, cursor)
+
+				if tag_id not in tag_ids:
+					tag_ids.append(tag_id)
+
+			question_tag_rows.extend((question_id, tag_id) for tag_id in tag_ids)
+
+		db_inter.insert_images(image_rows, cursor)
+		db_inter.insert_youtube_fragments(youtube_fragment_rows, cursor)
+		db_inter.insert_question_tags(question_tag_rows, cursor)
+
+		# after the tags, so every question is indexed once, with its tags
+		db_inter.index_questions(question_ids.values(), cursor)
+
+	def write_image_downloads(self):
+		"""
+		Write the hash & size of all finished downloads, without committing.
+
+		Images that could not be downloaded keep no hash, retry_image_downloads downloads them again.
+		"""
+
+		image_file_rows = [
+			(image_download.img_hash, image_download.img_size, int(question_number))
+			for question_number, image_download in self.image_downloads.items()
+			if image_download.img_filename
+		]
+
+		db_inter.update_image_files(image_file_rows, self.cursor)
+
+		self.image_downloads = {}
+
+
+def retry_image_downloads(connection):
+	"""
+	Download the images that an earlier run could not download (or cancelled), return their number.
+
+	Those are stored without img_hash (see database_interaction.get_images_to_download), call this once at the start of a run.
+	"""
+
+	image_rows = db_inter.get_images_to_download(connection.cursor())
+
+	if not image_rows:
+		return 0
+
+	logger.info(f'Downloading {len(image_rows)} images that could not be downloaded before.')
+
+	with QuestionWriter(connection, download_images=True) as writer:
+		for question_number, image_url, category_name in image_rows:
+			writer.download_image(question_number, image_url, category_name)
+
+	return len(image_rows)
@@ -0,0 +1,203 @@
+"""
+Raw HTML archive
+
+Every questionpage & answer that is downloaded, is appended (as is) to an archive, so the database can be rebuilt
+from it after a parser bug was fixed, without asking the server again (see reparse.py).
+Pages & answers that are served from the http_cache are appended as well, unless the archive has them already.
+
+The archive consists of two files, next to each other:
+
+	{settings.HTML_ARCHIVE_URL}.gz				append-only, every page/answer is a separate gzip member
+	{settings.HTML_ARCHIVE_URL}.index.sqlite	offset & length of every gzip member, with its url, category, pagenr or question_number
+
+Because every member is compressed on its own, any entry can be read by seeking to its offset.
+The data file is also a valid gzip file as a whole: zcat shows all archived html.
+"""
+
+import gzip
+import hashlib
+import logger_setup
+import re
+import settings
+import sqlite3
+import threading
+import time
+
+logger = logger_setup.create_logger(__name__)
+
+CATEGORY_PAGE_PATTERN = re.compile(r'/categorie/(?P<category>[^/]+)/(?P<pagenr>\d+)/')
+ANSWER_PATTERN = re.compile(r'/beantwoordevragen\.php\?vraagid=(?P<question_number>\d+)')
+
+lock = threading.Lock()
+index_connection = None
+
+
+def get_data_path():
+	return f'{settings.HTML_ARCHIVE_URL}.gz'
+
+
+def get_index_connection():
+	"""Return the connection to the archive index, it is created on first use (so parser processes never open it)."""
+
+	global index_connection
+
+	if index_connection is None:
+		index_connection = sqlite3.connect(f'{settings.HTML_ARCHIVE_URL}.index.sqlite', check_same_thread=False)
+		index_connection.execute('PRAGMA journal_mode = WAL')
+		index_connection.execute('''
+			CREATE TABLE IF NOT EXISTS entry (
+				entry_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+				url TEXT,
+				kind TEXT,
+				category_name TEXT,
+				pagenr INTEGER,
+				question_number INTEGER,
+				data_offset INTEGER,
+				data_length INTEGER,
+				archived_at REAL,
+				content_hash TEXT
+			);
+		''')
+
+		index_connection.execute('CREATE INDEX IF NOT EXISTS entry_kind_index ON entry (kind)')
+		index_connection.execute('CREATE INDEX IF NOT EXISTS entry_question_number_index ON entry (question_number)')
+		index_connection.execute('CREATE INDEX IF NOT EXISTS entry_url_index ON entry (url, content_hash)')
+		index_connection.commit()
+
+	return index_connection
+
+
+def is_enabled(url):
+	"""Return True if url is a questionpage or answer, and the archive is switched on."""
+
+	if not settings.HTML_ARCHIVE_URL:
+		return False
+
+	return bool(CATEGORY_PAGE_PATTERN.search(url) or ANSWER_PATTERN.search(url))
+
+
+def get_content_hash(content):
+	"""Return the sha1 hash of content, to recognise a response that was archived before."""
+
+	return hashlib.sha1(content).hexdigest()
+
+
+def archive_if_missing(url, content):
+	"""Append content to the archive, unless it was archived for url before (e.g. a response served from the http_cache)."""
+
+	with lock:
+		row = get_index_connection().execute('''
+			SELECT 1
+			FROM entry
+			WHERE url = ? AND content_hash = ?
+			LIMIT 1
+		''', (url, get_content_hash(content))).fetchone()
+
+	if not row:
+		archive(url, content)
+
+
+def archive(url, content):
+	"""Append the raw content of a questionpage or answer, fetched from url, to the archive."""
+
+	category_page_match = CATEGORY_PAGE_PATTERN.search(url)
+	answer_match = ANSWER_PATTERN.search(url)
+
+	if category_page_match:
+		kind = 'page'
+		category_name = category_page_match.group('category')
+		pagenr = int(category_page_match.group('pagenr'))
+		question_number = None
+
+	elif answer_match:
+		kind = 'answer'
+		category_name = None
+		pagenr = None
+		question_number = int(answer_match.group('question_number'))
+
+	else:
+		return
+
+	member = gzip.compress(content)
+
+	with lock:
+		connection = get_index_connection()
+
+		# the data is written (& flushed) before it is indexed, so an index entry never points to missing data
+		with open(get_data_path(), 'ab') as data_file:
+			data_offset = data_file.tell()
+			data_file.write(member)
+
+		connection.execute('''
+			INSERT INTO entry (url, kind, category_name, pagenr, question_number, data_offset, data_length, archived_at, content_hash)
+			VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+		''', (url, kind, category_name, pagenr, question_number, data_offset, len(member), time.time(), get_content_hash(content)))
+		connection.commit()
+
+	logger.debug(f'{url} archived at offset {data_offset}.')
+
+
+def read(data_file, data_offset, data_length):
+	"""Return the raw content of the archive entry at data_offset."""
+
+	data_file.seek(data_offset)
+	content = gzip.decompress(data_file.read(data_length))
+
+	return content
+
+
+def iterate_pages():
+	"""
+	Yield ((category_name, pagenr), content) for every archived questionpage, newest first.
+
+	A question shows up on other pages over time, newest first means its most recent version is seen first.
+	"""
+
+	cursor = get_index_connection().cursor()
+	cursor.execute('''
+		SELECT category_name, pagenr, data_offset, data_length
+		FROM entry
+		WHERE kind = 'page'
+		ORDER BY entry_id DESC
+	''')
+
+	with open(get_data_path(), 'rb') as data_file:
+		for category_name, pagenr, data_offset, data_length in cursor:
+			yield (category_name, pagenr), read(data_file, data_offset, data_length)
+
+
+class AnswerReader:
+	"""
+	Reads archived answers by question_number.
+
+	Usage:
+		with AnswerReader() as answer_reader:
+			answer_content = answer_reader.get(question_number)
+	"""
+
+	def __enter__(self):
+		self.data_file = open(get_data_path(), 'rb')
+		self.cursor = get_index_connection().cursor()
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.data_file.close()
+		return False
+
+	def get(self, question_number):
+		"""Return the raw content of the most recent archived answer for question_number, None if it was not archived."""
+
+		self.cursor.execute('''
+			SELECT data_offset, data_length
+			FROM entry
+			WHERE kind = 'answer' AND question_number = ?
+			ORDER BY entry_id DESC
+			LIMIT 1
+		''', (int(question_number),))
+
+		row = self.cursor.fetchone()
+
+		if not row:
+			return None
+
+		return read(self.data_file, *row)
@@ -0,0 +1,169 @@
+"""
+On-disk HTTP response cache, used by scraper_utilities.fetch & async_scraper_utilities.fetch
+
+Responses of GET requests are stored (compressed) in a sqlite database, keyed by url & the login of the session that fetched them
+(a logged in user sees other pages, e.g. the foto category & its images, see set_login).
+How long a response stays fresh depends on the class of its url, see settings.HTTP_CACHE_TTL.
+A stale response is revalidated with If-None-Match/If-Modified-Since, a 304 answer costs no bandwidth.
+"""
+
+import collections
+import logger_setup
+import re
+import settings
+import sqlite3
+import threading
+import time
+import weakref
+import zlib
+
+logger = logger_setup.create_logger(__name__)
+
+CacheEntry = collections.namedtuple('CacheEntry', ['login', 'url', 'content', 'etag', 'last_modified', 'fetched_at'])
+
+"""
+URL_CLASSES
+
+(pattern, url_class), the first pattern that matches a url decides its url_class
+"""
+URL_CLASSES = [
+	(re.compile(r'/beantwoordevragen\.php'), 'answer'),
+	(re.compile(r'/categorie/[^/]+/\d+/'), 'category_page'),
+	(re.compile(r'/categorie/?$'), 'category_overview'),
+]
+
+lock = threading.Lock()
+connection = None
+
+# session -> the username it is logged in with, see set_login
+logins = weakref.WeakKeyDictionary()
+
+
+def get_url_class(url):
+	"""Return the url_class of url, None if the url should not be cached."""
+
+	for pattern, url_class in URL_CLASSES:
+		if pattern.search(url):
+			return url_class
+
+	return None
+
+
+def get_connection():
+	"""Return the connection to the cache database, it is created on first use (so parser processes never open it)."""
+
+	global connection
+
+	if connection is None:
+		connection = sqlite3.connect(settings.HTTP_CACHE_URL, check_same_thread=False)
+		connection.execute('PRAGMA journal_mode = WAL')
+		connection.execute('PRAGMA synchronous = NORMAL')
+
+		connection.execute('''
+			CREATE TABLE IF NOT EXISTS cached_response (
+				login TEXT NOT NULL,
+				url TEXT NOT NULL,
+				content BLOB,
+				etag TEXT,
+				last_modified TEXT,
+				fetched_at REAL,
+				PRIMARY KEY (login, url)
+			);
+		''')
+		connection.commit()
+
+	return connection
+
+
+def is_enabled(url):
+	"""Return True if responses for url are cached."""
+
+	return bool(settings.HTTP_CACHE_URL) and get_url_class(url) is not None
+
+
+def set_login(session, username):
+	"""
+	Record that session is logged in as username, '' if it is not logged in.
+
+	Responses are only served to sessions with the same login as the session that fetched them.
+	"""
+
+	logins[session] = username or ''
+
+
+def get_login(session):
+	"""Return the username session is logged in with, '' if it is not logged in."""
+
+	return logins.get(session, '')
+
+
+def lookup(url, login=''):
+	"""Return the CacheEntry for url fetched by a session with login, None if it is not cached."""
+
+	with lock:
+		row = get_connection().execute('''
+			SELECT login, url, content, etag, last_modified, fetched_at
+			FROM cached_response
+			WHERE login = ? AND url = ?
+		''', (login, url)).fetchone()
+
+	if not row:
+		return None
+
+	login, url, content, etag, last_modified, fetched_at = row
+	return CacheEntry(login, url, zlib.decompress(content), etag, last_modified, fetched_at)
+
+
+def is_fresh(cache_entry):
+	"""Return True if cache_entry can be used without asking the server."""
+
+	ttl = settings.HTTP_CACHE_TTL.get(get_url_class(cache_entry.url))
+
+	# a ttl of None means the response never changes
+	if ttl is None:
+		return True
+
+	return time.time() - cache_entry.fetched_at < ttl
+
+
+def conditional_headers(cache_entry):
+	"""Return the headers to revalidate cache_entry with."""
+
+	headers = {}
+
+	if cache_entry.etag:
+		headers['If-None-Match'] = cache_entry.etag
+
+	if cache_entry.last_modified:
+		headers['If-Modified-Since'] = cache_entry.last_modified
+
+	return headers
+
+
+def store(url, headers, content, login=''):
+	"""Store the content of a 200 response for url, fetched by a session with login, with its validators."""
+
+	with lock:
+		cache_connection = get_connection()
+		cache_connection.execute('''
+			INSERT OR REPLACE INTO cached_response (login, url, content, etag, last_modified, fetched_at)
+			VALUES (?, ?, ?, ?, ?, ?)
+		''', (login, url, zlib.compress(content), headers.get('ETag'), headers.get('Last-Modified'), time.time()))
+		cache_connection.commit()
+
+	logger.debug(f'Response for {url} stored in the cache.')
+
+
+def refresh(url, login=''):
+	"""Mark the cached response for url (of login) as fresh again, after the server answered 304 Not Modified."""
+
+	with lock:
+		cache_connection = get_connection()
+		cache_connection.execute('''
+			UPDATE cached_response
+			SET fetched_at = ?
+			WHERE login = ? AND url = ?
+		''', (time.time(), login, url))
+		cache_connection.commit()
+
+	logger.debug(f'Cached response for {url} is still valid.')
@@ -0,0 +1,280 @@
+"""
+Background image downloads, with content-addressed storage.
+
+Images are downloaded by a pool of threads (settings.IMAGE_DOWNLOAD_WORKERS), so scraping the next questions
+does not wait for image transfers (see database_writer.QuestionWriter, which hands its images to an ImageDownloader).
+
+Every image is stored once, named after the sha256 hash of its content:
+
+	{settings.IMAGE_STORE_DIRECTORY}/{hash[:2]}/{hash}{extension}
+
+and linked (a hard link, a copy where the filesystem does not support those) to where the exporters expect it:
+
+	./{category}/{img_filename}
+
+An image that is already at ./{category}/{img_filename} is not downloaded again, if its size matches the Content-Length of the image on the server
+(only the headers are read): files only ever show up there completely (they are downloaded to a temporary file first),
+but earlier versions of the scraper wrote them in place, so an interrupted run could leave a truncated file behind.
+"""
+
+import collections
+import concurrent.futures
+import hashlib
+import logger_setup
+import os
+import scraper_utilities as scraper_util
+import settings
+import shutil
+import tempfile
+import threading
+import time
+
+logger = logger_setup.create_logger(__name__)
+
+ImageDownload = collections.namedtuple('ImageDownload', ['question_number', 'img_filename', 'img_hash', 'img_size'])
+
+session_lock = threading.Lock()
+session = None
+
+
+def get_session():
+	"""Return the logged in session all image downloads share, it is created on first use."""
+
+	global session
+
+	with session_lock:
+		if session is None:
+			session = scraper_util.create_session(pool_size=settings.IMAGE_DOWNLOAD_WORKERS)
+			scraper_util.login(session, username=settings.CREDENTIALS.get('username', None), password=settings.CREDENTIALS.get('password', None))
+
+	return session
+
+
+def get_store_path(img_hash, extension):
+	return os.path.join(settings.IMAGE_STORE_DIRECTORY, img_hash[:2], f'{img_hash}{extension}')
+
+
+def hash_file(path, chunk_size=64 * 1024):
+	"""Return (sha256 hexdigest, size) of the file at path."""
+
+	sha256 = hashlib.sha256()
+	size = 0
+
+	with open(path, 'rb') as imagefile:
+		for chunk in iter(lambda: imagefile.read(chunk_size), b''):
+			sha256.update(chunk)
+			size += len(chunk)
+
+	return sha256.hexdigest(), size
+
+
+def link_or_copy(source_path, target_path):
+	"""Make target_path a hard link to source_path, or a copy of it if hard links are not supported."""
+
+	os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+	try:
+		os.link(source_path, target_path)
+	except FileExistsError:
+		pass
+	except OSError:
+		shutil.copyfile(source_path, target_path)
+
+
+def open_image(image_url, session):
+	"""Return the response for image_url, of which only the headers are read yet (stream=True)."""
+
+	image = scraper_util.fetch(image_url, session, stream=True)
+
+	try:
+		image.raise_for_status()
+	except Exception:
+		image.close()
+		raise
+
+	return image
+
+
+def has_content_length(image, path):
+	"""Return True if the file at path has the size of the Content-Length of image (False if the server does not send one)."""
+
+	content_length = image.headers.get('Content-Length')
+	return content_length is not None and content_length.isdigit() and int(content_length) == os.path.getsize(path)
+
+
+def download(image_url, session, chunk_size=64 * 1024, image=None):
+	"""
+	Download the image at image_url to a temporary file in the image store, return (temporary path, sha256 hexdigest, size).
+
+	image -- a response for image_url of which the body was not read yet (see open_image), it is requested if None
+	"""
+
+	if image is None:
+		image = open_image(image_url, session)
+
+	os.makedirs(settings.IMAGE_STORE_DIRECTORY, exist_ok=True)
+	file_descriptor, temporary_path = tempfile.mkstemp(dir=settings.IMAGE_STORE_DIRECTORY, suffix='.part')
+
+	sha256 = hashlib.sha256()
+	size = 0
+
+	try:
+		with os.fdopen(file_descriptor, 'wb') as imagefile:
+			for chunk in image.iter_content(chunk_size):
+				imagefile.write(chunk)
+				sha256.update(chunk)
+				size += len(chunk)
+
+	except BaseException:
+		os.remove(temporary_path)
+		raise
+
+	finally:
+		image.close()
+
+	return temporary_path, sha256.hexdigest(), size
+
+
+def store_image(question_number, image_url, category, session, retries=settings.IMAGE_DOWNLOAD_RETRIES):
+	"""
+	Make sure the image at image_url is at ./{category}/{img_filename}, return its ImageDownload.
+
+	A failed download is retried, with a growing pause in between, the last exception is raised.
+	"""
+
+	img_filename = scraper_util.construct_image_filename(image_url)
+	extension = os.path.splitext(img_filename)[1]
+	category_path = os.path.join('.', category, img_filename)
+
+	# the response of the check below, its body is the download when the file on disk is not complete
+	image = None
+
+	# downloaded before, e.g. by a run that was interrupted
+	if os.path.exists(category_path) and os.path.getsize(category_path) > 0:
+		image = open_image(image_url, session)
+
+		if has_content_length(image, category_path):
+			image.close()
+
+			img_hash, img_size = hash_file(category_path)
+			store_path = get_store_path(img_hash, extension)
+
+			if not os.path.exists(store_path):
+				link_or_copy(category_path, store_path)
+
+			logger.debug(f'{category_path} is already on disk.')
+			return ImageDownload(question_number, img_filename, img_hash, img_size)
+
+		logger.info(f'{category_path} is on disk, but it is not complete (or its size is unknown), it is downloaded again.')
+
+		# the link to the store is replaced by the complete image below
+		os.remove(category_path)
+
+	for attempt in range(retries + 1):
+		try:
+			temporary_path, img_hash, img_size = download(image_url, session, image=image)
+			break
+
+		except Exception as e:
+			if attempt == retries:
+				raise
+
+			logger.warning(f'Downloading {image_url} failed (attempt {attempt + 1} of {retries + 1}), with exception message: \n {e}')
+			time.sleep(2 ** attempt)
+
+		finally:
+			# a retry requests the image again
+			image = None
+
+	store_path = get_store_path(img_hash, extension)
+
+	if os.path.exists(store_path):
+		# the same image belongs to another question already
+		os.remove(temporary_path)
+		logger.debug(f'{image_url} is already stored as {store_path}.')
+	else:
+		os.makedirs(os.path.dirname(store_path), exist_ok=True)
+		os.replace(temporary_path, store_path)
+
+	link_or_copy(store_path, category_path)
+	logger.debug(f'{img_filename} downloaded to {category_path}')
+
+	return ImageDownload(question_number, img_filename, img_hash, img_size)
+
+
+class ImageDownloader:
+	"""
+	Downloads images in the background, with a pool of max_workers threads.
+
+	submit blocks when max_pending images are waiting already, so the scraper can not run arbitrarily far ahead.
+
+	Usage:
+		with ImageDownloader() as image_downloader:
+			image_downloader.submit(question_number, image_url, category)
+			...
+			for image_download in image_downloader.completed():
+				...
+	"""
+
+	def __init__(self, max_workers=settings.IMAGE_DOWNLOAD_WORKERS, max_pending=None):
+		self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+		self.pending_slots = threading.Semaphore(max_pending or 4 * max_workers)
+
+		self.lock = threading.Lock()
+		self.futures = []
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.close(cancel=exc_type is not None)
+		return False
+
+	def submit(self, question_number, image_url, category):
+		"""Download the image at image_url (of question_number) to ./{category}/ in the background."""
+
+		self.pending_slots.acquire()
+
+		future = self.executor.submit(store_image, question_number, image_url, category, get_session())
+		future.add_done_callback(lambda future: self.pending_slots.release())
+
+		with self.lock:
+			self.futures.append((future, question_number, image_url))
+
+	def completed(self):
+		"""
+		Return the ImageDownloads that finished since the last call.
+
+		A download that failed (or was cancelled) has no img_filename, img_hash & img_size.
+		"""
+
+		done = []
+		not_done = []
+
+		with self.lock:
+			for download in self.futures:
+				(done if download[0].done() else not_done).append(download)
+
+			self.futures = not_done
+
+		image_downloads = []
+
+		for future, question_number, image_url in done:
+
+			if future.cancelled():
+				image_downloads.append(ImageDownload(question_number, None, None, None))
+				continue
+
+			try:
+				image_downloads.append(future.result())
+
+			except Exception as e:
+				logger.error(f'Question_number: {question_number}. The image at {image_url} could not be downloaded, with exception message: \n {e}')
+				image_downloads.append(ImageDownload(question_number, None, None, None))
+
+		return image_downloads
+
+	def close(self, cancel=False):
+		"""Wait for all downloads to finish, or cancel the ones that did not start yet."""
+
+		self.executor.shutdown(wait=True, cancel_futures=cancel)
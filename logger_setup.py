@@ -1,5 +1,9 @@
 import logging
 
+# relative to the cwd when create_logger is called (every module creates its logger when it is imported)
+LOG_FILENAME = '-quizarchief-.log'
+
+
 def create_logger(name=__name__):
 
 	logger = logging.getLogger(name)
@@ -8,7 +12,7 @@ def create_logger(name=__name__):
 	console_logger = logging.StreamHandler()
 	console_logger.setLevel(logging.INFO)
 
-	file_logger = logging.FileHandler('-quizarchief-.log')
+	file_logger = logging.FileHandler(LOG_FILENAME)
 	file_logger.setLevel(logging.DEBUG)
 
 	file_formatter = logging.Formatter('%(asctime)s::%(module)s::%(funcName)s::%(lineno)s::%(levelname)s::%(message)s')
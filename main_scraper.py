@@ -1,155 +1,458 @@
+import answer_fetcher
+import async_scraper_utilities as async_scraper_util
+import asyncio
+import category_scheduler
 import database_interaction as db_inter
+import database_migration
+import database_writer
 import logger_setup
+import parsing_pipeline
 import scraper_utilities as scraper_util
 import settings
 
 logger = logger_setup.create_logger(__name__)
 
 DATABASE_URL = settings.DATABASE_URL
+DATABASE_PROFILE = settings.DATABASE_PROFILE
 CATEGORY = settings.CATEGORY
 FROM_PAGE = settings.FROM_PAGE
 TO_PAGE = settings.TO_PAGE
-SLEEP_TIME = settings.SLEEP_TIME
+QUESTIONS_PER_PAGE = settings.QUESTIONS_PER_PAGE
 CREDENTIALS = settings.CREDENTIALS
 
-category_dict = scraper_util.create_category_dictionary()
+ASYNC_ENGINE = settings.ASYNC_ENGINE
+CONCURRENT_CATEGORIES = settings.CONCURRENT_CATEGORIES
+INCREMENTAL = settings.INCREMENTAL and settings.ONLY_NEW
 
-if CATEGORY == 'ALL':
-	categories = [category for category in category_dict.keys()]
-else:
-	categories = [CATEGORY]
+# only a scrape of every page of a category sets its high-water mark, if it was not stopped early by settings.ONLY_NEW (see complete_category)
+FULL_SCRAPE = FROM_PAGE == 1 and TO_PAGE == 'ALL'
 
-for category in categories:
 
-	logger.info(f'\n Scraping questions for category: {category} \n')
+def scrape_category_asynchronously(category, start_page, end_page, questions_per_page, run_id, connection, cursor):
+	"""Scrape a category with the asyncio engine (see async_scraper_utilities.py), return True if every page in the range was processed."""
 
-	if scraper_util.is_valid_category(category, category_dict):
+	with database_writer.QuestionWriter(connection, download_images=True) as writer:
 
-		pages_for_category = scraper_util.compute_pages_for_category(category, category_dict)
-		end_page = scraper_util.validate_end_page(TO_PAGE, pages_for_category)
-		start_page = scraper_util.validate_start_page(FROM_PAGE, end_page)
+		def store_questions(pagenr, question_records):
+			for question_record in question_records:
+				writer.add(question_record, category)
 
-		connection = db_inter.make_connection(DATABASE_URL)
-		cursor = db_inter.create_cursor(connection)
+			# end of the page, write it in one transaction
+			writer.flush_page(run_id, category, pagenr)
 
-		session = scraper_util.create_session()
-		scraper_util.login(session, username=CREDENTIALS.get('username', None), password=CREDENTIALS.get('password', None))
+		def find_stored_question_numbers(question_numbers):
+			return db_inter.get_stored_question_numbers(question_numbers, cursor)
 
+		return asyncio.run(async_scraper_util.scrape_category(category, start_page, end_page, store_questions, find_stored_question_numbers, questions_per_page=questions_per_page))
 
-		for pagenr in range(start_page, end_page):
-			
-			url = scraper_util.construct_url(category, pagenr)
-			
-			logger.info(f'Fetching results for page {pagenr}. \n')
 
-			questionpage = scraper_util.get_questionpage(url, session)
-			soup = scraper_util.make_soup(questionpage)
-			questionrows = scraper_util.find_all_questionrows(soup)
+def skip_stored_pages(pages, cursor, fetcher):
+	"""
+	Yield the (pagenr, content) of pages, except for pages of which all questions are already in the database.
 
-			for i, questionrow in enumerate(questionrows):
-				
-				question_number = scraper_util.find_question_number(questionrow)
+	Those pages are not parsed at all. With settings.ONLY_NEW, such a page ends the scrape & stops fetcher (the PageFetcher of pages).
+	"""
+
+	for pagenr, content in pages:
+
+		question_numbers = scraper_util.find_question_numbers_in_content(content)
+		stored_question_numbers = db_inter.get_stored_question_numbers(question_numbers, cursor)
+
+		if question_numbers and len(stored_question_numbers) == len(question_numbers):
+			logger.info(f'All questions on page {pagenr} are already in database.')
+
+			if settings.ONLY_NEW == True:
+				logger.info(f'You set settings.ONLY_NEW to True, so downloading will stop.')
+				fetcher.stop()
+				return
+
+			continue
+
+		yield pagenr, content
+
+
+def scrape_category(category, start_page, end_page, questions_per_page, run_id, connection, cursor, parser_pool=None):
+	"""
+	Scrape a category one request at a time, return True if every page in the range was processed (False when settings.ONLY_NEW stopped it early).
+
+	A PageFetcher thread fetches the questionpages, parser_pool parses them (see parsing_pipeline.create_parser_pool),
+	and the answers of the new questions on a page are fetched all at once (see answer_fetcher.py), right before the page is written
+	(images are downloaded in the background by the writer).
+	When a page can not be fetched, the exception is raised, so the category is not completed (see complete_category).
+	"""
+
+	# a keep-alive connection for every answer thread & the page fetcher
+	session = scraper_util.create_session(pool_size=settings.ANSWER_FETCH_WORKERS + 1)
+	scraper_util.login(session, username=CREDENTIALS.get('username', None), password=CREDENTIALS.get('password', None))
+
+	fetcher = parsing_pipeline.PageFetcher(category, range(start_page, end_page), session, questions_per_page=questions_per_page)
+	fetcher.start()
+
+	# the progress row is rewritten before every page, it keeps the progress of a resumed run until the next page is written
+	last_completed_page = start_page - 1
+
+	try:
+		# questions are written in one transaction per page, leaving the with-block writes what is still pending
+		with database_writer.QuestionWriter(connection, download_images=True) as writer, answer_fetcher.AnswerFetcher(session) as answers:
 
-				is_already_in_database = db_inter.get_question_id(question_number, cursor)
+			# not more pages in flight than PAGE_PREFETCH allows, pages after a settings.ONLY_NEW stop would be fetched for nothing
+			for pagenr, question_records in parsing_pipeline.parse_pages(skip_stored_pages(fetcher.pages(), cursor, fetcher), parser_pool, max_pending_pages=settings.PAGE_PREFETCH + 1):
+
+				# check which questions of the page are already in the database, with a single query
+				question_numbers = [question_record['question_number'] for question_record in question_records]
+				stored_question_numbers = set(db_inter.get_stored_question_numbers(question_numbers, cursor))
+
+				in_flight_question_numbers = [question_number for question_number in question_numbers if question_number not in stored_question_numbers]
+				db_inter.set_category_progress(run_id, category, last_completed_page, in_flight_question_numbers, 'running', cursor)
+				connection.commit()
+
+				new_question_records = []
+				stop = False
+
+				for question_record in question_records:
+
+					question_number = question_record['question_number']
+
+					if question_number in stored_question_numbers:
+						logger.info(f'Question {question_number} is already in database.')
 				
-				if is_already_in_database:
-					logger.info(f'Question {question_number} is already in database.')
+						if settings.ONLY_NEW == True:
+							logger.info(f'You set settings.ONLY_NEW to True, so downloading will stop.')
 					
-					if settings.ONLY_NEW == True:
-						logger.info(f'You set settings.ONLY_NEW to True, so downloading will stop.')
-						
-						# For details about ONLY_NEW, see settings.py
-						break
+							# For details about ONLY_NEW, see settings.py
+							stop = True
+							break
 
-					# Take a sleeptime of 0 or 1 seconds between the parsing of each question
-					# by doing so, it will take 10 seconds on average for 1 page which is still reasonable
-					# otherwise: in scenario you already downloaded the first 100 pages, but need page 101
-					# the 100 pages would be asked without a pause (or only with pause = time to retrieve question_id * 20)
-					scraper_util.sleep_randomly(1, 0)
-					continue
+						# no request was made for this question, so there is no need to wait
+						# the next page request is paced by the rate limiter (see rate_limiter.py)
+						continue
 
-				quiz_info_dictionary = scraper_util.find_quiz_info(questionrow, question_number)
-				quiz_name = quiz_info_dictionary.get('quiz_name')
-				quiz_year = quiz_info_dictionary.get('quiz_year')
-				quiz_url = quiz_info_dictionary.get('quiz_url')
-				quiz_organiser = quiz_info_dictionary.get('quiz_organiser')
+					new_question_records.append(question_record)
 
-				quiz_id = db_inter.get_quiz_id_with_quiz_url(quiz_url, cursor)
+				answer_texts = answers.fetch_answers([question_record['question_number'] for question_record in new_question_records])
 
-				if not quiz_id:
-					quiz_id = db_inter.insert_quiz(quiz_name, quiz_year, quiz_url, quiz_organiser, cursor)
+				for question_record, answer_text in zip(new_question_records, answer_texts):
+					question_record['answer_text'] = answer_text
+					writer.add(question_record, category)
 
-				else:
-					quiz_id = quiz_id[0]
+				# basically, if the question_number is already in the database && settings.ONLY_NEW = True
+				# we want to stop all operations of the scraper
+				# if settings.ONLY_NEW = False, the loop continues digging for more questions
+				if stop:
+					fetcher.stop()
+					break
 
-				category_name = category
-				category_id = db_inter.get_category_id(category_name, cursor)
+				# end of the page, write it in one transaction
+				writer.flush_page(run_id, category, pagenr)
+				last_completed_page = pagenr
 
-				if not category_id:
-					category_id = db_inter.insert_category(category_name, cursor)
+		# only a settings.ONLY_NEW stop stops the fetcher before the end of the range
+		return not fetcher.is_stopped()
 
-				else:
-					category_id = category_id[0]
+	finally:
+		# also when fetching or writing failed, the category is then not completed & a resumed run continues after its last written page
+		fetcher.stop()
 
-				
-				question_text = scraper_util.find_question(questionrow, question_number)
-				answer_text = scraper_util.find_answer(question_number, session)
 
-				# logger.info(f'question_id = db_inter.insert_question(question_number, question_text, answer_text, category_id, quiz_id, cursor)')
-				# logger.info(f'param 0: question_number: \n {question_number}')
-				# logger.info(f'param 1: question_text: \n {question_text}')
-				# logger.info(f'param 2: answer_text: \n {answer_text}')
-				# logger.info(f'param 3: category_id: \n {category_id}')
-				# logger.info(f'param 4: quiz_id: \n {quiz_id}')
-				# logger.info(f'param 5: cursor: \n {cursor}')
+def start_or_resume_run():
+	"""
+	Return the run_id of this run.
 
-				question_id = db_inter.insert_question(question_number, question_text, answer_text, category_id, quiz_id, cursor)
+	With settings.RESUME, the previous run is continued if it did not finish.
+	"""
 
-				img_filename = scraper_util.find_image(questionrow, question_number, category_name, session)
+	connection = db_inter.make_connection(DATABASE_URL, DATABASE_PROFILE)
+	cursor = db_inter.create_cursor(connection)
 
-				if img_filename:
-					img_id = db_inter.insert_image(img_filename, question_id, cursor)
-				
+	run_id = None
 
-				youtube_id = scraper_util.find_youtube_fragment(questionrow, question_number, session)
+	if settings.RESUME:
+		run_id = db_inter.get_resumable_run_id(CATEGORY, cursor)
 
-				if youtube_id:
-					youtube_watch = scraper_util.get_youtube_watch_url(youtube_id)
-					fragment_id = db_inter.insert_youtube_fragment(youtube_id, youtube_watch, question_id, cursor)
+	if run_id:
+		logger.info(f'The previous run (run_id {run_id}) did not finish, it will be resumed.')
+		db_inter.set_run_status(run_id, 'running', cursor)
+	else:
+		run_id = db_inter.start_run(CATEGORY, cursor)
+		logger.debug(f'Started run with run_id {run_id}.')
 
+	connection.commit()
+	connection.close()
 
-				tag_names = scraper_util.find_tags(questionrow, question_number)
-				
-				tag_id = ''
-				
-				if len(tag_names) > 0:
+	return run_id
 
-					for tag_name in tag_names:
 
-						tag_id = db_inter.get_tag_id(tag_name, cursor)
+def set_run_status(run_id, status):
 
-						if not tag_id:
-							tag_id = db_inter.insert_tag(tag_name, cursor)
+	connection = db_inter.make_connection(DATABASE_URL, DATABASE_PROFILE)
+	db_inter.set_run_status(run_id, status, connection.cursor())
+	connection.commit()
+	connection.close()
 
-						else:
-							tag_id = tag_id[0]
-					
-						db_inter.insert_question_tag(question_id, tag_id, cursor)
 
-				connection.commit()
-				logger.info(f'All information for question_number {question_number} was written to the database. \n')
+def determine_questions_per_page(run_id, categories, category_dict, session):
+	"""
+	Return the number of questions per page run_id asks for.
+
+	A new run detects how many questions the server actually shows, when settings.QUESTIONS_PER_PAGE are asked for (see scraper_utilities.detect_questions_per_page),
+	a resumed run keeps scraping & counting its pages the way it started, so its last completed pages still match.
+	"""
+
+	connection = db_inter.make_connection(DATABASE_URL, DATABASE_PROFILE)
+	cursor = db_inter.create_cursor(connection)
+
+	questions_per_page, questions_on_page = db_inter.get_run_questions_per_page(run_id, cursor)
+
+	if questions_per_page is None:
+		# the largest category, so its first page is certainly full
+		category = max(categories, key=lambda category: category_dict.get(category, 0), default=None)
+
+		if category is None:
+			questions_per_page = QUESTIONS_PER_PAGE
+		else:
+			questions_per_page = scraper_util.detect_questions_per_page(category, category_dict, session, QUESTIONS_PER_PAGE)
+
+		questions_on_page = scraper_util.get_questions_on_page(questions_per_page)
+
+		db_inter.set_run_questions_per_page(run_id, questions_per_page, questions_on_page, cursor)
+		connection.commit()
+	else:
+		scraper_util.set_questions_on_page(questions_per_page, questions_on_page)
+
+	connection.close()
+
+	logger.debug(f'Scraping with {questions_per_page} questions per page, which show {questions_on_page} questions.')
+	return questions_per_page
+
+
+def plan_category(category, category_dict, questions_per_page, run_id, cursor):
+	"""
+	Return the range of pages to scrape for category in this run.
+	Return None if the category should not be scraped (anymore).
+	"""
+
+	if not scraper_util.is_valid_category(category, category_dict):
+		return None
+
+	pages_for_category = scraper_util.compute_pages_for_category(category, category_dict, questions_per_page)
+	end_page = scraper_util.validate_end_page(TO_PAGE, pages_for_category)
+	start_page = scraper_util.validate_start_page(FROM_PAGE, end_page)
+
+	category_progress = db_inter.get_category_progress(run_id, category, cursor)
+
+	if category_progress:
+		last_completed_page, in_flight_question_numbers, status = category_progress
+
+		if status == 'done':
+			logger.info(f'Category {category} was already done in this run.')
+			return None
+
+		if last_completed_page is not None:
+			start_page = max(start_page, last_completed_page + 1)
+			logger.info(f'Resuming category {category} at page {start_page}, questions that were being downloaded: {in_flight_question_numbers}')
+
+	return range(start_page, end_page)
+
+
+def complete_category(run_id, category, connection, high_water_mark=None, full_scrape=False):
+	"""
+	Record category as done in run_id, only call it when all its pages of the run were scraped.
+
+	high_water_mark -- all questions of category up to this question_number are stored (after a sync), None leaves the mark as it is
+	full_scrape -- every page of category was scraped (FROM_PAGE = 1, TO_PAGE = 'ALL'), the highest stored question_number becomes the mark
+	"""
+
+	cursor = connection.cursor()
+
+	category_progress = db_inter.get_category_progress(run_id, category, cursor)
+	last_completed_page = category_progress[0] if category_progress else None
+
+	db_inter.set_category_progress(run_id, category, last_completed_page, [], 'done', cursor)
+
+	if high_water_mark is None and full_scrape:
+		high_water_mark = db_inter.get_max_stored_question_number(category, cursor)
+
+	if high_water_mark is not None:
+		db_inter.raise_high_water_mark(category, high_water_mark, cursor)
+
+	connection.commit()
+
+
+def sync_category(category, high_water_mark, end_page, questions_per_page, session, run_id, connection, cursor):
+	"""
+	Scrape the questions of category that are newer than high_water_mark, return the new high-water mark.
+
+	Pages are fetched newest first, from page 1, until a page reaches high_water_mark.
+	If that page has questions below high_water_mark that are not stored (a gap), the next page is fetched as well, and so on.
+	"""
+
+	new_high_water_mark = high_water_mark
+
+	with database_writer.QuestionWriter(connection, download_images=True) as writer, answer_fetcher.AnswerFetcher(session) as answers:
+
+		for pagenr in range(1, end_page + 1):
+
+			content = scraper_util.get_questionpage(scraper_util.construct_url(category, pagenr, questions_per_page), session).content
+
+			question_numbers = [int(question_number) for question_number in scraper_util.find_question_numbers_in_content(content)]
+
+			if not question_numbers:
+				break
+
+			stored_question_numbers = set(db_inter.get_stored_question_numbers(question_numbers, cursor))
+			new_question_numbers = [question_number for question_number in question_numbers if question_number not in stored_question_numbers]
+
+			# the page is only parsed when it has new questions
+			if new_question_numbers:
+				new_question_records = [question_record for question_record in scraper_util.parse_questionpage(content) if int(question_record['question_number']) in new_question_numbers]
+				answer_texts = answers.fetch_answers([question_record['question_number'] for question_record in new_question_records])
+
+				for question_record, answer_text in zip(new_question_records, answer_texts):
+					question_record['answer_text'] = answer_text
+					writer.add(question_record, category)
+
+			writer.flush_page(run_id, category, pagenr)
+
+			# every page up to here is completely stored now
+			new_high_water_mark = max(new_high_water_mark, max(question_numbers))
+
+			gap_question_numbers = [question_number for question_number in new_question_numbers if question_number <= high_water_mark]
+
+			if gap_question_numbers:
+				logger.info(f'Page {pagenr} has {len(gap_question_numbers)} questions below the high-water mark {high_water_mark} that were not stored yet, the next page is checked as well.')
+
+			elif min(question_numbers) <= high_water_mark:
+				logger.info(f'Page {pagenr} reached the high-water mark {high_water_mark} of category {category}.')
+				break
+
+	return new_high_water_mark
+
+
+def sync_categories(categories, category_dict, questions_per_page, session, run_id):
+	"""
+	Sync all categories that were scraped before (they have a high-water mark), see settings.INCREMENTAL
+	Return the categories that have no high-water mark, they were never scraped completely.
+	"""
+
+	connection = db_inter.make_connection(DATABASE_URL, DATABASE_PROFILE)
+	cursor = db_inter.create_cursor(connection)
+
+	categories_to_scrape = []
+
+	for category in categories:
+
+		high_water_mark = db_inter.get_high_water_mark(category, cursor)
+
+		if high_water_mark is None:
+			categories_to_scrape.append(category)
+			continue
+
+		pages = plan_category(category, category_dict, questions_per_page, run_id, cursor)
+
+		if pages is None:
+			continue
+
+		logger.info(f'\n Syncing questions for category: {category}, newer than question {high_water_mark} \n')
+
+		high_water_mark = sync_category(category, high_water_mark, scraper_util.compute_pages_for_category(category, category_dict, questions_per_page), questions_per_page, session, run_id, connection, cursor)
+		complete_category(run_id, category, connection, high_water_mark)
+
+	connection.close()
+
+	return categories_to_scrape
+
+
+def main():
+
+	# make sure the database has the latest schema (indexes, constraints, ...) before scraping
+	migration_connection = db_inter.make_connection(DATABASE_URL, DATABASE_PROFILE)
+	database_migration.migrate(migration_connection)
+
+	# tag, category & quiz ids are resolved from memory from here on
+	db_inter.warm_lookup_caches(migration_connection.cursor())
+
+	# images that failed or were cancelled in an earlier run
+	database_writer.retry_image_downloads(migration_connection)
+	migration_connection.close()
+
+	run_id = start_or_resume_run()
+
+	# served from the database, refreshed in the background over a logged in session when it is older than settings.CATEGORY_DICTIONARY_TTL
+	category_session = scraper_util.create_session()
+	scraper_util.login(category_session, username=CREDENTIALS.get('username', None), password=CREDENTIALS.get('password', None))
+	category_dict = scraper_util.get_category_dictionary(category_session, DATABASE_URL)
+
+	if CATEGORY == 'ALL':
+		categories = [category for category in category_dict.keys()]
+	else:
+		categories = [CATEGORY]
+
+	questions_per_page = determine_questions_per_page(run_id, categories, category_dict, category_session)
+
+	try:
+		if INCREMENTAL:
+			# one logged in session for all categories, a sync takes only a few requests per category
+			categories = sync_categories(categories, category_dict, questions_per_page, category_session, run_id)
+
+		if CONCURRENT_CATEGORIES > 1 and len(categories) > 1 and not ASYNC_ENGINE:
+
+			connection = db_inter.make_connection(DATABASE_URL, DATABASE_PROFILE)
+			cursor = db_inter.create_cursor(connection)
+
+			page_ranges = {}
+
+			for category in categories:
+				pages = plan_category(category, category_dict, questions_per_page, run_id, cursor)
+
+				if pages is not None:
+					page_ranges[category] = pages
+
+			logger.info(f'\n Scraping questions for {len(page_ranges)} categories, {CONCURRENT_CATEGORIES} at a time \n')
+			stopped_categories = category_scheduler.scrape_categories(page_ranges, run_id, connection, DATABASE_URL, CONCURRENT_CATEGORIES, questions_per_page=questions_per_page)
+
+			for category in page_ranges:
+				complete_category(run_id, category, connection, full_scrape=FULL_SCRAPE and category not in stopped_categories)
+
+			connection.close()
+
+		else:
+			# one pool of parser processes for all categories of the run
+			parser_pool = None if ASYNC_ENGINE else parsing_pipeline.create_parser_pool()
+
+			try:
+				for category in categories:
+
+					logger.info(f'\n Scraping questions for category: {category} \n')
+
+					connection = db_inter.make_connection(DATABASE_URL, DATABASE_PROFILE)
+					cursor = db_inter.create_cursor(connection)
+
+					pages = plan_category(category, category_dict, questions_per_page, run_id, cursor)
+
+					if pages is None:
+						connection.close()
+						continue
+
+					if ASYNC_ENGINE:
+						all_pages_processed = scrape_category_asynchronously(category, pages.start, pages.stop, questions_per_page, run_id, connection, cursor)
+					else:
+						all_pages_processed = scrape_category(category, pages.start, pages.stop, questions_per_page, run_id, connection, cursor, parser_pool)
+
+					complete_category(run_id, category, connection, full_scrape=FULL_SCRAPE and all_pages_processed)
+					connection.close()
+
+			finally:
+				if parser_pool:
+					parser_pool.shutdown(wait=True, cancel_futures=True)
 
-				scraper_util.sleep_randomly(SLEEP_TIME)
+	except BaseException:
+		# also when the run is interrupted (KeyboardInterrupt), so it can be resumed
+		set_run_status(run_id, 'failed')
+		raise
 
-			# for the following trick, check Markus Janderot's answer on StackOverflow
-			# https://stackoverflow.com/questions/653509/breaking-out-of-nested-loops
-			#
-			# basically, if the question_number is already in the database && settings.ONLY_NEW = True
-			# we want to stop all operations of the scraper
-			# if settings.ONLY_NEW = False, the loop continues digging for more questions
-			else:
-				continue # executed when inner-for-loop executes without breaking
+	set_run_status(run_id, 'finished')
 
-			break # if else-clause is not triggered, i.e. in case of breaking out of innerloop
 
-		connection.close()
\ No newline at end of file
+# the guard keeps the parser processes (see parsing_pipeline.py) from starting a scrape of their own
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,177 @@
+"""
+Fetching & parsing pipeline
+
+	PageFetcher (thread)  --(page_key, raw page bytes)-->  queue  -->  parse_pages (pool of processes)  -->  (page_key, question_records)  -->  one writer
+
+Fetching is bound by the rate limiter, parsing by the CPU.
+Decoupling them lets the fetcher keep requesting pages while earlier pages are being parsed,
+& lets a re-parse of pages that were stored before (no fetching at all) use all cores.
+"""
+
+import collections
+import concurrent.futures
+import logger_setup
+import os
+import queue
+import scraper_utilities as scraper_util
+import settings
+import threading
+
+logger = logger_setup.create_logger(__name__)
+
+# put on the page queue after the last page
+END_OF_PAGES = None
+
+
+class PageFetcher(threading.Thread):
+	"""
+	Thread that fetches the questionpages of a category & puts (pagenr, content) on its page_queue.
+
+	At most max_prefetch pages are waiting in the queue, the fetcher blocks until the consumer catches up.
+	When fetching a page fails, pages() raises the exception after the pages that were fetched before it.
+
+	Usage:
+		fetcher = PageFetcher(category, range(start_page, end_page), session)
+		fetcher.start()
+
+		try:
+			for pagenr, content in fetcher.pages():
+				...
+		finally:
+			fetcher.stop()
+	"""
+
+	def __init__(self, category, pagenrs, session, max_prefetch=settings.PAGE_PREFETCH, questions_per_page=settings.QUESTIONS_PER_PAGE):
+		super().__init__(daemon=True)
+
+		self.category = category
+		self.pagenrs = pagenrs
+		self.session = session
+		self.questions_per_page = questions_per_page
+
+		self.page_queue = queue.Queue(maxsize=max(1, max_prefetch))
+		self.stop_event = threading.Event()
+
+		# raised by pages(), so a failed fetch does not look like the last page
+		self.exception = None
+
+	def run(self):
+
+		try:
+			for pagenr in self.pagenrs:
+
+				if self.stop_event.is_set():
+					break
+
+				url = scraper_util.construct_url(self.category, pagenr, self.questions_per_page)
+				logger.info(f'Fetching results for page {pagenr}. \n')
+
+				questionpage = scraper_util.get_questionpage(url, self.session)
+
+				if not self.put((pagenr, questionpage.content)):
+					break
+
+		except Exception as e:
+			logger.error(f'An exception occured while fetching pages for category {self.category}, with exception message: \n {e}')
+			self.exception = e
+
+		finally:
+			self.put(END_OF_PAGES)
+
+	def put(self, item):
+		"""Put item on the page_queue, return False if the fetcher was stopped while waiting for room."""
+
+		while not self.stop_event.is_set():
+			try:
+				self.page_queue.put(item, timeout=0.1)
+				return True
+
+			except queue.Full:
+				continue
+
+		return False
+
+	def pages(self):
+		"""Yield (pagenr, content) for every fetched page, in order, raise the exception of the fetcher if fetching failed."""
+
+		while True:
+			item = self.page_queue.get()
+
+			if item is END_OF_PAGES:
+				if self.exception is not None:
+					raise self.exception
+
+				return
+
+			yield item
+
+	def stop(self):
+		"""Stop fetching, e.g. when settings.ONLY_NEW found a question that is already in the database."""
+
+		self.stop_event.set()
+
+	def is_stopped(self):
+		"""Return True if stop was called, before or after the last page was fetched."""
+
+		return self.stop_event.is_set()
+
+
+def create_parser_pool(max_workers=settings.PARSER_PROCESSES):
+	"""
+	Return a pool of max_workers parser processes for parse_pages, None if max_workers is 0 (parse in the current process).
+
+	Create one pool per run & hand it to every parse_pages, starting processes costs more than parsing a page.
+	The caller shuts it down at the end of the run.
+
+	Arguments:
+	max_workers -- number of parser processes, 0 parses in the current process, None uses all cores
+	"""
+
+	if max_workers == 0:
+		return None
+
+	if max_workers is None:
+		max_workers = os.cpu_count() or 1
+
+	return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+
+
+def parse_pages(pages, executor=None, max_pending_pages=None):
+	"""
+	Yield (page_key, question_records) for every (page_key, content) in pages, in the same order.
+
+	Arguments:
+	pages -- iterable of (page_key, raw page bytes), e.g. PageFetcher.pages()
+	executor -- a pool of parser processes (see create_parser_pool), None parses in the current process
+	max_pending_pages -- maximum number of pages submitted to the pool but not yet yielded, 2 * the number of cores by default
+
+	The question_records are the plain dictionaries of scraper_utilities.parse_questionpage.
+	"""
+
+	if executor is None:
+		for page_key, content in pages:
+			yield page_key, scraper_util.parse_questionpage(content)
+
+		return
+
+	if max_pending_pages is None:
+		max_pending_pages = 2 * (os.cpu_count() or 1)
+
+	pending = collections.deque()
+
+	try:
+		for page_key, content in pages:
+			pending.append((page_key, executor.submit(scraper_util.parse_questionpage, content)))
+
+			if len(pending) >= max_pending_pages:
+				page_key, future = pending.popleft()
+				yield page_key, future.result()
+
+		while pending:
+			page_key, future = pending.popleft()
+			yield page_key, future.result()
+
+	finally:
+		# when the consumer stops early, pages that were not parsed yet are dropped, the pool is left to the next parse_pages
+		for page_key, future in pending:
+			future.cancel()
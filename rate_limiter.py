@@ -0,0 +1,128 @@
+import asyncio
+import logger_setup
+import random
+import settings
+import threading
+import time
+import urllib.parse
+
+logger = logger_setup.create_logger(__name__)
+
+
+class TokenBucket:
+	"""
+	Token bucket which allows on average requests_per_second requests, with bursts of at most burst_size requests.
+
+	Every request takes a token, tokens are refilled at requests_per_second.
+	When the bucket is empty, the request waits until its token is refilled,
+	plus a random jitter of at most jitter * (1/requests_per_second) seconds to make the interaction seem more human.
+
+	A bucket is thread-safe and does not hold any event loop bound state,
+	so it can be shared by threads, coroutines & consecutive asyncio.run calls.
+	"""
+
+	def __init__(self, requests_per_second, burst_size=1, jitter=0.0):
+		self.requests_per_second = requests_per_second
+		self.burst_size = burst_size
+		self.jitter = jitter
+
+		self.tokens = burst_size
+		self.last_refill = time.monotonic()
+		self.lock = threading.Lock()
+
+	def reserve(self):
+		"""Take a token & return the number of seconds to wait before the request may be sent."""
+
+		with self.lock:
+			now = time.monotonic()
+
+			self.tokens = min(self.burst_size, self.tokens + (now - self.last_refill) * self.requests_per_second)
+			self.last_refill = now
+
+			# the token is taken right away, even when it is not there yet
+			# so concurrent callers queue up behind each other instead of all waiting for the same token
+			self.tokens -= 1
+
+			if self.tokens >= 0:
+				return 0
+
+			delay = -self.tokens / self.requests_per_second
+
+		delay += random.uniform(0, self.jitter / self.requests_per_second)
+
+		return delay
+
+	def acquire(self):
+		"""Block until a request may be sent, return the number of seconds slept."""
+
+		delay = self.reserve()
+
+		if delay > 0:
+			time.sleep(delay)
+
+		return delay
+
+	async def acquire_async(self):
+		"""Sleep (without blocking the event loop) until a request may be sent, return the number of seconds slept."""
+
+		delay = self.reserve()
+
+		if delay > 0:
+			await asyncio.sleep(delay)
+
+		return delay
+
+
+class RateLimiter:
+	"""
+	Rate limiter which keeps one TokenBucket per host.
+
+	Every request to a host has to pass through wait (or wait_async), with the url it is about to request.
+	Time is only spent right before a request is actually sent.
+	"""
+
+	def __init__(self, requests_per_second, burst_size=1, jitter=0.0):
+		self.requests_per_second = requests_per_second
+		self.burst_size = burst_size
+		self.jitter = jitter
+
+		self.buckets = {}
+		self.lock = threading.Lock()
+
+	def bucket_for(self, url):
+		"""Return the TokenBucket for the host of url."""
+
+		host = urllib.parse.urlsplit(url).netloc
+
+		with self.lock:
+			bucket = self.buckets.get(host)
+
+			if bucket is None:
+				bucket = TokenBucket(self.requests_per_second, self.burst_size, self.jitter)
+				self.buckets[host] = bucket
+
+		return bucket
+
+	def wait(self, url):
+		"""Block until a request to url may be sent."""
+
+		delay = self.bucket_for(url).acquire()
+
+		if delay > 0:
+			logger.debug(f'Waited {delay:.2f} seconds before requesting {url}')
+
+		return delay
+
+	async def wait_async(self, url):
+		"""Sleep (without blocking the event loop) until a request to url may be sent."""
+
+		delay = await self.bucket_for(url).acquire_async()
+
+		if delay > 0:
+			logger.debug(f'Waited {delay:.2f} seconds before requesting {url}')
+
+		return delay
+
+
+# the rate limiter all requests go through, so the budget holds for the whole run
+limiter = RateLimiter(settings.REQUESTS_PER_SECOND, settings.BURST_SIZE, settings.RATE_JITTER)
@@ -0,0 +1,116 @@
+"""
+Rebuild a database from the raw html archive (see html_archive.py), without a single request to the server.
+
+Usage:
+	python reparse.py
+
+All archived questionpages are parsed by a pool of processes (settings.PARSER_PROCESSES),
+answers are parsed from the archived answers, images are expected to be downloaded already (./{category}/).
+settings.REPARSE_DATABASE_URL is rebuilt from scratch every time, so a reparse after the next parser fix corrects every question.
+"""
+
+import database_initialization
+import database_interaction as db_inter
+import database_migration
+import database_writer
+import html_archive
+import logger_setup
+import os
+import parsing_pipeline
+import scraper_utilities as scraper_util
+import settings
+import time
+
+logger = logger_setup.create_logger(__name__)
+
+REPARSE_DATABASE_URL = settings.REPARSE_DATABASE_URL
+
+
+def remove_database(database_url):
+	"""Remove the database at database_url, with its write-ahead log."""
+
+	for path in (database_url, f'{database_url}-wal', f'{database_url}-shm'):
+		if os.path.exists(path):
+			os.remove(path)
+
+
+def reparse(database_url):
+	"""
+	Rebuild database_url from every question in the archive, return the number of questions written.
+
+	The database is built next to database_url ({database_url}.part) & only replaces it when it is complete,
+	an interrupted reparse leaves the previous one as it was.
+	"""
+
+	if os.path.abspath(database_url) == os.path.abspath(settings.DATABASE_URL):
+		raise ValueError(f'reparse rebuilds {database_url} from scratch, it can not be the database the scraper writes to (settings.DATABASE_URL).')
+
+	build_url = f'{database_url}.part'
+
+	# left over from an interrupted reparse
+	remove_database(build_url)
+	database_initialization.create_database(build_url)
+
+	connection = db_inter.make_connection(build_url, 'bulk-load')
+	database_migration.migrate(connection)
+
+	cursor = db_inter.create_cursor(connection)
+	db_inter.warm_lookup_caches(cursor)
+
+	parser_pool = parsing_pipeline.create_parser_pool()
+
+	try:
+		with database_writer.QuestionWriter(connection) as writer, html_archive.AnswerReader() as answer_reader:
+
+			for (category, pagenr), question_records in parsing_pipeline.parse_pages(html_archive.iterate_pages(), parser_pool):
+
+				question_numbers = [question_record['question_number'] for question_record in question_records]
+				stored_question_numbers = set(db_inter.get_stored_question_numbers(question_numbers, cursor))
+
+				for question_record in question_records:
+
+					question_number = question_record['question_number']
+
+					if question_number in stored_question_numbers:
+						continue
+
+					answer_content = answer_reader.get(question_number)
+
+					if answer_content is None:
+						logger.warning(f'No archived answer for question_number {question_number}.')
+						question_record['answer_text'] = ''
+					else:
+						question_record['answer_text'] = scraper_util.parse_answer(answer_content, question_number)
+
+					image_url = question_record['image_url']
+
+					if image_url:
+						question_record['img_filename'] = scraper_util.construct_image_filename(image_url)
+
+					writer.add(question_record, category)
+
+	finally:
+		if parser_pool:
+			parser_pool.shutdown(wait=True, cancel_futures=True)
+
+	# read after the with-block, which writes the last batch
+	questions_written = writer.questions_written
+
+	connection.close()
+
+	# the write-ahead log of the previous database would be applied to the new one
+	for path in (f'{database_url}-wal', f'{database_url}-shm'):
+		if os.path.exists(path):
+			os.remove(path)
+
+	os.replace(build_url, database_url)
+
+	return questions_written
+
+
+if __name__ == '__main__':
+
+	start = time.monotonic()
+	questions_written = reparse(REPARSE_DATABASE_URL)
+
+	logger.info(f'Reparsed {questions_written} questions into {REPARSE_DATABASE_URL} in {time.monotonic() - start:.1f} seconds.')
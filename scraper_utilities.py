@@ -1,25 +1,124 @@
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
+import database_interaction as db_inter
+import html
+import html_archive
+import http_cache
 import logger_setup
 import math
 import os
-import random
+import rate_limiter
 import re
 import requests
 import settings
 import shutil
 import sqlite3
-import time
+import threading
 
 logger = logger_setup.create_logger(__name__)
 
-def create_session():
-	"""Return a requests' session object."""
+def create_session(pool_size=None):
+	"""
+	Return a requests' session object.
+
+	pool_size -- number of keep-alive connections per host, when the session is shared by that many threads (see category_scheduler.py)
+	"""
 
 	with requests.Session() as session:
 
+		if pool_size:
+			adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+			session.mount('https://', adapter)
+			session.mount('http://', adapter)
+
 		logger.debug('Session established')
 		return session
 
+def fetch(url, session, method='get', **kwargs):
+	"""
+	Return the response for url.
+
+	Every HTTP request of the scraper goes through here, so it is sent within the politeness budget of rate_limiter.limiter.
+	GET requests for pages & answers are served from the http_cache while they are fresh (no request at all)
+	and revalidated with the server afterwards (a 304 answer has no body), per login of session (see login).
+	Pages & answers are appended to the html_archive (see reparse.py), also the ones served from the cache, if the archive does not have them yet.
+
+	Arguments:
+	url -- the url to request
+	session -- a requests' session object (or the requests module itself, for requests without a session)
+	method -- HTTP method, e.g. 'get' or 'post'
+	kwargs -- passed on to session.request, e.g. data=... or stream=True
+	"""
+
+	cache_entry = None
+	use_cache = method == 'get' and not kwargs.get('stream') and http_cache.is_enabled(url)
+	cache_login = http_cache.get_login(session)
+
+	if use_cache:
+		cache_entry = http_cache.lookup(url, cache_login)
+
+		if cache_entry and http_cache.is_fresh(cache_entry):
+			logger.debug(f'{url} was served from the cache.')
+			return make_cached_response(cache_entry)
+
+		if cache_entry:
+			kwargs['headers'] = {**kwargs.get('headers', {}), **http_cache.conditional_headers(cache_entry)}
+
+	rate_limiter.limiter.wait(url)
+
+	response = session.request(method, url, **kwargs)
+	logger.debug(f'{method.upper()} {url} returned HTTP status code: {response.status_code}')
+
+	if use_cache:
+		if response.status_code == 304 and cache_entry:
+			http_cache.refresh(url, cache_login)
+			return make_cached_response(cache_entry)
+
+		if response.status_code == 200 and is_cacheable(url, response.content):
+			http_cache.store(url, response.headers, response.content, cache_login)
+
+	if response.status_code == 200 and not kwargs.get('stream') and html_archive.is_enabled(url):
+		html_archive.archive(url, response.content)
+
+	return response
+
+def is_cacheable(url, content):
+	"""
+	Return False for the content of an answer without answer_text, or a questionpage without questions (e.g. an error page).
+
+	Those are not cached: answers are never requested again once they are cached (see settings.HTTP_CACHE_TTL).
+	"""
+
+	url_class = http_cache.get_url_class(url)
+
+	if url_class == 'answer':
+		answer_match = ANSWER_PATTERN.search(content)
+		return bool(answer_match and TAG_PATTERN.sub('', answer_match.group(1).decode('utf-8', errors='replace')).strip())
+
+	if url_class == 'category_page':
+		return bool(QUESTION_NUMBER_PATTERN.search(content))
+
+	return True
+
+def archive_cached_response(cache_entry):
+	"""Append the content of a http_cache.CacheEntry to the html_archive, if it was not archived before (e.g. the archive was switched on later)."""
+
+	if html_archive.is_enabled(cache_entry.url):
+		html_archive.archive_if_missing(cache_entry.url, cache_entry.content)
+
+def make_cached_response(cache_entry):
+	"""Return a requests' response object for a http_cache.CacheEntry, which is archived if the html_archive does not have it yet."""
+
+	archive_cached_response(cache_entry)
+
+	response = requests.Response()
+	response.status_code = 200
+	response.url = cache_entry.url
+	response._content = cache_entry.content
+	response.from_cache = True
+
+	return response
+
 def login(session, username, password):
 	"""
 	Return HTTP status code -> 200 if logged in correctly.
@@ -36,24 +135,29 @@ def login(session, username, password):
 		'pass': password
 	}
 
-	login_response = session.post('https://www.quizarchief.be/login.php', data=credentials)
+	login_response = fetch('https://www.quizarchief.be/login.php', session, method='post', data=credentials)
 
 	login_status = login_response.status_code
 	logger.debug(f'Your attempt to log in, resulted in HTTP status code: {login_status}')
 
+	# a logged in session sees other pages, so it gets cached responses of its own
+	http_cache.set_login(session, username if login_status == 200 else '')
+
 	return login_status
 
 
-def create_category_dictionary():
+def create_category_dictionary(session=requests):
 	"""
 	Return a dicionary consisting of:
 	    keys: category_identifier
 	    values: number of pages for category_identifier
+
+	session -- a logged in requests' session, categories that are only visible when logged in (e.g. foto) are only listed then
 	"""
 	url = 'https://www.quizarchief.be/categorie/'
 
-	page = requests.get(url)
-	soup = BeautifulSoup(page.content, 'html5lib', from_encoding='UTF-8')
+	page = fetch(url, session)
+	soup = create_soup(page.content, from_encoding='UTF-8')
 
 	category_dict = {}
 
@@ -87,6 +191,48 @@ def create_category_dictionary():
 	return category_dict
 
 
+def refresh_category_dictionary(session, database_url):
+	"""Fetch the category dictionary & store it in database_url, return it."""
+
+	category_dict = create_category_dictionary(session)
+
+	connection = db_inter.make_connection(database_url)
+	db_inter.set_category_counts(category_dict, connection.cursor())
+	connection.commit()
+	connection.close()
+
+	logger.debug(f'Category dictionary with {len(category_dict)} categories stored in the database.')
+	return category_dict
+
+
+def get_category_dictionary(session, database_url=settings.DATABASE_URL, ttl=settings.CATEGORY_DICTIONARY_TTL):
+	"""
+	Return the category dictionary (see create_category_dictionary), from the database if it was cached there.
+
+	Within ttl seconds, the cached dictionary is used as is.
+	After that, it is still used, while a background thread refreshes it, so nothing waits for the category overview.
+	Only the very first time (nothing cached), the overview is fetched right away.
+
+	Arguments:
+	session -- a logged in requests' session, the background refresh uses it too
+	database_url -- a migrated database (see database_migration.py)
+	"""
+
+	connection = db_inter.make_connection(database_url)
+	category_dict, age = db_inter.get_category_counts(connection.cursor())
+	connection.close()
+
+	if not category_dict:
+		logger.debug('No cached category dictionary, fetching it.')
+		return refresh_category_dictionary(session, database_url)
+
+	if age >= ttl:
+		logger.debug(f'Cached category dictionary is {age:.0f} seconds old, refreshing it in the background.')
+		threading.Thread(target=refresh_category_dictionary, args=(session, database_url), daemon=True).start()
+
+	return category_dict
+
+
 def is_valid_category(category, category_dict):
 	""""Check whether provided category is indeed one of the possible categories."""
 	is_valid = False
@@ -108,10 +254,12 @@ def compute_pages_for_category(category, category_dict, questions_per_page=20):
 	'literatuur' has 6806 registered questions 
 	if there are 20 questions per page -> 341  pages
 	== ceiling(6806/20)
+
+	questions_per_page is the page size that is asked for, the pages are counted with the number of questions they actually show (see get_questions_on_page).
 	"""
 	
 	number_of_questions_for_category = category_dict.get(category, 0)
-	total_pages_for_category = math.ceil((number_of_questions_for_category/questions_per_page))
+	total_pages_for_category = math.ceil((number_of_questions_for_category/get_questions_on_page(questions_per_page)))
 	logger.debug(f'For category {category}, there can be {total_pages_for_category} retrieved.')
 
 	return total_pages_for_category
@@ -121,13 +269,16 @@ def validate_end_page(end_page, pages_for_category):
 	"""
 	Ensure that provided end_page does not exceed the possible range of pages that can be retrieved.
 	If the provided number of pages to be scraped is larger than possible, set it equal to the maximum amount.
+
+	end_page is excluded, so 'ALL' becomes the page after the last one.
+	pages_for_category has to be computed with the questions_per_page that is actually used (see detect_questions_per_page).
 	"""
 
 	if end_page == 'ALL':
-		validated_end_page = pages_for_category
+		validated_end_page = pages_for_category + 1
 
 	else:
-		validated_end_page = min(end_page, pages_for_category)
+		validated_end_page = min(end_page, pages_for_category + 1)
 
 	return validated_end_page
 
@@ -141,6 +292,55 @@ def validate_start_page(start_page, end_page):
 	return start_page
 
 
+# requested questions_per_page -> the number of questions a page of that size actually shows (see get_questions_on_page)
+effective_questions_per_page = {}
+
+# the page sizes the site offers (see construct_url), the largest one is used when a requested page size shows no questions at all
+SUPPORTED_QUESTIONS_PER_PAGE = (1, 3, 5, 10, 15, 20)
+
+def detect_questions_per_page(category, category_dict, session, questions_per_page=settings.QUESTIONS_PER_PAGE):
+	"""
+	Return the number of questions per page to ask for: questions_per_page, 
+	or the largest supported page size if a page of questions_per_page shows no questions at all (a page size the site does not offer, see construct_url).
+
+	The server decides how many questions a page shows (e.g. logged in users see other page sizes).
+	The first page of category is fetched: if it shows less questions than were asked for, while the category has more,
+	that is the number of questions on every page. Use a category with plenty of questions.
+	That number is only used to count the pages (see get_questions_on_page), the urls keep asking for the returned page size.
+
+	The page size does not depend on the category, so it is detected once per questions_per_page.
+	"""
+
+	if questions_per_page in effective_questions_per_page:
+		return questions_per_page
+
+	content = get_questionpage(construct_url(category, 1, questions_per_page), session).content
+	questions_on_page = len(find_question_numbers_in_content(content))
+
+	expected_questions_on_page = min(questions_per_page, category_dict.get(category, 0))
+
+	if questions_on_page == 0 and expected_questions_on_page > 0 and questions_per_page != max(SUPPORTED_QUESTIONS_PER_PAGE):
+		logger.warning(f'Asked for {questions_per_page} questions per page, the server shows none, {max(SUPPORTED_QUESTIONS_PER_PAGE)} questions per page are asked for instead.')
+		return detect_questions_per_page(category, category_dict, session, max(SUPPORTED_QUESTIONS_PER_PAGE))
+
+	if 0 < questions_on_page < expected_questions_on_page:
+		logger.info(f'Asked for {questions_per_page} questions per page, the server shows {questions_on_page}, pages are counted with {questions_on_page} questions from now on.')
+		set_questions_on_page(questions_per_page, questions_on_page)
+	else:
+		set_questions_on_page(questions_per_page, questions_per_page)
+
+	return questions_per_page
+
+def set_questions_on_page(questions_per_page, questions_on_page):
+	"""Record that a page shows questions_on_page questions when questions_per_page are asked for, e.g. for a resumed run."""
+
+	effective_questions_per_page[questions_per_page] = questions_on_page
+
+def get_questions_on_page(questions_per_page):
+	"""Return the number of questions a page shows when questions_per_page are asked for, questions_per_page if that was not detected."""
+
+	return effective_questions_per_page.get(questions_per_page, questions_per_page)
+
 def construct_url(categorie, page_nr, questions_per_page=20):
 	"""
 	Return constructed url.
@@ -201,7 +401,8 @@ def construct_url(categorie, page_nr, questions_per_page=20):
 	    15: 15 vragen
 	    20: 20 vragen
 
-	    (note that choosing a value that is not in this predefined list, will NOT work)
+	    (note that choosing a value that is not in this predefined list, will NOT work, see SUPPORTED_QUESTIONS_PER_PAGE
+	    the server might still show less questions than asked for, see detect_questions_per_page)
 
 	so -- sorting order
 	    1: van nieuw naar oud
@@ -234,22 +435,86 @@ def get_questionpage(url, session):
 	"""
 	Return questionpage.
 
+	Raise requests.HTTPError if the server did not return the page (e.g. 429, 500 or 503),
+	so it is not taken for a page without questions & the scrape of the category stops before it (see parsing_pipeline.PageFetcher).
+
 	Arguments:
 	url -- a constructed quizarchief url
 	session -- a request's session object
 	"""
 
-	questionpage = session.get(url)
+	questionpage = fetch(url, session)
 	questionpage.encoding = 'utf-8'
 
 	logger.debug(f'Questionpage was fetched with status code: {questionpage.status_code}')
+
+	if questionpage.status_code != 200:
+		questionpage.raise_for_status()
 	
 	return questionpage
 
-def make_soup(questionpage):
+def get_parser(parser=None):
+	"""
+	Return the name of the tree builder BeautifulSoup should use, settings.PARSER by default.
+
+	Falls back to html5lib (with a warning) if the requested parser is not installed.
+	"""
+
+	parser = parser or settings.PARSER
+
+	if parser != 'html5lib' and builder_registry.lookup(parser) is None:
+		logger.warning(f'Parser {parser} is not installed (pip install {parser}), falling back to html5lib.')
+		parser = 'html5lib'
+
+	return parser
+
+def create_soup(content, parser=None, from_encoding=None, parse_only=None):
+	"""
+	Return a BeautifulSoup object for content, built with the parser backend in settings.PARSER.
+
+	Arguments:
+	content -- raw html (bytes or str)
+	parser -- overrides settings.PARSER, 'html5lib' or 'lxml'
+	from_encoding -- encoding of content, if it is bytes
+	parse_only -- a SoupStrainer, only the matching elements (& their subtrees) are built
+	              html5lib does not support this, so it is only applied with other parsers
+	"""
+
+	parser = get_parser(parser)
+
+	if parser == 'html5lib':
+		parse_only = None
+
+	soup = BeautifulSoup(content, parser, from_encoding=from_encoding, parse_only=parse_only)
+	return soup
+
+# only the questionrows, <div id="vragenrij_{question_number}">, see find_all_questionrows
+QUESTIONROW_STRAINER = SoupStrainer('div', {'id': re.compile(r'vragenrij_\d+')})
+
+def make_soup(questionpage, only_questionrows=None):
 	"""Return constructed BeautifulSoup object, from provided questionpage"""
 
-	soup = BeautifulSoup(questionpage.content, 'html5lib')
+	soup = make_soup_from_content(questionpage.content, only_questionrows)
+	return soup
+
+def make_soup_from_content(content, only_questionrows=None):
+	"""
+	Return constructed BeautifulSoup object, from the raw bytes of a questionpage.
+
+	This allows pages that were not fetched with a requests' session (e.g. by the asyncio engine)
+	to be parsed exactly like the ones that were.
+
+	Arguments:
+	only_questionrows -- only build the questionrows (navigation, sidebars, scripts, ... are skipped while parsing)
+	                     settings.PARSE_ONLY_QUESTIONROWS by default, ignored by html5lib
+	"""
+
+	if only_questionrows is None:
+		only_questionrows = settings.PARSE_ONLY_QUESTIONROWS
+
+	parse_only = QUESTIONROW_STRAINER if only_questionrows else None
+
+	soup = create_soup(content, parse_only=parse_only)
 
 	#delete all <br/> elements, otherwise this will confuse question parser
 	for br in soup.find_all('br'):
@@ -279,6 +544,19 @@ def find_all_questionrows(soup):
 	logger.debug(f'There are {len(questionrows)} questionrows found on the given page.')
 	return questionrows
 
+def find_question_numbers_in_content(content):
+	"""
+	Return the question_numbers of all questionrows in the raw content of a questionpage, without parsing it.
+
+	A cheap pre-check: when all of them are already in the database, the page does not have to be parsed at all.
+	"""
+
+	question_numbers = [question_number.decode() for question_number in QUESTION_NUMBER_PATTERN.findall(content)]
+	return question_numbers
+
+# <div id="vragenrij_82096">, in the raw bytes of a questionpage
+QUESTION_NUMBER_PATTERN = re.compile(rb'''id=["']?vragenrij_(\d+)''')
+
 def find_question_number(questionrow):
 	"""
 	Extract question_number for a given questionrow.
@@ -396,6 +674,23 @@ def find_image(questionrow, question_number, categorie, session):
 
 	"""
 
+	image_url = find_image_url(questionrow, question_number)
+
+	if not image_url:
+		return None
+
+	image_filename = download_image(image_url, categorie, session)
+	return image_filename
+
+
+def find_image_url(questionrow, question_number):
+	"""
+	Return the absolute image_url of the image accompanying the questionrow.
+	Return None if there is no image (or if the embedded visual is a youtube fragment).
+
+	Nothing is downloaded here, see download_image.
+	"""
+
 	class ImageNotFound(Exception):
 		"""Exception which handles the lack of an image in a questionrow."""
 
@@ -442,10 +737,16 @@ def find_image(questionrow, question_number, categorie, session):
 	image_url = os.path.join(base_url, image_relative_url)
 	logger.debug(f'image_url constructed: {image_url}')
 
-	#set up connection to the image source
-	image = session.get(image_url, stream=True)
+	return image_url
+
+
+def construct_image_filename(image_url):
+	"""
+	Return the image_filename under which the image at image_url is stored.
 
-	#construct filename
+	e.g. https://www.quizarchief.be/prodgfx/vragen/q/972d66f98fa6ccb0573b07d549ac3b76_131365.jpg
+	-> 131365.jpg
+	"""
 
 	#first get basename e.g. 972d66f98fa6ccb0573b07d549ac3b76_131365.jpg
 	dirty_filename = os.path.basename(image_url)
@@ -459,6 +760,19 @@ def find_image(questionrow, question_number, categorie, session):
 	image_filename = question_number + extension
 	logger.debug(f'image_filename composed: {image_filename}')
 
+	return image_filename
+
+
+def download_image(image_url, categorie, session):
+	"""
+	Return image_filename, after downloading the image at image_url to a folder relatively located at ./{categorie}/
+	"""
+
+	#set up connection to the image source
+	image = fetch(image_url, session, stream=True)
+
+	image_filename = construct_image_filename(image_url)
+
 	#make a folder to which the image will be downloaded
 	directory = f'./{categorie}/'
 	filepath = ''.join((directory, image_filename))
@@ -533,6 +847,13 @@ def get_youtube_watch_url(youtube_id):
 	return youtube_watch_url
 
 
+def construct_answer_url(question_number):
+	"""Return the url of the xhr-request quizarchief performs to reveal the answer for question_number."""
+
+	answer_url = f'https://www.quizarchief.be/beantwoordevragen.php?vraagid={question_number}&page=categorie'
+	return answer_url
+
+
 def find_answer(question_number, session):
 	"""
 	Return answer_text.
@@ -545,13 +866,44 @@ def find_answer(question_number, session):
 	answer_text = ''
 
 	try:
-		answer_url = f'https://www.quizarchief.be/beantwoordevragen.php?vraagid={question_number}&page=categorie'
-		answer_page = session.get(answer_url)
+		answer_url = construct_answer_url(question_number)
+		answer_page = fetch(answer_url, session)
 		answer_page.encoding = 'utf-8'
 
-		soup = BeautifulSoup(answer_page.content, 'html5lib', from_encoding='UTF-8')
+		answer_text = parse_answer(answer_page.content, question_number)
+
+	except Exception as e:
+		logger.error(f'An exception occured while fetching answer for question with id: {question_number}, with exception message: \n {e}')
+		
+	finally:
+		return answer_text
+
+
+# the answer is the text of the first <b>-element of the xhr-response, e.g. <b>Antwerpen</b>
+ANSWER_PATTERN = re.compile(rb'<b(?:\s[^>]*)?>(.*?)</b\s*>', re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r'<[^>]*>')
+
+def parse_answer(answer_content, question_number):
+	"""
+	Return answer_text from the raw content of an answer xhr-response.
+	Return '' (empty string) if no answer_text could be extracted
+
+	The answer is cut out of the raw content with a regular expression,
+	the response is only parsed into a soup when that does not work.
+	"""
+
+	answer_text = ''
 
-		answer_text = soup.find('b').text.strip()
+	try:
+		answer_match = ANSWER_PATTERN.search(answer_content)
+
+		if answer_match:
+			# like a parser would: no tags, no entities, no \r\n line endings
+			answer_fragment = answer_match.group(1).decode('utf-8', errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+			answer_text = html.unescape(TAG_PATTERN.sub('', answer_fragment)).strip()
+		else:
+			soup = create_soup(answer_content, from_encoding='UTF-8')
+			answer_text = soup.find('b').text.strip()
 
 		logger.info(f'Answer found for question_number {question_number}: \n {answer_text}')
 
@@ -659,100 +1011,171 @@ def find_quiz_info(questionrow, question_number):
 
 		return quiz_info_dictionary
 
-def sleep_randomly(max_sleeptime, min_sleeptime=1):
+def parse_questionpage(content, only_questionrows=None):
 	"""
-	Return a random pause in seconds of maximum max_sleeptime.
+	Return a question_record for every questionrow in the raw content of a questionpage.
 
-	Arguments:
-	max_sleeptime -- the maximum #seconds you want to wait before fetching a new question
+	A question_record is a plain dictionary (picklable, so it can be returned from another process):
+	{
+		'question_number': '<question_number>',
+		'question_text': '<question_text>',
+		'quiz_info_dictionary': {<see find_quiz_info>},
+		'image_url': '<absolute image url>' or None,
+		'youtube_id': '<youtube_id>' or '',
+		'tag_names': ['<tag_name>', ...]
+	}
 
-	To prevent overloading of the server, this method provides a way to pause the execution for a given number of seconds.
-	To make the interaction seem more human, we add some randomness.
+	Nothing is fetched here, the answer_text & image still have to be fetched with the question_number & image_url.
 	"""
 
-	#The method sleep() suspends execution for the given number of seconds.
-	sleeptime = random.randint(min_sleeptime, max_sleeptime)
-	logger.info(f'I will be sleeping for {sleeptime} seconds. :) \n')
-	
-	time.sleep(sleeptime)
+	soup = make_soup_from_content(content, only_questionrows)
+	questionrows = find_all_questionrows(soup)
+
+	question_records = []
+
+	for questionrow in questionrows:
+
+		question_number = find_question_number(questionrow)
+
+		question_record = {
+			'question_number': question_number,
+			'question_text': find_question(questionrow, question_number),
+			'quiz_info_dictionary': find_quiz_info(questionrow, question_number),
+			'image_url': find_image_url(questionrow, question_number),
+			'youtube_id': find_youtube_fragment(questionrow, question_number, None),
+			'tag_names': find_tags(questionrow, question_number)
+		}
 
-	return sleeptime
+		question_records.append(question_record)
 
-def find_page_for_question(requested_question_number, category, questions_per_page=20):
+	return question_records
+
+def find_page_for_question(requested_question_number, category, questions_per_page=settings.LOOKUP_QUESTIONS_PER_PAGE, session=None, category_dictionary=None, database_url=settings.DATABASE_URL):
 	"""
 	Return page_url & position on page for a given requested_question_number as a list: [page_url, question_position]
+	Return None if the question is not in the category (anymore).
 
 	Quizarchief.be does not apply a REST-interface,
 	hence if we want to look up a specific question, we need to travel through all questions.
 
-	To avoid to do this linearly, we apply a binary search algorithm.
+	To avoid to do this linearly, we apply an interpolation search:
+	question_numbers grow over time & pages are sorted newest first, so question_numbers descend over the pages at a fairly steady pace.
+	The next page to look at is estimated from the question_numbers right outside the remaining range of pages,
+	which takes far less page requests than halving the range every time.
+	When an estimate did not halve the range, the next page is the middle one, so it never gets much worse than a binary search.
+
+	The lowest & highest question_number of every page that is looked at, is kept in the page_boundary table,
+	so the next lookup starts from there. New questions only push questions to later pages, 
+	so a question that is older than all questions on an indexed page, is still on a later page.
 
 	!the amount of questions displayed is different for logged in users.
 	So make sure you log in when viewing the returned url in a browser.
+
+	Arguments:
+	session -- a logged in requests' session, a session is created & logged in if None
+	category_dictionary -- see create_category_dictionary, the cached one (see get_category_dictionary) if None
+	database_url -- database with the page_boundary index, migrated at the start of the scraper (see main_scraper.main & database_migration.py)
+	questions_per_page -- the page size to search with, settings.LOOKUP_QUESTIONS_PER_PAGE by default, the returned page_url uses it too
 	"""
 
 	requested_question_number = int(requested_question_number)
 
-	session = create_session()
-	login(session, username=settings.CREDENTIALS.get('username', None), password=settings.CREDENTIALS.get('password', None))
+	if session is None:
+		session = create_session()
+		login(session, username=settings.CREDENTIALS.get('username', None), password=settings.CREDENTIALS.get('password', None))
+
+	connection = db_inter.make_connection(database_url)
+	cursor = db_inter.create_cursor(connection)
+
+	if category_dictionary is None:
+		category_dictionary = get_category_dictionary(session, database_url)
+
+	# small pages: every page that is looked at costs less, the search needs only a few more of them
+	# the url asks for questions_per_page, the pages are counted with the number of questions they actually show
+	questions_per_page = detect_questions_per_page(category, category_dictionary, session, questions_per_page)
 
-	category_dictionary = create_category_dictionary()
 	pages_for_category = compute_pages_for_category(category, category_dictionary, questions_per_page)
 
-	start_page = 0
-	end_page = pages_for_category
+	# the question is on a page within [first_page, last_page]
+	first_page = 1
+	last_page = pages_for_category
 
-	page_url = ''
-	question_position = 0
+	# (pagenr, question_number) right before & after the range, to interpolate between
+	newer_anchor = None
+	older_anchor = None
 
-	found = False
+	page_boundaries = db_inter.get_page_boundaries(category, questions_per_page, cursor)
 
-	while(not found):
+	for pagenr, min_question_number, max_question_number in page_boundaries:
+		if min_question_number > requested_question_number and pagenr >= first_page:
+			first_page = pagenr + 1
+			newer_anchor = (pagenr, min_question_number)
 
-		page_range = [start_page, end_page]
-		logger.info(f'page_range {page_range}')
+	for pagenr, min_question_number, max_question_number in page_boundaries:
+		# the question might have been pushed past this page since, so it only serves as an estimate
+		if max_question_number < requested_question_number and pagenr >= first_page:
+			older_anchor = (pagenr, max_question_number)
+			break
 
-		requested_pagenr = math.ceil((page_range[1] - page_range[0])/2) + page_range[0]
-		logger.info(f'requested_pagenr: {requested_pagenr} as ceiling of ((({page_range[1]} - {page_range[0]})/2) + {page_range[0]})')
+	logger.info(f'Searching question {requested_question_number} in pages [{first_page}, {last_page}] of category {category}, {len(page_boundaries)} pages were indexed before.')
 
-		page_url = construct_url(category, requested_pagenr, questions_per_page)
-		logger.info(f'constructed page_url: {page_url}')
-		page = session.get(page_url)
-		soup = BeautifulSoup(page.content, 'html5lib', from_encoding='UTF-8')
-		questionrows = find_all_questionrows(soup)
+	question_location = None
+	bisect = False
 
-		questionrows_length = len(questionrows)
-		logger.info(f'Length questionrows: {questionrows_length}')
+	while first_page <= last_page:
 
-		for question_position, questionrow in enumerate(questionrows):
-			question_number_in_row = find_question_number(questionrow)
-			logger.info(f'question_number in questionrow: {question_number_in_row}')
-			int_question_number_in_row = int(question_number_in_row)
-			logger.info(f'int(question_number): {int_question_number_in_row}')
+		if newer_anchor and older_anchor and older_anchor[0] > newer_anchor[0] and not bisect:
+			# position of the question between the last question of newer_anchor & the first question of older_anchor
+			fraction = (newer_anchor[1] - requested_question_number) / (newer_anchor[1] - older_anchor[1])
+			requested_pagenr = newer_anchor[0] + 1 + math.floor(fraction * (older_anchor[0] - newer_anchor[0] - 1))
+		else:
+			requested_pagenr = (first_page + last_page) // 2
+
+		requested_pagenr = min(max(requested_pagenr, first_page), last_page)
+		pages_in_range = last_page - first_page + 1
 
+		page_url = construct_url(category, requested_pagenr, questions_per_page)
+		logger.info(f'Looking at page {requested_pagenr} of [{first_page}, {last_page}]: {page_url}')
 
-			if requested_question_number == int_question_number_in_row:
-				logger.info(f'{requested_question_number} == {int_question_number_in_row}')
-				logger.info(f'*******************************************\nFound question {requested_question_number}:  \n page {requested_pagenr} - question {question_position+1} on the screen with page_url: \n {page_url} \n\nMake sure you are logged in when viewing the result in the browser!\n*******************************************')
+		# only the question_numbers are needed, the page is not parsed
+		page = fetch(page_url, session)
+		question_numbers = [int(question_number) for question_number in find_question_numbers_in_content(page.content)]
 
-				found = True
+		if not question_numbers:
+			logger.info(f'Page {requested_pagenr} has no questions, the category has less pages than expected.')
+			last_page = requested_pagenr - 1
+			bisect = True
+			continue
 
-				break
+		db_inter.set_page_boundary(category, questions_per_page, requested_pagenr, min(question_numbers), max(question_numbers), cursor)
+		connection.commit()
 
-			elif requested_question_number > int_question_number_in_row:
-				logger.info(f'{requested_question_number} > {int_question_number_in_row}')
-				logger.info(f'Hence, your requested question is on a page before this one.')
-				end_page = requested_pagenr
-				logger.info(f'Renewed search range: [{start_page}, {end_page}]')
+		if requested_question_number in question_numbers:
+			question_position = question_numbers.index(requested_question_number)
+			question_location = [page_url, question_position]
 
-			elif requested_question_number < int_question_number_in_row:
-				logger.info(f'{requested_question_number} < {int_question_number_in_row}')
-				logger.info(f'Hence, your requested question is on a page after this one.')
-				start_page = requested_pagenr
-				logger.info(f'Renewed search range: [{start_page}, {end_page}]')
+			logger.info(f'*******************************************\nFound question {requested_question_number}:  \n page {requested_pagenr} - question {question_position+1} on the screen with page_url: \n {page_url} \n\nMake sure you are logged in when viewing the result in the browser!\n*******************************************')
+			break
+
+		elif requested_question_number > max(question_numbers):
+			logger.info(f'{requested_question_number} > {max(question_numbers)}, hence your requested question is on a page before this one.')
+			last_page = requested_pagenr - 1
+			older_anchor = (requested_pagenr, max(question_numbers))
+
+		elif requested_question_number < min(question_numbers):
+			logger.info(f'{requested_question_number} < {min(question_numbers)}, hence your requested question is on a page after this one.')
+			first_page = requested_pagenr + 1
+			newer_anchor = (requested_pagenr, min(question_numbers))
 
 		else:
-			sleep_randomly(5, 0)
+			# between the first & last question of the page, but not on it
+			break
+
+		bisect = last_page - first_page + 1 > pages_in_range / 2
+
+	connection.close()
+
+	if question_location is None:
+		logger.warning(f'Question {requested_question_number} was not found in category {category}.')
 
-	question_location = [page_url, question_position]
-	return question_location
\ No newline at end of file
+	return question_location
@@ -12,6 +12,21 @@ CREDENTIALS = {
 }
 
 DATABASE_URL = 'quizarchief_v003.sqlite'
+
+"""
+DATABASE_PROFILE
+
+Performance profile of the scraper's database connection, see database_interaction.CONNECTION_PROFILES
+
+Arguments:
+	safe:			every commit is fsynced
+	bulk-load:		no fsyncs, fastest for large scrapes (a crash of the OS can lose the last pages)
+	read-mostly:	for readers, like the anki_exporter
+
+All profiles put the database in WAL mode, so the exporter can read while the scraper is writing.
+"""
+DATABASE_PROFILE = 'safe'
+
 """
 CATEGORY
 
@@ -59,7 +74,7 @@ Arguments:
 CATEGORY = 'ALL'
 
 
-""" FROM_PAGE: page to start from """
+""" FROM_PAGE: page to start from (pages of QUESTIONS_PER_PAGE questions) """
 FROM_PAGE = 1
 
 """
@@ -79,14 +94,44 @@ TO_PAGE = 'ALL'
 """
 TO_PAGE = 'ALL'
 
+"""
+QUESTIONS_PER_PAGE:
+    number of questions per page that is asked for when scraping: 1, 3, 5, 10, 15 or 20 (see scraper_utilities.construct_url)
+    the larger, the less requests a full scrape takes
+    the server decides how many it actually shows (e.g. logged in users see other page sizes),
+    that number is detected on the first page & used to count the pages of the whole run (a resumed run keeps it),
+    the urls keep asking for QUESTIONS_PER_PAGE
+
+LOOKUP_QUESTIONS_PER_PAGE:
+    number of questions per page that is asked for when looking up a single question (see scraper_utilities.find_page_for_question)
+    the smaller, the less every page that is looked at costs, 1 is the smallest page size the site offers
+"""
+QUESTIONS_PER_PAGE = 20
+LOOKUP_QUESTIONS_PER_PAGE = 1
+
 
 """
-SLEEP_TIME:
-    time between 2 requests to the server
-    it is strongly discouraged to set this very low, 
+REQUESTS_PER_SECOND:
+    politeness budget, the maximum number of requests per second sent to the server (per host)
+    e.g. 0.2 == one request every 5 seconds on average
+    it is strongly discouraged to set this very high, 
     since this will put a heavy load on the server for a non-urgency process
+
+BURST_SIZE:
+    number of requests that may be sent right after each other, when the budget was not used for a while
+    e.g. when re-checking pages of which all questions are already in the database
+
+RATE_JITTER:
+    when a request has to wait for the budget, a random pause of at most RATE_JITTER * (1/REQUESTS_PER_SECOND)
+    seconds is added, to make the interaction seem more human
+
+All requests (of both engines, see ASYNC_ENGINE) go through the rate limiter in rate_limiter.py
+Time is only spent right before a request is actually sent, 
+questions that are already in the database do not cost any waiting time.
 """
-SLEEP_TIME = 20
+REQUESTS_PER_SECOND = 0.2
+BURST_SIZE = 5
+RATE_JITTER = 0.5
 
 """
 ONLY_NEW
@@ -141,4 +186,195 @@ ONLY_NEW = True:
 	Downloading question 32.
 	Question 30 is already present in database.
 """
-ONLY_NEW = True
\ No newline at end of file
+ONLY_NEW = True
+
+"""
+INCREMENTAL
+
+Arguments:
+
+False:  every category is scraped from FROM_PAGE to TO_PAGE
+
+True:   a category that was scraped completely before (FROM_PAGE = 1, TO_PAGE = 'ALL'), is synced from its high-water mark: 
+        the highest question_number up to which all its questions are stored
+        pages are fetched newest first, from page 1, until a page reaches the high-water mark (FROM_PAGE & TO_PAGE are ignored)
+        if that page has questions below the high-water mark that are not stored (a gap), the next page is fetched too
+
+        a daily sync of all categories takes about one request per category, plus one per new question
+        categories that were never scraped completely, are scraped from FROM_PAGE to TO_PAGE
+        (only a scrape with FROM_PAGE = 1 & TO_PAGE = 'ALL' that processed every page, sets the high-water mark of a category,
+        a scrape that ONLY_NEW stopped early does not)
+        only used with ONLY_NEW = True
+"""
+INCREMENTAL = True
+
+"""
+ASYNC_ENGINE
+
+Arguments:
+
+False:  pages, answers and images are fetched one request at a time, with a requests' session
+
+True:   pages, answers and images are fetched by the asyncio engine (see async_scraper_utilities.py)
+        requests are pipelined, but never sent faster than REQUESTS_PER_SECOND allows (over all categories)
+        so a run is limited by the rate cap, not by the round-trip time of each request
+
+        requires aiohttp: pip install aiohttp
+"""
+ASYNC_ENGINE = False
+
+"""
+MAX_CONCURRENT_REQUESTS:
+    maximum number of requests the asyncio engine keeps in flight at the same time
+"""
+MAX_CONCURRENT_REQUESTS = 4
+
+"""
+PAGE_PREFETCH:
+    number of questionpages that are fetched ahead of the page that is currently being processed
+"""
+PAGE_PREFETCH = 1
+
+"""
+CONCURRENT_CATEGORIES:
+    number of categories that are scraped at the same time, when CATEGORY = 'ALL' (see category_scheduler.py)
+    pages are dealt out round-robin over the categories, to one thread per category, which all share one logged-in session
+    the requests of all categories together never go faster than REQUESTS_PER_SECOND
+
+    1:      one category after the other
+    
+    only used with ASYNC_ENGINE = False, the asyncio engine scrapes one category after the other
+"""
+CONCURRENT_CATEGORIES = 1
+
+"""
+WRITER_FLUSH_ROWS & WRITER_FLUSH_SECONDS:
+    scraped questions are written to the database in batches, one transaction per batch (see database_writer.py)
+    a batch is written at the end of every questionpage, 
+    or earlier when WRITER_FLUSH_ROWS questions are waiting or the oldest waiting question is WRITER_FLUSH_SECONDS old
+"""
+WRITER_FLUSH_ROWS = 100
+WRITER_FLUSH_SECONDS = 60
+
+"""
+ANSWER_FETCH_WORKERS:
+    number of threads that fetch the answers of a questionpage at the same time (see answer_fetcher.py)
+    they share the politeness budget (REQUESTS_PER_SECOND), they only keep one slow answer from holding up the others
+
+IMAGE_DOWNLOAD_WORKERS:
+    number of threads that download images in the background, while the next questions are scraped (see image_downloader.py)
+
+IMAGE_DOWNLOAD_RETRIES:
+    number of times a failed image download is tried again, with a growing pause in between
+    an image that still could not be downloaded, is downloaded again at the start of the next run
+
+IMAGE_STORE_DIRECTORY:
+    every image is stored once in here, named after the sha256 hash of its content, 
+    ./{category}/{img_filename} is a (hard) link to it
+"""
+ANSWER_FETCH_WORKERS = 4
+IMAGE_DOWNLOAD_WORKERS = 4
+IMAGE_DOWNLOAD_RETRIES = 3
+IMAGE_STORE_DIRECTORY = './images/'
+
+"""
+PARSER
+
+Arguments:
+
+html5lib:   parses pages exactly like a browser does, but is pure python & slow
+
+lxml:       C-based parser, builds the same questionrows many times faster
+            requires lxml: pip install lxml
+            (when lxml is not installed, the scraper falls back to html5lib)
+
+python benchmarks/parser_parity.py --archive checks that lxml extracts exactly what html5lib does,
+from the fixture pages & answers (pages of the site are saved as fixtures with python benchmarks/save_fixtures.py)
+& every archived questionpage (see HTML_ARCHIVE_URL)
+"""
+PARSER = 'lxml'
+
+"""
+PARSE_ONLY_QUESTIONROWS
+
+Arguments:
+
+True:   only the questionrows of a page are parsed into a tree, 
+        navigation, sidebars, scripts, ... are skipped, which saves parsing time & memory
+        (not supported by html5lib, the full page is parsed when PARSER = 'html5lib')
+
+False:  the full page is parsed
+"""
+PARSE_ONLY_QUESTIONROWS = True
+
+"""
+PARSER_PROCESSES:
+    pages are parsed by a pool of PARSER_PROCESSES processes, while the next pages are being fetched (see parsing_pipeline.py)
+
+    None:	use all cores
+    0:		parse in the scraper process itself
+"""
+PARSER_PROCESSES = None
+
+"""
+HTTP_CACHE_URL:
+    sqlite database in which responses for pages & answers are cached (see http_cache.py)
+    responses are cached per login (see CREDENTIALS), a logged in user sees other pages than an anonymous one
+    set to None to disable the cache
+
+HTTP_CACHE_TTL:
+    number of seconds a cached response is used without asking the server, per class of url
+    after that, the server is asked whether the response changed (which costs no bandwidth if it did not)
+
+    category_page:      https://www.quizarchief.be/categorie/{category}/{page_nr}/...
+                        new questions push all others a page further, so keep this short
+    category_overview:  https://www.quizarchief.be/categorie/
+    answer:             https://www.quizarchief.be/beantwoordevragen.php?vraagid=...
+                        None: answers never change, they are never requested again
+                        (an answer without answer text, e.g. an error page, is not cached, nor is a page without questions)
+"""
+HTTP_CACHE_URL = 'quizarchief_http_cache.sqlite'
+HTTP_CACHE_TTL = {
+	'category_page': 60 * 60,
+	'category_overview': 24 * 60 * 60,
+	'answer': None
+}
+
+"""
+HTML_ARCHIVE_URL:
+    every downloaded questionpage & answer is appended to a compressed archive (see html_archive.py)
+    {HTML_ARCHIVE_URL}.gz & {HTML_ARCHIVE_URL}.index.sqlite
+
+    the database can be rebuilt from the archive without any requests, e.g. after a parser bug was fixed:
+        python reparse.py
+
+    set to None to switch off archiving
+
+REPARSE_DATABASE_URL:
+    database that reparse.py rebuilds from the archive
+    it is rebuilt from scratch by every reparse (into {REPARSE_DATABASE_URL}.part, which replaces it when the reparse is done)
+    so it can not be DATABASE_URL
+"""
+HTML_ARCHIVE_URL = 'quizarchief_archive'
+REPARSE_DATABASE_URL = 'quizarchief_reparsed.sqlite'
+
+"""
+RESUME
+
+Arguments:
+
+False:  every run starts at FROM_PAGE for every category
+
+True:   if the previous run (with the same CATEGORY) crashed or was killed, it is continued where it stopped:
+        categories that were done are skipped, the others continue after their last completely written page
+        if the previous run finished, a new run is started as usual
+"""
+RESUME = True
+
+"""
+CATEGORY_DICTIONARY_TTL:
+    number of seconds the number of questions per category (from https://www.quizarchief.be/categorie/) is used from the database
+    after that, the cached numbers are still used, while they are refreshed in the background, over the logged-in session
+    (so categories that are only visible when logged in, like foto, are counted as well)
+"""
+CATEGORY_DICTIONARY_TTL = 24 * 60 * 60